@@ -12,3 +12,19 @@ class agent:
         # Defaults; subclasses should override
         self.system_prompt: str = ""
         self.available_functions: types.Tool = types.Tool(function_declarations=[])
+        # {resolved path: (mtime_ns, size)} of files the model already read this session.
+        # None disables it; with a dict, get_file_content answers repeated reads of an
+        # unchanged file with a short note instead of the full text.
+        self.seen_files: dict | None = None
+        # Directory the file and run tools are confined to; batch mode points each
+        # session at its own copy
+        self.working_directory: str = "./calculator"
+
+    # Checkpoint support: everything needed to continue a session, as JSON-serializable data
+    def get_state(self) -> dict:
+        return {"seen_files": self.seen_files}
+
+    def set_state(self, state: dict) -> None:
+        seen_files = state.get("seen_files")
+        # JSON turns the (mtime_ns, size) tuples into lists
+        self.seen_files = None if seen_files is None else {path: tuple(version) for path, version in seen_files.items()}
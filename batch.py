@@ -0,0 +1,305 @@
+"""Run many agent sessions concurrently from a JSONL file of prompts.
+
+Usage: python batch.py [prompts.jsonl | -] [--concurrency=N] [--rpm=N] [--output=PATH]
+                       [--agent=NAME] [--difficulty=LEVEL] [--parallel=N] [--token-budget=N]
+                       [--transport=MODE:PATH] [--trace=PATH] [--keep-sandboxes]
+                       [--cache-responses] [--cache-ttl=SECONDS] [--retries=N] [--hedge[=SECONDS]]
+
+Every input line is a JSON object such as {"id": "bug-17", "prompt": "...", "agent": "code_debug"}
+(only "prompt" is required; "agent" and "difficulty" override the command line defaults) or
+plain prompt text. With no file, or "-", prompts are read from stdin.
+
+All sessions run in one process and event loop and share one model client (and with it the
+HTTP connection pool). Up to --concurrency sessions run at a time, and --rpm limits model calls
+per minute across the whole batch. Each session gets its own agent instance and a fresh copy of
+the agent's working directory, so sessions that write files cannot see each other's changes.
+
+One JSON line per finished session (in completion order) is written to --output, stdout by
+default. Tool-call chatter is sent to stderr so stdout stays valid JSONL. With
+--cache-responses all sessions share one response cache (see response_cache.py). Failed model
+calls are retried (--retries, default 4) and all sessions share one circuit breaker, so an
+outage makes them fail fast instead of each retrying on its own (see resilience.py).
+"""
+import asyncio
+import contextlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from functions.workspace_index import forget_workspace
+from main import SessionError, create_agent, create_client, run_session
+from instrumentation import tracer
+from resilience import ResilientTransport
+from response_cache import RESPONSE_CACHE_TTL_SECONDS, CachingTransport, ResponseCache
+from transport import RateLimitedTransport, create_transport
+
+
+class SessionUsage:
+    """Wraps the shared transport for one session to count its model calls and tokens."""
+
+    def __init__(self, inner) -> None:
+        self.inner = inner
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.model_seconds = 0.0
+
+    async def stream(self, model, contents, config):
+        start = time.perf_counter()
+        upstream = await self.inner.stream(model, contents, config)
+        self.calls += 1
+
+        async def counted():
+            usage = None
+            try:
+                async for chunk in upstream:
+                    if chunk.usage_metadata is not None:
+                        usage = chunk.usage_metadata
+                    yield chunk
+            finally:
+                self.model_seconds += time.perf_counter() - start
+                if usage is not None:
+                    self.prompt_tokens += usage.prompt_token_count or 0
+                    self.response_tokens += usage.candidates_token_count or 0
+
+        return counted()
+
+
+def read_tasks(lines):
+    tasks = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            task = json.loads(line)
+        except json.JSONDecodeError:
+            task = line
+        if isinstance(task, str):
+            task = {"prompt": task}
+        if not isinstance(task, dict) or not task.get("prompt"):
+            raise ValueError(f"line {number}: expected a JSON object with a \"prompt\" or plain prompt text")
+        task.setdefault("id", number)
+        tasks.append(task)
+    return tasks
+
+
+def make_sandbox(template, sandbox_root, task_id):
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(task_id))[:60]
+    sandbox = tempfile.mkdtemp(prefix=f"{name}-", dir=sandbox_root)
+    # copytree needs a destination that does not exist yet
+    os.rmdir(sandbox)
+    shutil.copytree(template, sandbox, symlinks=True, ignore=shutil.ignore_patterns(".agent_cache", "__pycache__"))
+    return sandbox
+
+
+async def run_task(task, transport, sandbox_root, defaults):
+    agent = create_agent(task.get("agent", defaults["agent"]), task.get("difficulty", defaults["difficulty"]))
+    sandbox = await asyncio.to_thread(make_sandbox, agent.working_directory, sandbox_root, task["id"])
+    agent.working_directory = sandbox
+    if defaults["response_cache"] is not None:
+        # file checks must look at this session's sandbox
+        transport = CachingTransport(transport, defaults["response_cache"], sandbox)
+    usage = SessionUsage(transport)
+
+    start = time.perf_counter()
+    error = None
+    final_text, messages = None, []
+    try:
+        final_text, messages = await run_session(
+            usage, agent, task["prompt"], out=None,
+            max_workers=defaults["max_workers"], token_budget=defaults["token_budget"], raise_errors=True,
+        )
+    except SessionError as e:
+        error = str(e)
+        messages = e.messages
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        # the indexes and cached files of a sandbox are of no use once its session is over
+        await asyncio.to_thread(forget_workspace, sandbox)
+        if not defaults["keep_sandboxes"]:
+            await asyncio.to_thread(shutil.rmtree, sandbox, True)
+
+    result = {
+        "id": task["id"],
+        "finished": final_text is not None,
+        "response": final_text,
+        "model_calls": usage.calls,
+        "function_calls": sum(1 for message in messages if message.role == "model" for part in message.parts or [] if part.function_call is not None),
+        "messages": len(messages),
+        "prompt_tokens": usage.prompt_tokens,
+        "response_tokens": usage.response_tokens,
+        "model_seconds": round(usage.model_seconds, 3),
+        "duration_seconds": round(time.perf_counter() - start, 3),
+    }
+    if error:
+        result["error"] = error
+    if defaults["keep_sandboxes"]:
+        result["sandbox"] = sandbox
+    return result
+
+
+async def run_batch(tasks, transport, output, concurrency=4, defaults=None):
+    """Run every task, at most `concurrency` at a time, writing each result line as it finishes."""
+    sandbox_root = tempfile.mkdtemp(prefix="agent_batch_")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    finished = 0
+
+    async def run_one(task):
+        nonlocal finished
+        async with semaphore:
+            result = await run_task(task, transport, sandbox_root, defaults)
+        finished += result["finished"]
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    try:
+        await asyncio.gather(*(run_one(task) for task in tasks))
+    finally:
+        if not defaults["keep_sandboxes"]:
+            shutil.rmtree(sandbox_root, ignore_errors=True)
+    return finished
+
+
+def usage():
+    """The Usage: paragraph of the module docstring."""
+    return __doc__.split("\n\n")[1]
+
+
+def option_value(arg, convert):
+    """convert(value) of a --name=value argument; exits with the usage when it is invalid."""
+    try:
+        return convert(arg.split("=", 1)[1])
+    except ValueError:
+        print(f"Invalid value for {arg.split('=', 1)[0]}: '{arg}'", file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        sys.exit(2)
+
+
+def positive(convert):
+    def checked(value):
+        number = convert(value)
+        if not number > 0:
+            raise ValueError(value)
+        return number
+    return checked
+
+
+def non_negative(convert):
+    def checked(value):
+        number = convert(value)
+        if not number >= 0:
+            raise ValueError(value)
+        return number
+    return checked
+
+
+def main():
+    source = None
+    output_path = None
+    concurrency = 4
+    requests_per_minute = None
+    transport_spec = None
+    trace_path = None
+    defaults = {
+        "agent": "code_debug",
+        "difficulty": "medium",
+        "max_workers": 1,
+        "token_budget": None,
+        "keep_sandboxes": False,
+        "response_cache": None,
+    }
+    cache_responses = False
+    cache_ttl = RESPONSE_CACHE_TTL_SECONDS
+    max_retries = 4
+    hedge = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--concurrency="):
+            concurrency = option_value(arg, positive(int))
+        elif arg.startswith("--rpm="):
+            requests_per_minute = option_value(arg, positive(float))
+        elif arg.startswith("--output="):
+            output_path = arg.split("=", 1)[1].strip() or None
+        elif arg.startswith("--agent="):
+            defaults["agent"] = arg.split("=", 1)[1].strip() or "code_debug"
+        elif arg.startswith("--difficulty="):
+            defaults["difficulty"] = arg.split("=", 1)[1].strip() or "medium"
+        elif arg.startswith("--parallel="):
+            defaults["max_workers"] = option_value(arg, positive(int))
+        elif arg.startswith("--token-budget="):
+            defaults["token_budget"] = option_value(arg, positive(int))
+        elif arg.startswith("--transport="):
+            transport_spec = arg.split("=", 1)[1].strip() or None
+        elif arg.startswith("--trace="):
+            trace_path = arg.split("=", 1)[1].strip() or None
+        elif arg == "--cache-responses":
+            cache_responses = True
+        elif arg.startswith("--cache-ttl="):
+            cache_ttl = option_value(arg, non_negative(float))
+        elif arg.startswith("--retries="):
+            max_retries = option_value(arg, non_negative(int))
+        elif arg == "--hedge":
+            hedge = "p95"
+        elif arg.startswith("--hedge="):
+            hedge = option_value(arg, non_negative(float))
+        elif arg == "--keep-sandboxes":
+            defaults["keep_sandboxes"] = True
+        elif arg.startswith("--"):
+            print(f"Unknown option '{arg}'", file=sys.stderr)
+            print(usage(), file=sys.stderr)
+            sys.exit(2)
+        else:
+            source = arg
+
+    if source is None or source == "-":
+        tasks = read_tasks(sys.stdin)
+    else:
+        with open(source, "r", encoding="utf-8") as file:
+            tasks = read_tasks(file)
+    if not tasks:
+        print("No prompts provided.", file=sys.stderr)
+        sys.exit(1)
+
+    if trace_path:
+        tracer.enable()
+
+    transport, stub_server = create_transport(transport_spec, create_client)
+    if requests_per_minute:
+        transport = RateLimitedTransport(transport, requests_per_minute)
+    # outside the rate limiter, so retries and hedges are rate limited too
+    transport = resilient = ResilientTransport(
+        transport, max_retries=max_retries, hedge=hedge is not None,
+        hedge_after=hedge if isinstance(hedge, float) else None,
+    )
+    if cache_responses:
+        defaults["response_cache"] = ResponseCache(ttl_seconds=cache_ttl)
+
+    output = open(output_path, "w", encoding="utf-8") if output_path else sys.stdout
+    start = time.perf_counter()
+    try:
+        # call_function prints every call; keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            finished = asyncio.run(run_batch(tasks, transport, output, concurrency, defaults))
+    finally:
+        if stub_server is not None:
+            stub_server.stop()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(tasks)} sessions, {finished} finished, {elapsed:.1f} s ({len(tasks) / elapsed:.2f} sessions/s)", file=sys.stderr)
+    if defaults["response_cache"] is not None:
+        print(defaults["response_cache"].summary(), file=sys.stderr)
+    print(resilient.summary(), file=sys.stderr)
+    if trace_path:
+        tracer.write(trace_path)
+        print(tracer.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
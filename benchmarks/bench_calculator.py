@@ -0,0 +1,269 @@
+"""Calculator throughput on large inputs.
+
+Usage: python benchmarks/bench_calculator.py [--rows=1000000] [--expressions=100000]
+                                             [--tokens=1000000,10000000]
+                                             [--only=batch|server|tokens] [--output=calculator.json]
+
+batch: one formula over `rows` rows of two columns, evaluated row by row with
+Calculator.evaluate (the compiled expression is cached, so this is the fastest scalar path)
+and in one pass with Calculator.evaluate_batch over array('d') columns and, when NumPy is
+installed, NumPy arrays. Every tenth row divides by zero, so the per-row error handling is
+part of the measurement.
+
+server: expressions per second through `python main.py "<expression>"` (one process each, as
+run_python_file does it) and through one `main.py --serve` process, over stdin and over a
+Unix socket, both pipelined (all expressions sent without waiting) and one at a time.
+
+tokens: one constant expression of each size in `tokens`, tokenized and compiled from a
+whitespace-separated string (the split() fast path), from the same expression without
+whitespace (the regex scanner) and streamed from a file with Calculator.evaluate_stream, with
+the peak memory tracemalloc sees in each (for the strings, not counting the string itself).
+"""
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORMULA = "price * quantity - price * quantity / discount + 2.5"
+
+
+def load_calculator_module():
+    # by path: putting calculator/ on sys.path would shadow the agent's main.py
+    path = os.path.join(ROOT, "calculator", "pkg", "calculator.py")
+    spec = importlib.util.spec_from_file_location("bench_calculator_module", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def bench_batch(calculator_module, rows):
+    calculator = calculator_module.Calculator()
+    rng = random.Random(0)
+    columns = {
+        "price": array("d", (rng.uniform(1, 100) for _ in range(rows))),
+        "quantity": array("d", (float(rng.randint(1, 50)) for _ in range(rows))),
+        "discount": array("d", (0.0 if row % 10 == 0 else rng.uniform(1, 5) for row in range(rows))),
+    }
+
+    def scalar():
+        values, errors = [], 0
+        names = list(columns)
+        for row_values in zip(*columns.values()):
+            try:
+                values.append(calculator.evaluate(FORMULA, dict(zip(names, row_values))))
+            except ZeroDivisionError:
+                values.append(float("nan"))
+                errors += 1
+        return values, errors
+
+    scalar_s, (expected, expected_errors) = timed(scalar)
+    results = {"rows": rows, "scalar_s": scalar_s}
+    print(f"{'batch of ' + format(rows, ','):<24}{'seconds':>10}{'rows/s':>14}{'speedup':>10}")
+    print(f"{'  scalar evaluate':<24}{scalar_s:>10.3f}{rows / scalar_s:>14,.0f}{1:>9.1f}x")
+
+    backends = [("array", False)]
+    if calculator_module.numpy is not None:
+        backends.append(("numpy", True))
+    else:
+        print("  (NumPy is not installed, skipping the NumPy backend)")
+    for name, use_numpy in backends:
+        batch_columns = {key: calculator_module.numpy.asarray(values) for key, values in columns.items()} if use_numpy else columns
+        seconds, result = timed(lambda: calculator.evaluate_batch(FORMULA, batch_columns, use_numpy=use_numpy))
+        # same values (NaN in the failed rows) and the same rows failing as the scalar path
+        values = list(result.values)
+        if len(result.errors) != expected_errors or any(
+            a != b and not (a != a and b != b) for a, b in zip(values, expected)
+        ):
+            raise AssertionError(f"{name} batch results differ from the scalar path")
+        results[f"{name}_s"] = seconds
+        results[f"{name}_speedup"] = scalar_s / seconds
+        print(f"{'  batch (' + name + ')':<24}{seconds:>10.3f}{rows / seconds:>14,.0f}{scalar_s / seconds:>9.1f}x")
+    return results
+
+
+CALCULATOR_DIR = os.path.join(ROOT, "calculator")
+
+
+def server_expressions(count):
+    # distinct expressions, so every one is parsed rather than served from the compile cache
+    return [f"{i} * 2 + {i % 97} / 4 - 1" for i in range(count)]
+
+
+def read_lines(connection, count):
+    lines = 0
+    while lines < count:
+        chunk = connection.recv(65536)
+        if not chunk:
+            raise RuntimeError("calculator server closed the connection")
+        lines += chunk.count(b"\n")
+
+
+def bench_server(count):
+    results = {}
+    print(f"{'server, ' + format(count, ',') + ' expressions':<34}{'seconds':>10}{'expr/s':>14}")
+
+    def report(name, seconds, expressions):
+        results[name] = {"seconds": seconds, "expressions": expressions, "per_second": expressions / seconds}
+        print(f"  {name:<32}{seconds:>10.3f}{expressions / seconds:>14,.0f}")
+
+    runs = 20
+    expressions = server_expressions(runs)
+    start = time.perf_counter()
+    for expression in expressions:
+        subprocess.run([sys.executable, "main.py", expression], cwd=CALCULATOR_DIR, capture_output=True, check=True)
+    report("process per expression", time.perf_counter() - start, runs)
+
+    expressions = server_expressions(count)
+    payload = ("\n".join(expressions) + "\n").encode()
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "main.py", "--serve"], cwd=CALCULATOR_DIR, input=payload,
+                               capture_output=True, check=True)
+    report("stdin, pipelined", time.perf_counter() - start, count)
+    if completed.stdout.count(b"\n") != count:
+        raise AssertionError("stdin server did not answer every expression")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "calculator.sock")
+        server = subprocess.Popen([sys.executable, "main.py", "--serve", f"--socket={path}"], cwd=CALCULATOR_DIR,
+                                  stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            with socket.socket(socket.AF_UNIX) as connection:
+                connection.connect(path)
+                start = time.perf_counter()
+                # send from another thread: the answers have to be read while the rest goes out
+                sender = threading.Thread(target=connection.sendall, args=(payload,))
+                sender.start()
+                read_lines(connection, count)
+                sender.join()
+                report("socket, pipelined", time.perf_counter() - start, count)
+
+                one_at_a_time = min(count, 5000)
+                start = time.perf_counter()
+                for expression in expressions[:one_at_a_time]:
+                    connection.sendall(expression.encode() + b"\n")
+                    read_lines(connection, 1)
+                report("socket, one at a time", time.perf_counter() - start, one_at_a_time)
+        finally:
+            server.terminate()
+            server.wait()
+    return results
+
+
+TOKEN_UNIT = "1 + 2 * 3 - 4 / 5"  # 9 tokens, 10 with the "+" joining it to the next
+
+
+def write_expression(path, units, spaced):
+    # in blocks, so the file can be much larger than what the benchmark holds in memory
+    unit, joiner = (TOKEN_UNIT, " + ") if spaced else (TOKEN_UNIT.replace(" ", ""), "+")
+    with open(path, "w") as file:
+        for written in range(0, units, 10_000):
+            if written:
+                file.write(joiner)
+            file.write(joiner.join([unit] * min(10_000, units - written)))
+    return os.path.getsize(path)
+
+
+def measured(fn):
+    """(seconds, peak bytes allocated, result); the peak is from a second, traced run."""
+    seconds, result = timed(fn)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def bench_tokens(calculator_module, sizes):
+    calculator = calculator_module.Calculator(cache_size=0)
+    results = {}
+    print(f"{'tokens':<38}{'seconds':>10}{'tokens/s':>14}{'peak MB':>10}")
+    for size in sizes:
+        units = max(1, size // 10)
+        tokens = units * 10 - 1
+        results[size] = {}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "expression.txt")
+            cases = []
+            for name, spaced in (("split", True), ("scan", False)):
+                write_expression(path, units, spaced)
+                with open(path) as file:
+                    text = file.read()
+                cases.append((f"{name}, string", lambda text=text: calculator.compile(text).evaluate()))
+            file_bytes = write_expression(path, units, True)
+
+            def stream():
+                with open(path, "rb") as file:
+                    return calculator.evaluate_stream(file)
+
+            cases.append(("stream, file", stream))
+            expected = None
+            for name, run in cases:
+                seconds, peak, value = measured(run)
+                if expected is not None and value != expected:
+                    raise AssertionError(f"{name} evaluates {size:,} tokens to {value}, not {expected}")
+                expected = value
+                results[size][name] = {"seconds": seconds, "tokens_per_second": tokens / seconds, "peak_bytes": peak}
+                print(f"  {format(tokens, ',') + ' tokens, ' + name:<36}{seconds:>10.3f}{tokens / seconds:>14,.0f}"
+                      f"{peak / 1e6:>10.1f}")
+            results[size]["file_bytes"] = file_bytes
+    return results
+
+
+def main():
+    rows = 1_000_000
+    expressions = 100_000
+    sizes = [1_000_000, 10_000_000]
+    only = None
+    output = None
+    for arg in sys.argv[1:]:
+        key, _, value = arg.partition("=")
+        if key == "--rows":
+            rows = int(value)
+        elif key == "--expressions":
+            expressions = int(value)
+        elif key == "--tokens":
+            sizes = [int(size) for size in value.split(",")]
+        elif key == "--only":
+            only = value
+        elif key == "--output":
+            output = value
+        else:
+            print(f"Unknown argument '{arg}'")
+            sys.exit(2)
+
+    calculator_module = load_calculator_module()
+    groups = {
+        "batch": lambda: bench_batch(calculator_module, rows),
+        "server": lambda: bench_server(expressions),
+        "tokens": lambda: bench_tokens(calculator_module, sizes),
+    }
+    results = {}
+    for name, run in groups.items():
+        if only is None or only == name:
+            results[name] = run()
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
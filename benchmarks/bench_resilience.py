@@ -0,0 +1,151 @@
+"""Exercise the retry / circuit breaker / hedging layer against a fault-injecting stub server.
+
+Usage: python benchmarks/bench_resilience.py [calls] [--output=resilience.json]
+
+Every scenario starts a StubModelServer whose script injects faults (see transport.py) and
+makes `calls` model calls through ResilientTransport, so no API key or network is needed:
+
+  errors        30% of requests fail with 503: success rate without and with retries
+  retry_after   one 429 with Retry-After: 1, which the retry must wait out
+  circuit       every request fails: the breaker must open and reject calls without requests
+  hedging       2% of requests answer 500 ms late: call latency without and with hedging
+
+The script exits with status 1 when a scenario does not behave as expected, so it doubles as
+a check of resilience.py.
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.genai import types
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilientTransport
+from transport import GeminiTransport, StubModelServer, stub_client
+
+TURNS = [[{"text": "ok"}]]
+CONTENTS = [types.Content(role="user", parts=[types.Part(text="ping")])]
+
+
+async def run_calls(transport, calls):
+    """(successes, errors by type, per-call seconds) for `calls` sequential calls."""
+    successes, failures, latencies = 0, {}, []
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            async for _ in await transport.stream("stub-model", CONTENTS, None):
+                pass
+            successes += 1
+        except Exception as error:
+            failures[type(error).__name__] = failures.get(type(error).__name__, 0) + 1
+        latencies.append(time.perf_counter() - start)
+    return successes, failures, latencies
+
+
+def with_server(script, make_transport, calls):
+    server = StubModelServer(script).start()
+    try:
+        # the SDK's async client is bound to the event loop it first runs in
+        async def run():
+            transport = make_transport(GeminiTransport(stub_client(server.base_url)))
+            result = await run_calls(transport, calls)
+            return transport, result
+
+        transport, (successes, failures, latencies) = asyncio.run(run())
+        return transport, successes, failures, latencies, server.requests
+    finally:
+        server.stop()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def scenario_errors(calls):
+    script = {"turns": TURNS, "fault_rate": 0.3, "seed": 1}
+    results = {}
+    for name, retries in (("no_retries", 0), ("retries", 4)):
+        transport, successes, failures, _, requests = with_server(
+            script, lambda inner: ResilientTransport(inner, max_retries=retries, base_delay=0.01), calls)
+        results[name] = {"success_rate": successes / calls, "requests": requests, "errors": failures,
+                         "retries": transport.stats["retries"]}
+    print(f"errors:      success rate {results['no_retries']['success_rate']:.0%} without retries, "
+          f"{results['retries']['success_rate']:.0%} with ({results['retries']['retries']} retries)")
+    return results, results["retries"]["success_rate"] >= 0.99
+
+
+def scenario_retry_after(calls):
+    script = {"turns": TURNS, "faults": [{"status": 429, "retry_after": 1}]}
+    transport, successes, failures, latencies, requests = with_server(
+        script, lambda inner: ResilientTransport(inner, base_delay=0.01), 1)
+    print(f"retry_after: first call took {latencies[0]:.2f} s after a 429 with Retry-After: 1")
+    result = {"seconds": latencies[0], "requests": requests, "succeeded": successes == 1}
+    return result, successes == 1 and latencies[0] >= 1.0
+
+
+def scenario_circuit(calls):
+    script = {"turns": TURNS, "fault_rate": 1.0}
+    transport, successes, failures, latencies, requests = with_server(
+        script, lambda inner: ResilientTransport(inner, max_retries=2, base_delay=0.01,
+                                                 breaker=CircuitBreaker(failure_threshold=5, reset_seconds=60)), calls)
+    rejected = failures.get(CircuitOpenError.__name__, 0)
+    print(f"circuit:     {requests} requests for {calls} calls, {rejected} rejected while open")
+    result = {"requests": requests, "rejected": rejected, "errors": failures}
+    return result, transport.breaker.state == "open" and requests == 5 and rejected >= calls - 2
+
+
+def scenario_hedging(calls):
+    rng = random.Random(7)
+    # enough fault entries for the extra hedge requests too
+    faults = [{"delay_ms": 500} if rng.random() < 0.02 else None for _ in range(calls * 3)]
+    script = {"turns": TURNS, "latency_ms": 20, "faults": faults}
+    results = {}
+    for name, hedge in (("no_hedge", False), ("hedge", True)):
+        transport, successes, _, latencies, requests = with_server(
+            script, lambda inner: ResilientTransport(inner, hedge=hedge, hedge_min_samples=10), calls)
+        results[name] = {
+            "p50_ms": 1000 * statistics.median(latencies),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+            "max_ms": 1000 * max(latencies),
+            "requests": requests,
+            "hedges": transport.stats["hedges"],
+            "hedge_wins": transport.stats["hedge_wins"],
+        }
+        print(f"hedging:     {name:<9} p50 {results[name]['p50_ms']:6.1f} ms  p99 {results[name]['p99_ms']:6.1f} ms  "
+              f"max {results[name]['max_ms']:6.1f} ms  ({requests} requests, {transport.stats['hedges']} hedges)")
+    return results, results["hedge"]["max_ms"] < results["no_hedge"]["max_ms"] / 2
+
+
+def main():
+    calls = 200
+    output = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        else:
+            calls = int(arg)
+
+    results, failed = {}, []
+    for name, scenario in (("errors", scenario_errors), ("retry_after", scenario_retry_after),
+                           ("circuit", scenario_circuit), ("hedging", scenario_hedging)):
+        results[name], ok = scenario(calls)
+        if not ok:
+            failed.append(name)
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+    if failed:
+        print(f"FAILED: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare run_python_file calls per second with and without the warm interpreter pool.
+
+Usage: python benchmarks/bench_run_python.py [seconds_per_case] [pool_size]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions.run_python import run_python_file
+from functions.python_pool import enable_worker_pool, shutdown_worker_pools
+
+WORKING_DIRECTORY = "calculator"
+CASES = [
+    ("main.py", ["3 + 5"]),
+    ("tests.py", []),
+]
+
+
+def without_timing(output):
+    # the last line reports how long the run took, which naturally differs between runs
+    return output.rsplit("Ran for ", 1)[0]
+
+
+def calls_per_second(file_path, args, seconds):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        run_python_file(WORKING_DIRECTORY, file_path, args)
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    pool_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    subprocess_rates = [calls_per_second(f, a, seconds) for f, a in CASES]
+    expected = [without_timing(run_python_file(WORKING_DIRECTORY, f, a)) for f, a in CASES]
+
+    enable_worker_pool(WORKING_DIRECTORY, size=pool_size)
+    pooled = [without_timing(run_python_file(WORKING_DIRECTORY, f, a)) for f, a in CASES]
+    pool_rates = [calls_per_second(f, a, seconds) for f, a in CASES]
+    shutdown_worker_pools()
+
+    print(f"{'script':<24}{'subprocess/s':>14}{'pool/s':>10}{'speedup':>9}  same output")
+    for (f, a), sub, pool, exp, got in zip(CASES, subprocess_rates, pool_rates, expected, pooled):
+        name = " ".join([f] + a)
+        print(f"{name:<24}{sub:>14.1f}{pool:>10.1f}{pool / sub:>8.1f}x  {exp == got}")
+
+
+if __name__ == "__main__":
+    main()
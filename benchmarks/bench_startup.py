@@ -0,0 +1,109 @@
+"""Measure CLI startup: wall time to the usage error, time to the first model request, and
+which imports the time goes to (from python -X importtime).
+
+Usage: python benchmarks/bench_startup.py [runs] [--output=startup.json]
+
+The first-request cases run main.py against a stub model server started here
+(--transport=stub:URL), so no API key or network is needed. "Time to first request" is
+measured from just before the process is spawned to the moment the server receives the
+first request, so it includes interpreter startup.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from transport import StubModelServer
+
+SCRIPT = {"turns": [[{"text": "Done."}]]}
+
+
+def run_main(args):
+    start = time.time()
+    completed = subprocess.run([sys.executable, "main.py"] + args, cwd=ROOT, capture_output=True, text=True)
+    return start, time.time(), completed
+
+
+def time_usage_error(runs):
+    return [end - start for start, end, _ in (run_main([]) for _ in range(runs))]
+
+
+def time_first_request(runs, extra_args):
+    first, total = [], []
+    for _ in range(runs):
+        server = StubModelServer(SCRIPT).start()
+        try:
+            start, end, completed = run_main(["benchmark prompt", f"--transport=stub:{server.base_url}"] + extra_args)
+            if server.first_request_at is None:
+                raise RuntimeError(f"main.py made no model request:\n{completed.stdout}\n{completed.stderr}")
+            first.append(server.first_request_at - start)
+            total.append(end - start)
+        finally:
+            server.stop()
+    return first, total
+
+
+def import_profile(extra_args):
+    """(total import seconds, [(cumulative seconds, top-level module)]) for one run."""
+    server = StubModelServer(SCRIPT).start()
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "main.py", "benchmark prompt", f"--transport=stub:{server.base_url}"] + extra_args,
+            cwd=ROOT, capture_output=True, text=True,
+        )
+    finally:
+        server.stop()
+    total_us = 0
+    top_level = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        # top-level imports are not indented under another module
+        if not name.startswith("  "):
+            top_level.append((int(cumulative_us) / 1e6, name.strip()))
+    top_level.sort(reverse=True)
+    return total_us / 1e6, top_level
+
+
+def main():
+    runs = 5
+    output = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        else:
+            runs = int(arg)
+
+    results = {"usage_error_s": statistics.median(time_usage_error(runs))}
+    print(f"{'case':<34}{'first request':>15}{'total':>10}")
+    print(f"{'usage error (no prompt)':<34}{'-':>15}{results['usage_error_s']:>9.3f}s")
+    for name, extra_args in (("code_debug", []), ("tictactoe", ["--agent=tictactoe"])):
+        first, total = time_first_request(runs, extra_args)
+        imports, top_level = import_profile(extra_args)
+        results[name] = {
+            "first_request_s": statistics.median(first),
+            "total_s": statistics.median(total),
+            "import_s": imports,
+            "top_imports": [{"module": module, "cumulative_s": seconds} for seconds, module in top_level[:10]],
+        }
+        print(f"{name + ' session':<34}{statistics.median(first):>14.3f}s{statistics.median(total):>9.3f}s")
+
+    for name in ("code_debug", "tictactoe"):
+        print(f"\nslowest top-level imports ({name}, {results[name]['import_s']:.3f}s importing in total):")
+        for entry in results[name]["top_imports"]:
+            print(f"  {entry['cumulative_s'] * 1000:>8.1f} ms  {entry['module']}")
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""End-to-end benchmark suite for the tool functions and the agent loop.
+
+Covers get_files_info, get_file_content, write_file and run_python_file on synthetic trees,
+call_function dispatch overhead, Calculator.evaluate throughput (cached and uncached),
+tictactoe move selection per difficulty and full scripted sessions against the offline stub
+model server.
+
+Usage:
+  python benchmarks/bench_suite.py [--sizes=10,1000,10000,100000] [--only=SUBSTRING]
+                                   [--output=bench_results.json] [--repeat=5]
+                                   [--baseline=baseline.json] [--threshold=0.25]
+
+Results are written as JSON ({"meta": {...}, "results": {name: {...}}}). With --baseline the
+run is compared case by case against a saved result file; cases whose median got slower by
+more than --threshold (a fraction) are reported and the exit code is 1. Save a run as the
+baseline by copying its output file.
+"""
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.genai import types
+
+from functions.get_files_info import get_files_info
+from functions.get_file_content import get_file_content
+from functions.write_file import write_file
+from functions.run_python import run_python_file
+from functions.file_cache import file_cache
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+FILES_PER_DIRECTORY = 100
+FILE_TEXT = "".join(f"def function_{i}(x):\n    return x * {i}\n\n" for i in range(40))
+SCRIPT_TEXT = "import sys\nprint('hello from the benchmark script', sys.argv[1:])\n"
+
+
+# Measuring
+def measure(fn, repeat):
+    """Time fn like timeit: pick a loop count that takes >= 0.2s, then take `repeat` samples."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    median = statistics.median(samples)
+    return {
+        "median_s": median,
+        "min_s": min(samples),
+        "ops_per_s": 1 / median if median else None,
+        "loops": number,
+        "samples": len(samples),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    # call_function and the agent loop print every call; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# Synthetic trees
+def build_tree(root, file_count):
+    for i in range(file_count):
+        directory = os.path.join(root, f"dir_{i // FILES_PER_DIRECTORY:04d}")
+        if i % FILES_PER_DIRECTORY == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{i}.py"), "w") as file:
+            file.write(FILE_TEXT)
+    with open(os.path.join(root, "script.py"), "w") as file:
+        file.write(SCRIPT_TEXT)
+
+
+def bench_tools(sizes, repeat, results):
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix=f"bench_tree_{size}_")
+        try:
+            start = time.perf_counter()
+            build_tree(root, size)
+            print(f"  built tree with {size} files in {time.perf_counter() - start:.1f}s")
+            target = os.path.join("dir_0000", "module_0.py")
+            counter = iter(range(10 ** 9))
+
+            def read_cold():
+                file_cache.clear()
+                get_file_content(root, target)
+
+            cases = {
+                "get_files_info/top_level": lambda: get_files_info(root),
+                "get_files_info/recursive_page": lambda: get_files_info(root, recursive=True),
+                "get_files_info/recursive_pattern": lambda: get_files_info(root, recursive=True, pattern="module_9*.py"),
+                "get_file_content/cold": read_cold,
+                "get_file_content/cached": lambda: get_file_content(root, target),
+                "get_file_content/line_range": lambda: get_file_content(root, target, start_line=10, end_line=30),
+                "write_file/small": lambda: write_file(root, "written.txt", f"line {next(counter)}\n"),
+                "write_file/replace_module": lambda: write_file(root, target, FILE_TEXT + f"# {next(counter)}\n"),
+                "run_python_file/script": lambda: run_python_file(root, "script.py", ["a", "b"]),
+            }
+            for name, fn in cases.items():
+                record(results, f"tools/{name}/{size}", measure(fn, repeat), files=size)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+# Dispatch, calculator and tictactoe
+def bench_dispatch(repeat, results):
+    from main import call_function
+    from tictactoe import tictactoe
+
+    game = tictactoe()
+    board_call = types.FunctionCall(name="print_board", args={})
+    listing_call = types.FunctionCall(name="get_files_info", args={})
+    with quiet():
+        direct = measure(lambda: game.handle_function("print_board", {}), repeat)
+        dispatched = measure(lambda: call_function(game, board_call), repeat)
+        listing = measure(lambda: call_function(game, listing_call), repeat)
+    record(results, "dispatch/handle_function_direct", direct)
+    record(results, "dispatch/call_function_agent_handler", dispatched,
+           overhead_s=dispatched["median_s"] - direct["median_s"])
+    record(results, "dispatch/call_function_get_files_info", listing)
+
+
+CALCULATOR_EXPRESSIONS = {
+    "short": "3 + 5",
+    "medium": "3 + 5 * 2 - 8 / 4 + 10 * 3 - 1",
+    "long": " + ".join(f"{i} * 2 / 3" for i in range(1, 101)),
+}
+
+
+def load_calculator():
+    # by path: putting calculator/ on sys.path would shadow the agent's main.py
+    path = os.path.join(ROOT, "calculator", "pkg", "calculator.py")
+    spec = importlib.util.spec_from_file_location("bench_calculator_module", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Calculator
+
+
+def bench_calculator(repeat, results):
+    Calculator = load_calculator()
+    # warm: the compiled expression comes from the cache; cold: it is parsed on every call
+    calculator = Calculator()
+    uncached = Calculator(cache_size=0)
+    for name, expression in CALCULATOR_EXPRESSIONS.items():
+        result = measure(lambda: calculator.evaluate(expression), repeat)
+        record(results, f"calculator/evaluate/{name}", result, tokens=len(expression.split()))
+        result = measure(lambda: uncached.evaluate(expression), repeat)
+        record(results, f"calculator/evaluate/{name}/cold", result, tokens=len(expression.split()))
+    # one template evaluated with changing values
+    template = " + ".join(f"x{i % 10} * {i} / y" for i in range(1, 21))
+    values = {f"x{i}": float(i) for i in range(10)}
+    values["y"] = 3.0
+    result = measure(lambda: calculator.evaluate(template, values), repeat)
+    record(results, "calculator/evaluate/template", result, tokens=len(template.split()))
+
+
+TICTACTOE_POSITIONS = {
+    # (moves already played as (row, col, player))
+    "empty": [],
+    "opening": [(1, 1, "X")],
+    "midgame": [(0, 0, "X"), (1, 1, "O"), (2, 2, "X"), (0, 2, "O")],
+}
+
+
+def search_positions(x, o, o_to_move, seen):
+    """Number of positions the hard agent's minimax visits from (x, o), adding each to `seen`."""
+    from tictactoe import FULL_BOARD, WIN_MASKS
+
+    seen.add((x, o))
+    if any(pieces & mask == mask for pieces in (x, o) for mask in WIN_MASKS) or x | o == FULL_BOARD:
+        return 1
+    visited = 1
+    for square in range(9):
+        bit = 1 << square
+        if not (x | o) & bit:
+            visited += search_positions(x, o | bit, False, seen) if o_to_move else search_positions(x | bit, o, True, seen)
+    return visited
+
+
+def bench_tictactoe(repeat, results):
+    from tictactoe import tictactoe
+
+    for difficulty in ("easy", "medium", "hard"):
+        for position, moves in TICTACTOE_POSITIONS.items():
+            game = tictactoe(difficulty=difficulty)
+            for row, col, player in moves:
+                game.pieces[player] |= 1 << (3 * row + col)
+            game.current_player = "O"
+            game._update_status()
+            random.seed(0)
+            record(results, f"tictactoe/{difficulty}/{position}", measure(game._choose_agent_move, repeat))
+
+    # positions evaluated per second: the status of every distinct position minimax can reach,
+    # and the whole game tree searched for the agent's first move
+    positions = set()
+    visited = search_positions(0, 0, True, positions)
+    game = tictactoe()
+
+    def update_all():
+        for x, o in positions:
+            game.pieces = {"X": x, "O": o}
+            game._update_status()
+
+    result = measure(update_all, repeat)
+    record(results, "tictactoe/positions/update_status", result, positions=len(positions),
+           positions_per_s=len(positions) / result["median_s"])
+    game = tictactoe(difficulty="hard")
+    result = measure(lambda: game._minimax_best_move("O"), repeat)
+    record(results, "tictactoe/positions/minimax_empty_board", result, positions=visited,
+           positions_per_s=visited / result["median_s"])
+
+
+# Scripted sessions
+def code_debug_script(turns):
+    # tools whose output is the same on every run apart from timings, which request_key
+    # normalizes (replay matches on the tool results too); the session runs against the real
+    # ./calculator directory
+    calls = [
+        {"function_call": {"name": "get_files_info", "args": {}}},
+        {"function_call": {"name": "get_file_content", "args": {"file_path": "pkg/calculator.py"}}},
+        {"function_call": {"name": "search_files", "args": {"pattern": "def "}}},
+        {"function_call": {"name": "get_workspace_summary", "args": {}}},
+        {"function_call": {"name": "run_python_file", "args": {"file_path": "main.py", "args": ["3 + 5"]}}},
+    ]
+    script = [[{"text": "Looking around."}, calls[i % len(calls)]] for i in range(turns - 1)]
+    script.append([{"text": "Everything checks out, no changes needed."}])
+    return {"turns": script, "chunk_chars": 16}
+
+
+def tictactoe_script():
+    moves = [(0, 0), (0, 1), (1, 0), (2, 2)]
+    script = []
+    for row, col in moves:
+        script.append([
+            {"function_call": {"name": "make_move", "args": {"row": row, "col": col, "player": "X"}}},
+            {"function_call": {"name": "make_move", "args": {"player": "O"}}},
+        ])
+    script.append([{"text": "Game over."}])
+    return {"turns": script}
+
+
+def bench_sessions(repeat, results):
+    from code_debug import code_debug
+    from main import run_session
+    from tictactoe import tictactoe
+    from transport import GeminiTransport, ReplayTransport, RecordingTransport, StubModelServer, stub_client
+
+    os.chdir(ROOT)
+    scenarios = {
+        "code_debug_5_turns": (code_debug, code_debug_script(5)),
+        "code_debug_20_turns": (code_debug, code_debug_script(20)),
+        "tictactoe_hard": (lambda: tictactoe(difficulty="hard"), tictactoe_script()),
+    }
+    for name, (make_agent, script) in scenarios.items():
+        server = StubModelServer(script).start()
+        recording = os.path.join(tempfile.mkdtemp(prefix="bench_session_"), "calls.jsonl")
+        try:
+            def run(model=None):
+                # the SDK's async HTTP session belongs to one event loop, so each
+                # asyncio.run gets its own client
+                model = model or GeminiTransport(stub_client(server.base_url))
+                final_text, messages = asyncio.run(run_session(model, make_agent(), f"benchmark {name}", out=None))
+                if final_text is None:
+                    # run_session reports errors by printing and stopping; don't time a broken run
+                    raise RuntimeError(f"session {name} did not finish")
+                return final_text, messages
+
+            with quiet():
+                random.seed(0)
+                # warm up first: once the workspace index exists get_files_info output gains
+                # line counts, and replay needs the tool results to be the same on every run
+                run()
+                final_text, messages = run(RecordingTransport(GeminiTransport(stub_client(server.base_url)), recording))
+                stub = measure(run, repeat)
+                replay = ReplayTransport(recording)
+                replayed = measure(lambda: run(replay), repeat)
+            record(results, f"session/{name}/stub_http", stub, messages=len(messages), model_turns=len(script["turns"]))
+            # the same session without HTTP: agent loop and tool overhead only
+            record(results, f"session/{name}/replay", replayed, messages=len(messages))
+        finally:
+            server.stop()
+            shutil.rmtree(os.path.dirname(recording), ignore_errors=True)
+
+
+# Results
+def record(results, name, measurement, **extra):
+    measurement.update(extra)
+    results[name] = measurement
+    print(f"  {name:<58}{format_seconds(measurement['median_s']):>12}")
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print median ratios against the baseline and return the names that regressed."""
+    regressions = []
+    print(f"\n{'case':<58}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio = current["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<58}{format_seconds(before['median_s']):>12}{format_seconds(current['median_s']):>12}{ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    sizes = DEFAULT_SIZES
+    only = None
+    output = "bench_results.json"
+    repeat = 5
+    baseline_path = None
+    threshold = 0.25
+    for arg in sys.argv[1:]:
+        key, _, value = arg.partition("=")
+        if key == "--sizes":
+            sizes = [int(size) for size in value.split(",") if size]
+        elif key == "--only":
+            only = value
+        elif key == "--output":
+            output = value
+        elif key == "--repeat":
+            repeat = max(1, int(value))
+        elif key == "--baseline":
+            baseline_path = value
+        elif key == "--threshold":
+            threshold = float(value)
+        else:
+            print(f"Unknown argument '{arg}'")
+            sys.exit(2)
+
+    groups = {
+        "tools": lambda results: bench_tools(sizes, repeat, results),
+        "dispatch": lambda results: bench_dispatch(repeat, results),
+        "calculator": lambda results: bench_calculator(repeat, results),
+        "tictactoe": lambda results: bench_tictactoe(repeat, results),
+        "session": lambda results: bench_sessions(repeat, results),
+    }
+    results = {}
+    for group, run in groups.items():
+        if only and only not in group:
+            continue
+        print(f"{group}:")
+        run(results)
+
+    with open(output, "w") as file:
+        json.dump({"meta": metadata(), "results": results}, file, indent=2)
+    print(f"\nWrote {len(results)} results to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            print(f"\n{len(regressions)} cases slower than the baseline by more than {threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,14 @@ def main():
     if len(sys.argv) <= 1:
         print("Calculator App")
         print('Usage: python main.py "<expression>"')
+        print('       python main.py --serve [--socket=PATH] [--render]')
         print('Example: python main.py "3 + 5"')
         return
 
+    if sys.argv[1] == "--serve":
+        serve(sys.argv[2:])
+        return
+
     expression = " ".join(sys.argv[1:])
     try:
         result = calculator.evaluate(expression)
@@ -22,5 +27,28 @@ def main():
         print(f"Error: {e}")
 
 
+def serve(args):
+    # one expression per line in, one result per line out (a box and a blank line with --render)
+    from pkg.server import CalculatorServer, serve_stdio
+
+    rendered = "--render" in args
+    socket_path = None
+    for arg in args:
+        if arg.startswith("--socket="):
+            socket_path = arg.split("=", 1)[1]
+    if socket_path is None:
+        serve_stdio(sys.stdin, sys.stdout, rendered)
+        return
+
+    server = CalculatorServer(socket_path, rendered)
+    print(f"Calculator listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,12 +1,275 @@
 # calculator.py
 
+import codecs
+import operator
+import re
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:  # optional: batches are then evaluated with array('d') and map()
+    numpy = None
+
+# kinds of step in a compiled program
+CONST = 0
+LOAD = 1
+APPLY = 2
+
+
+class CompiledExpression:
+    """An expression parsed into a flat postfix program.
+
+    Each step is (CONST, value), (LOAD, variable name) or (APPLY, binary function). Operators
+    whose operands are both constants are folded at compile time, so a constant expression
+    compiles to a single CONST step.
+    """
+
+    __slots__ = ("source", "program", "variables", "constant")
+
+    def __init__(self, source, program, variables=()):
+        self.source = source
+        self.program = program
+        self.variables = variables
+        self.constant = len(program) == 1 and program[0][0] == CONST
+
+    def evaluate(self, variables=None):
+        if self.constant:
+            return self.program[0][1]
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for kind, arg in self.program:
+            if kind == CONST:
+                push(arg)
+            elif kind == LOAD:
+                try:
+                    push(variables[arg])
+                except (KeyError, TypeError):
+                    raise ValueError(f"unknown variable: {arg}")
+            else:
+                b = pop()
+                stack[-1] = arg(stack[-1], b)
+        return stack[0]
+
+    def evaluate_columns(self, columns, use_numpy=None):
+        """Run the program once over whole columns; see Calculator.evaluate_batch."""
+        missing = [name for name in self.variables if name not in columns]
+        if missing:
+            raise ValueError(f"unknown variable: {missing[0]}")
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("columns must be given and all have the same length")
+        rows = lengths.pop()
+
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        vector = _NumpyColumns(rows) if use_numpy else _ArrayColumns(rows)
+        errors = {}
+        stack = []
+        for kind, arg in self.program:
+            if kind == CONST:
+                # constants stay scalars and are broadcast by the operators
+                stack.append(arg)
+            elif kind == LOAD:
+                stack.append(vector.load(arg, columns[arg], errors))
+            else:
+                b = stack.pop()
+                stack[-1] = vector.apply(arg, stack[-1], b, errors)
+        return BatchResult(vector.result(stack[0]), errors)
+
+
+class BatchResult:
+    """Results of Calculator.evaluate_batch.
+
+    `values` has one result per row (a numpy array, or array('d') without NumPy) with NaN in
+    the rows that failed, and `errors` maps the number of each failed row to its error message.
+    """
+
+    __slots__ = ("values", "errors")
+
+    def __init__(self, values, errors):
+        self.values = values
+        self.errors = errors
+
+
+_NAN = float("nan")
+_group = re.Match.group
+# how far past a token the scanner may look to be sure it has ended ("1e" + "-5")
+_LOOKAHEAD = 64
+# operators that cannot raise for float operands, so whole columns can go through them at once
+_SAFE_OPERATORS = (operator.add, operator.sub, operator.mul)
+
+
+class _ArrayColumns:
+    """Column operations with array('d') and map(): one C-level loop per operator."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def load(self, name, values, errors):
+        if isinstance(values, array) and values.typecode == "d":
+            return values
+        try:
+            return array("d", map(float, values))
+        except (TypeError, ValueError):
+            return array("d", _convert_rows(name, values, errors))
+
+    def apply(self, function, a, b, errors):
+        a_column = isinstance(a, array)
+        b_column = isinstance(b, array)
+        if not a_column and not b_column:
+            return _apply_scalars(function, a, b, self.rows, errors)
+        if function is operator.truediv and b_column and 0.0 in b:
+            # divide by NaN instead of zero so the column still goes through map() in one go
+            b = array("d", b)
+            for row in _zero_rows(b):
+                errors.setdefault(row, "float division by zero")
+                b[row] = _NAN
+        if function in _SAFE_OPERATORS or (function is operator.truediv and (b_column or b != 0)):
+            return array("d", map(function, a if a_column else repeat(a), b if b_column else repeat(b)))
+        return array("d", _apply_rows(function, a if a_column else repeat(a), b if b_column else repeat(b), errors))
+
+    def result(self, value):
+        if isinstance(value, array):
+            return value
+        return array("d", [value]) * self.rows
+
+
+class _NumpyColumns:
+    """Column operations with NumPy float64 arrays."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def load(self, name, values, errors):
+        if (isinstance(values, numpy.ndarray) and values.dtype.kind in "fiub") or (
+            isinstance(values, array) and values.typecode in "dfbBhHiIlLqQ"
+        ):
+            return numpy.asarray(values, dtype=numpy.float64)
+        # anything else is converted value by value (numpy would turn None into NaN silently)
+        return numpy.fromiter(_convert_rows(name, values, errors), dtype=numpy.float64, count=len(values))
+
+    def apply(self, function, a, b, errors):
+        a_column = isinstance(a, numpy.ndarray)
+        b_column = isinstance(b, numpy.ndarray)
+        if not a_column and not b_column:
+            return _apply_scalars(function, a, b, self.rows, errors)
+        if function in _SAFE_OPERATORS:
+            return function(a, b)
+        if function is operator.truediv:
+            if not b_column:
+                if b == 0:
+                    return _apply_scalars(function, a, b, self.rows, errors)
+                return a / b
+            zero = b == 0
+            if not zero.any():
+                return a / b
+            for row in numpy.flatnonzero(zero).tolist():
+                errors.setdefault(row, "float division by zero")
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                values = a / b
+            values[zero] = _NAN
+            return values
+        # operators added to Calculator.operators: call them row by row
+        rows = _apply_rows(function, a.tolist() if a_column else repeat(a), b.tolist() if b_column else repeat(b), errors)
+        return numpy.fromiter(rows, dtype=numpy.float64, count=self.rows)
+
+    def result(self, value):
+        if isinstance(value, numpy.ndarray):
+            return value
+        return numpy.full(self.rows, value, dtype=numpy.float64)
+
+
+def _zero_rows(column):
+    # array.index scans in C, which beats a Python loop when zeros are not too common
+    rows = []
+    try:
+        row = column.index(0.0)
+        while True:
+            rows.append(row)
+            row = column.index(0.0, row + 1)
+    except ValueError:
+        return rows
+
+
+def _convert_rows(name, values, errors):
+    for row, value in enumerate(values):
+        try:
+            yield float(value)
+        except (TypeError, ValueError):
+            errors.setdefault(row, f"invalid value for {name}: {value!r}")
+            yield _NAN
+
+
+def _apply_rows(function, a, b, errors):
+    for row, (x, y) in enumerate(zip(a, b)):
+        try:
+            yield function(x, y)
+        except Exception as error:
+            errors.setdefault(row, str(error))
+            yield _NAN
+
+
+def _apply_scalars(function, a, b, rows, errors):
+    # only reached when folding left an operation that raises, e.g. 1 / 0: every row fails
+    try:
+        return function(a, b)
+    except Exception as error:
+        for row in range(rows):
+            errors.setdefault(row, str(error))
+        return _NAN
+
+
+def _split_exact(text, symbols):
+    # split() is exact when every operator character stands alone, as in the usual
+    # "3 + 5 * 2", and many times faster than scanning; None when it is not
+    tokens = text.split()
+    if symbols is not None and sum(map(text.count, symbols)) == sum(map(tokens.count, symbols)):
+        return tokens
+    return None
+
+
+class _Table(dict):
+    """A dict that calls on_change() after every change made to it."""
+
+    def __init__(self, items, on_change):
+        super().__init__(items)
+        self._on_change = on_change
+
+    def _notifying(method):
+        def changed(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._on_change()
+            return result
+        return changed
+
+    __setitem__ = _notifying(dict.__setitem__)
+    __delitem__ = _notifying(dict.__delitem__)
+    __ior__ = _notifying(dict.__ior__)
+    clear = _notifying(dict.clear)
+    pop = _notifying(dict.pop)
+    popitem = _notifying(dict.popitem)
+    setdefault = _notifying(dict.setdefault)
+    update = _notifying(dict.update)
+    del _notifying
+
+
 class Calculator:
-    def __init__(self):
+    def __init__(self, cache_size=1024):
+        # compiled expressions by source text, least recently used first; the programs hold
+        # the operator functions, so the cache is dropped when operators or precedence change
+        self.cache_size = cache_size
+        self._compiled = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._patterns = {}
         self.operators = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b,
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": operator.truediv,
         }
         self.precedence = {
             "+": 1,
@@ -15,40 +278,175 @@ class Calculator:
             "/": 2,
         }
 
-    def evaluate(self, expression):
+    @property
+    def operators(self):
+        return self._operators
+
+    @operators.setter
+    def operators(self, operators):
+        # copied, so that later changes go through the table and drop the compiled expressions
+        self._operators = _Table(operators, self._compiled.clear)
+        self._compiled.clear()
+
+    @property
+    def precedence(self):
+        return self._precedence
+
+    @precedence.setter
+    def precedence(self, precedence):
+        self._precedence = _Table(precedence, self._compiled.clear)
+        self._compiled.clear()
+
+    def evaluate(self, expression, variables=None):
         if not expression or expression.isspace():
             return None
-        tokens = expression.strip().split()
-        return self._evaluate_infix(tokens)
+        return self.compile(expression).evaluate(variables)
+
+    def evaluate_stream(self, source, variables=None, chunk_size=1 << 16):
+        """Evaluate an expression read from a file-like object (or a string) in one pass.
+
+        Tokens go straight from tokenize() into the compiler, so for a constant expression
+        memory stays bounded by the operator stack, however long the input is. The compiled
+        form is not cached.
+        """
+        return self._compile(self.tokenize(source, chunk_size)).evaluate(variables)
+
+    def evaluate_batch(self, expression, columns, use_numpy=None):
+        """Evaluate `expression` for every row of `columns` in one pass over the columns.
+
+        `columns` maps each variable in the expression to a sequence of values, e.g. a NumPy
+        array, an array('d') or a list; all must have the same length. Each operator is applied
+        to whole columns at once (NumPy when installed, otherwise array('d') and map()). Rows
+        whose values are not numbers or that divide by zero do not stop the batch: their result
+        is NaN and their error is in the returned BatchResult's `errors`.
+        """
+        return self.compile(expression).evaluate_columns(columns, use_numpy)
+
+    def compile(self, expression):
+        compiled = self._compiled.get(expression)
+        if compiled is not None:
+            self.cache_hits += 1
+            self._compiled.move_to_end(expression)
+            return compiled
+        self.cache_misses += 1
+        compiled = self._compile(self.tokenize(expression), expression)
+        if self.cache_size > 0:
+            self._compiled[expression] = compiled
+            if len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def tokenize(self, source, chunk_size=1 << 16):
+        """Return the tokens of `source`, a string or a file-like object read in chunks.
+
+        Tokens do not need whitespace between them: "3*4+-2" is 3, *, 4, +, -2. A + or - is
+        the sign of a number when an operand is expected and the number follows it directly,
+        as in "2 * -3"; otherwise it is an operator. A file is scanned a chunk at a time, so
+        memory does not grow with its length.
+        """
+        pattern, symbols = self._token_patterns()
+        if isinstance(source, str):
+            tokens = _split_exact(source, symbols)
+            if tokens is not None:
+                return tokens
+            return self._split_signs(map(_group, pattern.finditer(source)))
+        return self._split_signs(self._scan(source, chunk_size, pattern, symbols))
+
+    def _scan(self, source, chunk_size, pattern, symbols):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        for chunk in chunks:
+            buffer += decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            # no token spans whitespace, so everything up to the last of it can be scanned
+            cut = max(buffer.rfind(" "), buffer.rfind("\n"), buffer.rfind("\t"))
+            if cut < 0:
+                cut = 0
+                for match in pattern.finditer(buffer):
+                    # a token this close to the end may go on in the next chunk
+                    if match.end() > len(buffer) - _LOOKAHEAD:
+                        break
+                    cut = match.end()
+                    yield match.group()
+            else:
+                tokens = _split_exact(buffer[:cut], symbols)
+                yield from map(_group, pattern.finditer(buffer, 0, cut)) if tokens is None else tokens
+            buffer = buffer[cut:]
+        # raises on a multi-byte character cut off by the end of the input
+        buffer += decoder.decode(b"", final=True)
+        yield from map(_group, pattern.finditer(buffer))
+
+    def _split_signs(self, tokens):
+        # the scanner reads a sign into every number it directly precedes; where an operator
+        # is expected instead ("3-2", "3 -2"), it is one
+        operators = self.operators
+        expect_operand = True
+        for token in tokens:
+            if token in operators:
+                expect_operand = True
+            elif expect_operand:
+                expect_operand = False
+            elif token[0] in "+-":
+                yield token[0]
+                token = token[1:]
+            yield token
+
+    def _token_patterns(self):
+        key = tuple(self.operators)
+        patterns = self._patterns.get(key)
+        if patterns is None:
+            symbols = sorted(self.operators, key=len, reverse=True)
+            excluded = re.escape("".join(sorted({symbol[0] for symbol in symbols})))
+            token = re.compile(
+                # a number with an optional sign (when nothing but whitespace or an operator
+                # follows it), then the operators, then any other run of characters
+                rf"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?(?![^\s{excluded}])"
+                + "".join("|" + re.escape(symbol) for symbol in symbols)
+                + rf"|[^\s{excluded}]+"
+            )
+            single = tuple(symbols) if all(len(symbol) == 1 for symbol in symbols) else None
+            patterns = self._patterns[key] = (token, single)
+        return patterns
 
     def _evaluate_infix(self, tokens):
+        return self._compile(tokens).evaluate()
+
+    def _compile(self, tokens, source=None):
+        # an operand is a constant value (folded as soon as both sides of an operator are
+        # constants) or, once a variable is involved, the list of program steps computing it
         values = []
         operators = []
+        variables = {}
+        table, precedence = self.operators, self.precedence
 
         for token in tokens:
-            if token in self.operators:
+            if token in table:
                 while (
                     operators
-                    and operators[-1] in self.operators
-                    and self.precedence[operators[-1]] >= self.precedence[token]
+                    and operators[-1] in table
+                    and precedence[operators[-1]] >= precedence[token]
                 ):
-                    self._apply_operator(operators, values)
+                    self._apply_operator(operators, values, table)
                 operators.append(token)
             else:
                 try:
                     values.append(float(token))
                 except ValueError:
-                    raise ValueError(f"invalid token: {token}")
+                    if not token.isidentifier():
+                        raise ValueError(f"invalid token: {token}")
+                    values.append([(LOAD, token)])
+                    variables[token] = None
 
         while operators:
-            self._apply_operator(operators, values)
+            self._apply_operator(operators, values, table)
 
         if len(values) != 1:
             raise ValueError("invalid expression")
 
-        return values[0]
+        program = values[0] if isinstance(values[0], list) else [(CONST, values[0])]
+        return CompiledExpression(source, tuple(program), tuple(variables))
 
-    def _apply_operator(self, operators, values):
+    def _apply_operator(self, operators, values, table):
         if not operators:
             return
 
@@ -58,4 +456,18 @@ class Calculator:
 
         b = values.pop()
         a = values.pop()
-        values.append(self.operators[operator](a, b))
\ No newline at end of file
+        function = table[operator]
+        if not isinstance(a, list) and not isinstance(b, list):
+            try:
+                values.append(function(a, b))
+                return
+            except Exception:
+                # e.g. division by zero: leave it to raise when the expression is evaluated
+                pass
+        program = a if isinstance(a, list) else [(CONST, a)]
+        if isinstance(b, list):
+            program.extend(b)
+        else:
+            program.append((CONST, b))
+        program.append((APPLY, function))
+        values.append(program)
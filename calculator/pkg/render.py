@@ -1,10 +1,13 @@
 # render.py
 
-def render(expression, result):
+def format_result(result):
     if isinstance(result, float) and result.is_integer():
-        result_str = str(int(result))
-    else:
-        result_str = str(result)
+        return str(int(result))
+    return str(result)
+
+
+def render(expression, result):
+    result_str = format_result(result)
 
     box_width = max(len(expression), len(result_str)) + 4
 
@@ -0,0 +1,86 @@
+# server.py
+
+import os
+import socketserver
+import stat
+
+from pkg.calculator import Calculator
+from pkg.render import format_result, render
+
+CHUNK_SIZE = 64 * 1024
+
+
+def respond(calculator, line, rendered=False):
+    expression = line.decode("utf-8", errors="replace").strip()
+    try:
+        result = calculator.evaluate(expression)
+    except Exception as e:
+        return f"Error: {e}\n\n" if rendered else f"Error: {e}\n"
+    if rendered:
+        # a blank line after every box marks where it ends
+        return render(expression, result) + "\n\n"
+    return format_result(result) + "\n"
+
+
+def serve(read, write, calculator=None, rendered=False):
+    """Answer newline-delimited expressions until `read` returns b"", skipping blank lines.
+
+    `read()` returns whatever input is available, so when a client sends many expressions
+    without waiting for the answers (pipelining) they are all answered with one `write()`;
+    a client that waits for each answer gets it as soon as its line arrives.
+    """
+    calculator = calculator or Calculator()
+    pending = b""
+    answered = 0
+    while True:
+        chunk = read()
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        # blank lines are skipped rather than answered
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            write("".join([respond(calculator, line, rendered) for line in lines]).encode())
+            answered += len(lines)
+    if pending.strip():
+        write(respond(calculator, pending, rendered).encode())
+        answered += 1
+    return answered
+
+
+def serve_stdio(stdin, stdout, rendered=False):
+    fd = stdin.fileno()
+    out = stdout.buffer
+
+    def write(data):
+        out.write(data)
+        out.flush()
+
+    return serve(lambda: os.read(fd, CHUNK_SIZE), write, rendered=rendered)
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # a calculator (and compile cache) per connection: connections run in their own threads
+        serve(lambda: self.request.recv(CHUNK_SIZE), self.request.sendall, rendered=self.server.rendered)
+
+
+class CalculatorServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, rendered=False):
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)  # left over from a server that did not shut down cleanly
+        except FileNotFoundError:
+            pass
+        super().__init__(path, _ConnectionHandler)
+        self.rendered = rendered
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
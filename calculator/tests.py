@@ -1,7 +1,12 @@
 # tests.py
 
+import io
+import operator
 import unittest
-from pkg.calculator import Calculator
+from array import array
+
+from pkg.calculator import Calculator, numpy
+from pkg.server import serve
 
 
 class TestCalculator(unittest.TestCase):
@@ -48,6 +53,157 @@ class TestCalculator(unittest.TestCase):
         result = self.calculator.evaluate("3 + 7 * 2")
         self.assertEqual(result, 17)
 
+    def test_constant_folding(self):
+        compiled = self.calculator.compile("2 * 3 - 8 / 2 + 5")
+        self.assertTrue(compiled.constant)
+        self.assertEqual(compiled.evaluate(), 7)
+
+    def test_compiled_expressions_are_cached(self):
+        self.calculator.evaluate("3 + 5")
+        self.calculator.evaluate("3 + 5")
+        self.assertEqual(self.calculator.cache_misses, 1)
+        self.assertEqual(self.calculator.cache_hits, 1)
+
+    def test_cache_is_bounded(self):
+        calculator = Calculator(cache_size=2)
+        for expression in ("1 + 1", "2 + 2", "3 + 3", "1 + 1"):
+            calculator.evaluate(expression)
+        self.assertEqual(calculator.cache_misses, 4)
+        self.assertEqual(len(calculator._compiled), 2)
+
+    def test_changing_operators_drops_compiled_expressions(self):
+        self.assertEqual(self.calculator.evaluate("2 - 3 * 4"), -10)
+        self.calculator.precedence["-"] = 3
+        self.assertEqual(self.calculator.evaluate("2 - 3 * 4"), -4)
+        self.calculator.operators["*"] = operator.pow
+        self.assertEqual(self.calculator.evaluate("2 - 3 * 4"), 1)
+        self.calculator.precedence = {"+": 1, "-": 1, "*": 2, "/": 2}
+        self.assertEqual(self.calculator.evaluate("2 - 3 * 4"), -79)
+
+    def test_variables(self):
+        result = self.calculator.evaluate("x * 2 + y", {"x": 4, "y": 1})
+        self.assertEqual(result, 9)
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("x * 2 + y", {"x": 4})
+
+    def test_division_by_zero_raises_on_every_evaluation(self):
+        for _ in range(2):
+            with self.assertRaises(ZeroDivisionError):
+                self.calculator.evaluate("1 / 0")
+
+    def test_tokens_without_whitespace(self):
+        self.assertEqual(list(self.calculator.tokenize("3*4+10/2")), ["3", "*", "4", "+", "10", "/", "2"])
+        self.assertEqual(self.calculator.evaluate("3*4+10/2"), 17)
+
+    def test_unary_signs(self):
+        self.assertEqual(list(self.calculator.tokenize("3*4+-2")), ["3", "*", "4", "+", "-2"])
+        self.assertEqual(self.calculator.evaluate("2 * -3"), -6)
+        self.assertEqual(self.calculator.evaluate("3-2"), 1)
+        self.assertEqual(self.calculator.evaluate("3 -2"), 1)
+
+    def test_exponents(self):
+        self.assertEqual(list(self.calculator.tokenize("1e-3*2E+2")), ["1e-3", "*", "2E+2"])
+        self.assertEqual(self.calculator.evaluate("1e-3*2E+2"), 0.2)
+
+    def test_stream_in_chunks(self):
+        expression = " + ".join(f"{i}*x-1e-3/-2" for i in range(200))
+        expected = list(self.calculator.tokenize(expression))
+        for chunk_size in (1, 2, 3, 7, 64):
+            self.assertEqual(list(self.calculator.tokenize(io.StringIO(expression), chunk_size)), expected)
+            self.assertEqual(list(self.calculator.tokenize(io.BytesIO(expression.encode()), chunk_size)), expected)
+        self.assertEqual(self.calculator.evaluate_stream(io.StringIO(expression), {"x": 1}, chunk_size=5),
+                         self.calculator.evaluate(expression, {"x": 1}))
+
+    def test_stream_ending_inside_a_character(self):
+        for chunk_size in (1, 64):
+            with self.assertRaises(UnicodeDecodeError):
+                list(self.calculator.tokenize(io.BytesIO("3 + x\u00e9".encode()[:-1]), chunk_size))
+
+
+class TestEvaluateBatch(unittest.TestCase):
+    use_numpy = False
+
+    def setUp(self):
+        self.calculator = Calculator()
+
+    def evaluate_batch(self, expression, columns):
+        return self.calculator.evaluate_batch(expression, columns, use_numpy=self.use_numpy)
+
+    def test_matches_scalar_evaluation(self):
+        x = array("d", [1.5, -2.0, 3.25, 0.1])
+        y = array("d", [4.0, 0.5, -1.0, 3.0])
+        expression = "x * 2 + y / 3 - x * y"
+        result = self.evaluate_batch(expression, {"x": x, "y": y})
+        expected = [self.calculator.evaluate(expression, {"x": a, "y": b}) for a, b in zip(x, y)]
+        self.assertEqual(list(result.values), expected)
+        self.assertEqual(result.errors, {})
+
+    def test_errors_are_reported_per_row(self):
+        result = self.evaluate_batch("x / y + 1", {"x": [1, 2, 3, 4], "y": [2, 0, "abc", None]})
+        self.assertEqual(result.values[0], 1.5)
+        self.assertEqual(sorted(result.errors), [1, 2, 3])
+        self.assertIn("division by zero", result.errors[1])
+        self.assertIn("abc", result.errors[2])
+        for row in (1, 2, 3):
+            self.assertNotEqual(result.values[row], result.values[row])  # NaN
+
+    def test_constant_division_by_zero_fails_every_row(self):
+        result = self.evaluate_batch("x + 1 / 0", {"x": [1, 2]})
+        self.assertEqual(sorted(result.errors), [0, 1])
+
+    def test_missing_variable(self):
+        with self.assertRaises(ValueError):
+            self.evaluate_batch("x + y", {"x": [1, 2]})
+
+    def test_columns_of_different_lengths(self):
+        with self.assertRaises(ValueError):
+            self.evaluate_batch("x + y", {"x": [1, 2], "y": [1]})
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestEvaluateBatchNumpy(TestEvaluateBatch):
+    use_numpy = True
+
+
+class TestServe(unittest.TestCase):
+    def run_serve(self, chunks, rendered=False):
+        chunks = list(chunks)
+        written = []
+        answered = serve(lambda: chunks.pop(0) if chunks else b"", written.append, rendered=rendered)
+        return answered, written
+
+    def test_pipelined_lines_are_answered_with_one_write(self):
+        answered, written = self.run_serve([b"3 + 5\n2 * 3\n10 / 4\n"])
+        self.assertEqual(answered, 3)
+        self.assertEqual(written, [b"8\n6\n2.5\n"])
+
+    def test_lines_split_across_reads(self):
+        answered, written = self.run_serve([b"3 +", b" 5\n2 ", b"* 3\n"])
+        self.assertEqual(b"".join(written), b"8\n6\n")
+
+    def test_trailing_line_without_newline(self):
+        answered, written = self.run_serve([b"3 + 5\n2 * 3"])
+        self.assertEqual(answered, 2)
+        self.assertEqual(b"".join(written), b"8\n6\n")
+
+    def test_error_line(self):
+        answered, written = self.run_serve([b"1 / 0\n$ 3\n3 + 5\n"])
+        lines = b"".join(written).decode().splitlines()
+        self.assertEqual(lines[0], "Error: float division by zero")
+        self.assertTrue(lines[1].startswith("Error: invalid token"))
+        self.assertEqual(lines[2], "8")
+
+    def test_blank_lines_are_skipped(self):
+        answered, written = self.run_serve([b"3 + 5\n\n  \n2 * 3\n\n"])
+        self.assertEqual(answered, 2)
+        self.assertEqual(b"".join(written), b"8\n6\n")
+
+    def test_rendered(self):
+        _, written = self.run_serve([b"3 + 5\n"], rendered=True)
+        output = b"".join(written).decode()
+        self.assertIn("│  8", output)
+        self.assertTrue(output.endswith("┘\n\n"))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
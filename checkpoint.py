@@ -0,0 +1,50 @@
+"""Session checkpoints for --resume.
+
+With main.py --checkpoint[=PATH] (off by default, so that concurrent runs do not overwrite
+each other's file), after every completed turn (the model's message plus the responses to all
+of its function calls) run_session writes the conversation, the agent's state
+(agent.get_state()) and the loop counter to a gzip-compressed JSON file. The file is replaced
+atomically, so a crash while writing leaves the previous checkpoint intact. Resuming continues after the last completed
+turn: its model calls and tool runs are not repeated. Tools that ran in a turn that did not
+complete are run again, because their results were never saved.
+"""
+import gzip
+import json
+import os
+import time
+
+from functions.write_file import atomic_write_bytes
+
+CHECKPOINT_FORMAT_VERSION = 1
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".agent_cache", "checkpoint.json.gz")
+
+
+def save_checkpoint(path, prompt, agent, loop, messages, final_text=None):
+    data = {
+        "version": CHECKPOINT_FORMAT_VERSION,
+        "saved_at": time.time(),
+        "prompt": prompt,
+        "agent": type(agent).__name__,
+        "agent_state": agent.get_state(),
+        "loop": loop,
+        "finished": final_text is not None,
+        "final_text": final_text,
+        "messages": [message.model_dump(mode="json", exclude_none=True) for message in messages],
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    atomic_write_bytes(path, gzip.compress(json.dumps(data, separators=(",", ":")).encode(), compresslevel=6))
+
+
+def load_checkpoint(path):
+    """The saved checkpoint with its messages as types.Content, or None if there is none."""
+    from google.genai import types
+
+    try:
+        with open(path, "rb") as file:
+            data = json.loads(gzip.decompress(file.read()))
+    except FileNotFoundError:
+        return None
+    if data.get("version") != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format in {path}")
+    data["messages"] = [types.Content.model_validate(message) for message in data["messages"]]
+    return data
@@ -0,0 +1,182 @@
+import json
+import os
+
+from google.genai import types
+
+# roughly 4 characters per token for English text and code
+CHARS_PER_TOKEN = 4
+SUMMARY_MARKER = "[Summary of earlier turns, removed to stay within the token budget]"
+MAX_SUMMARY_LINES = 60
+
+
+class ContextManager:
+    """Keeps the conversation sent to the model small.
+
+    Before every model call `compact(messages)`:
+      - replaces get_file_content results that went stale (the file was written later, or
+        read again later) with a short stub, and
+      - when the estimated size is over `token_budget`, folds the oldest complete
+        model/function-response pairs into a short summary appended to the first user message.
+
+    Function calls and their responses are only ever stubbed in place or removed together,
+    so every function_call still has its matching function_response.
+    """
+
+    def __init__(self, token_budget=None, keep_recent=4, fixed_tokens=0, working_directory=".", on_forget=None):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        # system instruction and tool declarations, sent with every request
+        self.fixed_tokens = fixed_tokens
+        self.working_directory = working_directory
+        # called with the resolved path of every file whose content was summarized away
+        self.on_forget = on_forget
+        # measured prompt tokens / estimated tokens, updated from usage metadata
+        self.scale = 1.0
+        self.stats = {"stubbed": 0, "summarized_messages": 0, "tokens_saved": 0}
+        self._sizes = {}  # id(message) -> (message, estimated tokens)
+
+    # Token estimates
+    def estimate(self, content):
+        cached = self._sizes.get(id(content))
+        if cached is not None and cached[0] is content:
+            return cached[1]
+        chars = 0
+        for part in content.parts or []:
+            if part.text:
+                chars += len(part.text)
+            if part.function_call is not None:
+                chars += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+            if part.function_response is not None:
+                chars += len(part.function_response.name or "") + len(json.dumps(part.function_response.response or {}, default=str))
+        tokens = chars // CHARS_PER_TOKEN + 1
+        self._sizes[id(content)] = (content, tokens)
+        return tokens
+
+    def estimate_total(self, messages):
+        return int((self.fixed_tokens + sum(self.estimate(message) for message in messages)) * self.scale)
+
+    def observe(self, messages, prompt_token_count):
+        """Calibrate the estimate against the prompt token count the API reported."""
+        if not prompt_token_count:
+            return
+        estimated = self.fixed_tokens + sum(self.estimate(message) for message in messages)
+        if estimated:
+            self.scale = max(0.25, min(4.0, prompt_token_count / estimated))
+
+    # Compaction
+    def compact(self, messages):
+        self._stub_stale_reads(messages)
+        if self.token_budget is not None and self.estimate_total(messages) > self.token_budget:
+            self._summarize(messages)
+        # forget sizes of messages that are gone
+        live = {id(message) for message in messages}
+        for key in [key for key in self._sizes if key not in live]:
+            del self._sizes[key]
+
+    def _calls(self, messages):
+        """Yield (message index, part index, function_call, function_response part) for every answered call."""
+        for i in range(len(messages) - 1):
+            model, responses = messages[i], messages[i + 1]
+            if model.role != "model" or responses.role != "user":
+                continue
+            calls = [part.function_call for part in model.parts or [] if part.function_call is not None]
+            response_parts = [j for j, part in enumerate(responses.parts or []) if part.function_response is not None]
+            for call, j in zip(calls, response_parts):
+                yield i + 1, j, call, responses.parts[j]
+
+    def _stub_stale_reads(self, messages):
+        latest_read = {}  # path and arguments of a read -> (message index, part index)
+        stale = []
+        for i, j, call, part in self._calls(messages):
+            args = call.args or {}
+            path = os.path.normpath(str(args.get("file_path", "")))
+            result = (part.function_response.response or {}).get("result")
+            if not isinstance(result, str) or result.startswith("[stale"):
+                continue
+            if call.name == "get_file_content" and not result.startswith("Error"):
+                if result.endswith("unchanged since last read"):
+                    continue
+                # a later read with the same range makes the earlier one redundant
+                key = f"{path}|{json.dumps(args, sort_keys=True, default=str)}"
+                if key in latest_read:
+                    stale.append((*latest_read[key], path, "it was read again later"))
+                latest_read[key] = (i, j)
+            elif call.name in ("write_file", "patch_file") and result.startswith("Successfully"):
+                for key, (ri, rj) in list(latest_read.items()):
+                    if key.split("|", 1)[0] == path:
+                        stale.append((ri, rj, path, "the file was changed later"))
+                        del latest_read[key]
+
+        for i, j, path, reason in stale:
+            message = messages[i]
+            old = message.parts[j]
+            parts = list(message.parts)
+            parts[j] = types.Part.from_function_response(
+                name=old.function_response.name,
+                response={"result": f"[stale: content of {path} omitted because {reason}; read it again if needed]"},
+            )
+            before = self.estimate(message)
+            messages[i] = types.Content(role=message.role, parts=parts)
+            self.stats["stubbed"] += 1
+            self.stats["tokens_saved"] += max(0, before - self.estimate(messages[i]))
+
+    def _summarize(self, messages):
+        # messages[0] is the user prompt. Cutting messages[1:cut] only in front of a model
+        # message removes whole model/function-response pairs and keeps user/model alternation.
+        total = self.estimate_total(messages)
+        removed = 0
+        cut = None
+        for k in range(2, len(messages) - self.keep_recent + 1):
+            removed += self.estimate(messages[k - 1])
+            if messages[k].role != "model":
+                continue
+            cut = k
+            if total - removed * self.scale <= self.token_budget:
+                break
+        if cut is None:
+            return
+
+        lines = self._summary_lines(messages[1:cut])
+        if self.on_forget is not None:
+            for _, _, call, _ in self._calls(messages[1:cut]):
+                if call.name == "get_file_content":
+                    path = str((call.args or {}).get("file_path", ""))
+                    self.on_forget(os.path.realpath(os.path.join(self.working_directory, path)))
+        before = sum(self.estimate(message) for message in messages[:cut])
+        messages[0] = self._with_summary(messages[0], lines)
+        del messages[1:cut]
+        self.stats["summarized_messages"] += cut - 1
+        self.stats["tokens_saved"] += max(0, before - self.estimate(messages[0]))
+
+    def _summary_lines(self, removed):
+        """One line per model text, user text and function call (with a shortened result)."""
+        pairs = list(self._calls(removed))
+        lines = []
+        for index, message in enumerate(removed):
+            for part in message.parts or []:
+                if part.text:
+                    lines.append(f"- {message.role}: {_shorten(part.text)}")
+            for i, _, call, response in pairs:
+                if i != index + 1:
+                    continue
+                result = response.function_response.response or {}
+                result = result.get("result", result.get("error", ""))
+                args = ", ".join(f"{k}={_shorten(str(v), 40)}" for k, v in (call.args or {}).items())
+                lines.append(f"- {call.name}({args}) -> {_shorten(str(result))}")
+        return lines
+
+    def _with_summary(self, first, lines):
+        parts = list(first.parts or [])
+        previous = []
+        if parts and parts[-1].text and parts[-1].text.startswith(SUMMARY_MARKER):
+            previous = parts.pop().text.split("\n")[1:]
+        combined = previous + lines
+        if len(combined) > MAX_SUMMARY_LINES:
+            combined = ["- ..."] + combined[-(MAX_SUMMARY_LINES - 1):]
+        parts.append(types.Part(text="\n".join([SUMMARY_MARKER] + combined)))
+        return types.Content(role=first.role, parts=parts)
+
+
+def _shorten(text, limit=100):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
@@ -1 +1,20 @@
 MAX_FILE_CHARACTERS = 10000
+
+# run_python_file limits
+MAX_OUTPUT_BYTES = 20000  # per stream; the first and last half are kept
+RUN_TIMEOUT_SECONDS = 30
+RUN_CPU_LIMIT_SECONDS = None
+RUN_MEMORY_LIMIT_MB = None
+
+# get_file_content cache (process wide)
+FILE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# get_files_info page size
+MAX_LIST_ENTRIES = 500
+
+# get_workspace_summary limits
+MAX_SUMMARY_ENTRIES = 500
+MAX_SUMMARY_CHARACTERS = 20000
+
+# search_files result limit
+MAX_SEARCH_MATCHES = 100
@@ -0,0 +1,85 @@
+"""Process-wide LRU cache of file contents for get_file_content.
+
+Entries are keyed by resolved path and only served while the file's (mtime_ns, size) still
+match, so a changed file is always re-read. write_file drops the entry for the file it writes.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+
+class FileContentCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # path -> (version, value, size)
+        self._lock = threading.Lock()
+
+    def get(self, path, version):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path, version, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(path)
+            self._entries[path] = (version, value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, path):
+        with self._lock:
+            self._remove(path)
+
+    def invalidate_tree(self, directory):
+        """Drop the entries for every file below `directory` (a resolved path)."""
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for path in [path for path in self._entries if path.startswith(prefix)]:
+                self._remove(path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+def _create_cache():
+    from functions.config import FILE_CACHE_MAX_BYTES
+
+    return FileContentCache(FILE_CACHE_MAX_BYTES)
+
+
+file_cache = _create_cache()
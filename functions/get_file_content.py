@@ -1,4 +1,4 @@
-def get_file_content(working_directory, file_path):
+def get_file_content(working_directory, file_path, offset=None, length=None, start_line=None, end_line=None, seen_files=None):
     import os
 
     full_working_directory = os.path.abspath(working_directory)
@@ -12,23 +12,97 @@ def get_file_content(working_directory, file_path):
     
     try:
         from functions.config import MAX_FILE_CHARACTERS
+        from functions.file_cache import file_cache
 
-        with open(full_file_path, 'r') as file:
-            content = file.read(MAX_FILE_CHARACTERS)
-            if len(content) < MAX_FILE_CHARACTERS:
-                #print("returning full content  ")
-                return content
-            else:
-                #print("returning truncated content  ")
-                return f'{content}[...File "{file_path}" truncated at {MAX_FILE_CHARACTERS} characters]'        
+        resolved_path = os.path.realpath(full_file_path)
+        stat = os.stat(resolved_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        if offset is not None or length is not None:
+            if start_line is not None or end_line is not None:
+                return 'Error: Use either offset/length or start_line/end_line, not both'
+            return _read_bytes(resolved_path, file_path, offset or 0, length, MAX_FILE_CHARACTERS)
+        if start_line is not None or end_line is not None:
+            return _read_lines(resolved_path, version, file_path, start_line or 1, end_line, MAX_FILE_CHARACTERS)
+
+        # seen_files: {resolved path: version} of what this session's model already has
+        if seen_files is not None and seen_files.get(resolved_path) == version:
+            return f'File "{file_path}" unchanged since last read'
+
+        content = file_cache.get(resolved_path, version)
+        if content is None:
+            with open(full_file_path, 'r') as file:
+                content = file.read(MAX_FILE_CHARACTERS)
+            file_cache.put(resolved_path, version, content)
+
+        if seen_files is not None:
+            seen_files[resolved_path] = version
+
+        if len(content) < MAX_FILE_CHARACTERS:
+            #print("returning full content  ")
+            return content
+        else:
+            #print("returning truncated content  ")
+            from functions.workspace_index import get_workspace_index
+
+            index = get_workspace_index(full_working_directory, create=False)
+            indexed = None
+            if index is not None:
+                indexed = index.lookup(os.path.relpath(full_file_path, full_working_directory), stat.st_size, stat.st_mtime_ns)
+            if indexed is not None:
+                return f'{content}[...File "{file_path}" truncated at {MAX_FILE_CHARACTERS} characters, it has {indexed["lines"]} lines; use start_line/end_line to read the rest]'
+            return f'{content}[...File "{file_path}" truncated at {MAX_FILE_CHARACTERS} characters]'        
     
     except Exception as e:
         return f"Error: {str(e)}"
     
+def _read_bytes(resolved_path, file_path, offset, length, max_characters):
+    from functions.ranged_read import read_byte_range
+
+    if offset < 0:
+        return 'Error: offset must be 0 or greater'
+    length = max_characters if length is None else min(length, max_characters)
+    if length <= 0:
+        return 'Error: length must be greater than 0'
+
+    content, size = read_byte_range(resolved_path, offset, length)
+    if offset >= size:
+        return f'Error: offset {offset} is past the end of "{file_path}" ({size} bytes)'
+    end = min(offset + length, size)
+    return f'{content}[...File "{file_path}" bytes {offset}-{end} of {size}]'
+
+
+def _read_lines(resolved_path, version, file_path, start_line, end_line, max_characters):
+    from functions.ranged_read import read_line_range
+
+    if start_line < 1:
+        return 'Error: start_line must be 1 or greater'
+    if end_line is None:
+        # open ended: enough lines to fill a page, the character limit below still applies
+        end_line = start_line + max_characters // 40
+    if end_line < start_line:
+        return 'Error: end_line must not be smaller than start_line'
+
+    # a character takes at most 4 bytes, so this many bytes always fill the page
+    content, last_line, total_lines, truncated = read_line_range(
+        resolved_path, version, start_line, end_line, max_bytes=max_characters * 4)
+    if last_line == 0:
+        return f'Error: "{file_path}" has fewer than {start_line} lines'
+
+    if truncated or len(content) > max_characters:
+        content = content[:max_characters]
+        # the last line that made it into the page, in full or in part
+        last_line = start_line + content.count("\n", 0, len(content) - 1)
+        return f'{content}[...File "{file_path}" lines {start_line}-{last_line} truncated at {max_characters} characters]'
+    if total_lines is None:
+        return f'{content}[...File "{file_path}" lines {start_line}-{last_line}, more lines follow]'
+    return f'{content}[...File "{file_path}" lines {start_line}-{last_line} of {total_lines}]'
+
+
 from google.genai import types
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Returns the content of a file as text, constrained to the working directory.",
+    description="Returns the content of a file as text, constrained to the working directory. Without a range only the beginning of large files is returned; use offset/length or start_line/end_line to read further.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -36,6 +110,26 @@ schema_get_file_content = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The path to the file to read, relative to the working directory.",
             ),
+            "offset": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional byte offset to start reading from, for files too large to read at once.",
+                nullable=True,
+            ),
+            "length": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of bytes to read starting at offset.",
+                nullable=True,
+            ),
+            "start_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional first line to read (1-based). Use with end_line to page through large files.",
+                nullable=True,
+            ),
+            "end_line": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional last line to read (1-based, inclusive).",
+                nullable=True,
+            ),
         },
     ),
 )
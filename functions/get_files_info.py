@@ -1,7 +1,10 @@
 import os
 from google.genai import types
 
-def get_files_info(working_directory, directory="."):
+def get_files_info(working_directory, directory=".", recursive=False, max_depth=None, pattern=None, ignore=None, cursor=None):
+    from functions.config import MAX_LIST_ENTRIES
+    from functions.workspace_index import get_workspace_index
+
     working_directory = os.path.abspath(working_directory)
     fullpath = os.path.join(working_directory, directory)
     fullpath = os.path.abspath(fullpath)
@@ -9,21 +12,109 @@ def get_files_info(working_directory, directory="."):
     #check fullpath is in working_directory
     if not fullpath.startswith(working_directory):
         return f'Error: Cannot list "{directory}" as it is outside the permitted working directory'
-        
+
     if not os.path.isdir(fullpath):
         return f'Error: "{directory}" is not a directory'
     try:
-        fullstring = ""
-        for file in os.listdir(fullpath):
-            fullstring += f"- {file}: file_size={os.path.getsize(os.path.join(fullpath, file))} bytes, is_dir={os.path.isdir(os.path.join(fullpath, file))}\n"
-        
-        return fullstring
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        return f'Error: Invalid cursor "{cursor}"'
+    try:
+        rules = None
+        if recursive:
+            rules = _gitignore_rules(working_directory, fullpath)
+        entries = _walk(fullpath, "", 1, max_depth if recursive else 1, rules, ignore or [])
+        # line counts come from the workspace index when it has been built and is current
+        index = get_workspace_index(working_directory, create=False)
+        index_prefix = os.path.relpath(fullpath, working_directory)
+
+        lines = []
+        matched = 0
+        has_more = False
+        for entry, rel_path, is_dir in entries:
+            if pattern and not (_fnmatch(entry.name, pattern) or _fnmatch(rel_path, pattern)):
+                continue
+            matched += 1
+            if matched <= start:
+                continue
+            if len(lines) == MAX_LIST_ENTRIES:
+                has_more = True
+                break
+            # DirEntry caches the stat result, one syscall per entry at most
+            stat = entry.stat()
+            indexed = None
+            if index is not None and not is_dir:
+                indexed = index.lookup(os.path.normpath(os.path.join(index_prefix, rel_path)), stat.st_size, stat.st_mtime_ns)
+            if indexed is not None:
+                lines.append(f"- {rel_path}: file_size={stat.st_size} bytes, is_dir={is_dir}, lines={indexed['lines']}\n")
+            else:
+                lines.append(f"- {rel_path}: file_size={stat.st_size} bytes, is_dir={is_dir}\n")
+
+        if has_more:
+            lines.append(f'[...more entries, call again with cursor="{start + len(lines)}"]\n')
+        return "".join(lines)
     except Exception as e:
         return f"Error: {str(e)}"
-    
+
+
+def _fnmatch(name, pattern):
+    import fnmatch
+    return fnmatch.fnmatchcase(name, pattern)
+
+
+def _gitignore_rules(working_directory, fullpath):
+    from functions.gitignore import GitIgnore
+
+    # .gitignore files from the working directory down to the listed directory all apply
+    rules = GitIgnore()
+    rel_dir = ""
+    directory = working_directory
+    rules = rules.for_directory(directory, rel_dir)
+    relative = os.path.relpath(fullpath, working_directory)
+    if relative != ".":
+        for part in relative.split(os.sep):
+            directory = os.path.join(directory, part)
+            rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+            rules = rules.for_directory(directory, rel_dir)
+    return _RootedRules(rules, os.path.relpath(fullpath, working_directory))
+
+
+class _RootedRules:
+    """GitIgnore rules are relative to the working directory, listings to the listed directory."""
+
+    def __init__(self, rules, prefix):
+        self.rules = rules
+        self.prefix = "" if prefix == "." else prefix.replace(os.sep, "/")
+
+    def _full(self, rel_path):
+        return f"{self.prefix}/{rel_path}" if self.prefix else rel_path
+
+    def for_directory(self, directory, rel_dir):
+        return _RootedRules(self.rules.for_directory(directory, self._full(rel_dir)), self.prefix)
+
+    def ignored(self, rel_path, is_dir):
+        return self.rules.ignored(self._full(rel_path), is_dir)
+
+
+def _walk(directory, rel_dir, depth, max_depth, rules, ignore):
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        is_dir = entry.is_dir()
+        if rules is not None and rules.ignored(rel_path, is_dir):
+            continue
+        if any(_fnmatch(entry.name, p) or _fnmatch(rel_path, p) for p in ignore):
+            continue
+        yield entry, rel_path, is_dir
+        if is_dir and (max_depth is None or depth < max_depth) and not entry.is_symlink():
+            child_rules = rules.for_directory(entry.path, rel_path) if rules is not None else None
+            yield from _walk(entry.path, rel_path, depth + 1, max_depth, child_rules, ignore)
+
+
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Lists files in the specified directory along with their sizes, constrained to the working directory.",
+    description="Lists files in the specified directory along with their sizes, constrained to the working directory. Can list a whole tree at once with recursive=true.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -31,6 +122,32 @@ schema_get_files_info = types.FunctionDeclaration(
                 type=types.Type.STRING,
                 description="The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
             ),
+            "recursive": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Optional. List subdirectories too (entries matched by .gitignore are skipped).",
+                nullable=True,
+            ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional. With recursive, how many directory levels to list (1 = only the directory itself).",
+                nullable=True,
+            ),
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Optional glob; only entries whose name or relative path match are listed, e.g. '*.py'.",
+                nullable=True,
+            ),
+            "ignore": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description="Optional globs of entries to skip, e.g. ['*.txt', 'build'].",
+                nullable=True,
+            ),
+            "cursor": types.Schema(
+                type=types.Type.STRING,
+                description="Optional. Cursor from a previous truncated listing to get the next page.",
+                nullable=True,
+            ),
         },
     ),
-)
\ No newline at end of file
+)
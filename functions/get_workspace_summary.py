@@ -0,0 +1,45 @@
+def get_workspace_summary(working_directory, directory=".", max_depth=None):
+    import os
+    from functions.config import MAX_SUMMARY_CHARACTERS, MAX_SUMMARY_ENTRIES
+    from functions.workspace_index import get_workspace_index
+
+    directory = directory or "."
+    full_working_directory = os.path.abspath(working_directory)
+    full_directory = os.path.abspath(os.path.join(working_directory, directory))
+
+    if not full_directory.startswith(full_working_directory):
+        return f'Error: Cannot summarize "{directory}" as it is outside the permitted working directory'
+
+    if not os.path.isdir(full_directory):
+        return f'Error: "{directory}" is not a directory'
+
+    try:
+        index = get_workspace_index(full_working_directory)
+        index.refresh()
+        return index.summary(
+            os.path.relpath(full_directory, full_working_directory), max_depth,
+            max_entries=MAX_SUMMARY_ENTRIES, max_chars=MAX_SUMMARY_CHARACTERS,
+        )
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+from google.genai import types
+schema_get_workspace_summary = types.FunctionDeclaration(
+    name="get_workspace_summary",
+    description="Returns a compact tree of every file in the working directory with sizes and line counts, plus the files that changed since the previous scan; large trees are cut off with a note, narrow them with directory or max_depth. Use it instead of listing directories one by one.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "directory": types.Schema(
+                type=types.Type.STRING,
+                description="Optional subdirectory to summarize, relative to the working directory. Defaults to the whole working directory.",
+                nullable=True,
+            ),
+            "max_depth": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of directory levels to show (totals always cover the whole subtree).",
+                nullable=True,
+            ),
+        },
+    ),
+)
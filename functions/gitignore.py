@@ -0,0 +1,70 @@
+"""Small .gitignore matcher used when walking the working directory.
+
+Supports the common subset of the format: comments, blank lines, `!` negation, trailing `/`
+for directories only, patterns anchored with a `/`, and `**`. Rules from a nested .gitignore
+only apply below the directory that contains it, and the last matching rule wins.
+"""
+import fnmatch
+import os
+
+# never worth listing or searching
+ALWAYS_IGNORED = {".git", "__pycache__"}
+
+
+class _Rule:
+    def __init__(self, base, pattern):
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # a slash anywhere but the end anchors the pattern to the .gitignore's directory
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        if pattern.startswith("**/"):
+            pattern = pattern[3:]
+            self.anchored = "/" in pattern
+        self.base = base
+        self.pattern = pattern
+
+    def matches(self, rel_path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            if self.base:
+                if not rel_path.startswith(self.base + "/"):
+                    return False
+                rel_path = rel_path[len(self.base) + 1:]
+            return fnmatch.fnmatchcase(rel_path, self.pattern)
+        return fnmatch.fnmatchcase(name, self.pattern)
+
+
+class GitIgnore:
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    def for_directory(self, directory, rel_dir):
+        """Rules that apply inside `directory` (rel_dir relative to the walk root, "" for the root)."""
+        path = os.path.join(directory, ".gitignore")
+        try:
+            with open(path, "r") as file:
+                lines = file.read().splitlines()
+        except OSError:
+            return self
+        rules = list(self.rules)
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            rules.append(_Rule(rel_dir, line))
+        return GitIgnore(rules)
+
+    def ignored(self, rel_path, is_dir):
+        name = rel_path.rsplit("/", 1)[-1]
+        if name in ALWAYS_IGNORED:
+            return True
+        ignored = False
+        for rule in self.rules:
+            if rule.matches(rel_path, name, is_dir):
+                ignored = not rule.negated
+        return ignored
@@ -0,0 +1,154 @@
+"""Bounded output capture for run_python_file.
+
+Script output is read incrementally into CappedBuffers that keep the first and last bytes
+and count what was dropped in between, so memory use does not depend on what the script
+prints. run_capped_subprocess adds a wall-clock timeout and optional CPU/memory rlimits.
+"""
+import locale
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+CapturedRun = namedtuple("CapturedRun", ["stdout", "stderr", "returncode", "timed_out"])
+
+READ_CHUNK_BYTES = 64 * 1024
+# how long to wait for the output pipes to close after a timed-out run is killed
+KILL_GRACE_SECONDS = 1.0
+
+
+class CappedBuffer:
+    """Keeps the first limit/2 and the last limit/2 bytes written to it.
+
+    Writes and text() are locked, so text() can be taken while a reader thread that outlived
+    its join timeout is still writing.
+    """
+
+    def __init__(self, limit):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            room = self.head_limit - len(self.head)
+            if room > 0:
+                self.head += data[:room]
+                data = data[room:]
+            if data:
+                self.tail += data
+                excess = len(self.tail) - self.tail_limit
+                if excess > 0:
+                    del self.tail[:excess]
+                    self.dropped += excess
+
+    def text(self):
+        with self._lock:
+            head, tail, dropped = bytes(self.head), bytes(self.tail), self.dropped
+        return format_captured(head, tail, dropped)
+
+
+def decode_output(data, errors="strict"):
+    # same decoding subprocess.run(..., text=True) applies
+    encoding = "utf-8" if sys.flags.utf8_mode else locale.getencoding()
+    return data.decode(encoding, errors).replace("\r\n", "\n").replace("\r", "\n")
+
+
+def format_captured(head, tail, dropped):
+    if not dropped:
+        return decode_output(head + tail)
+    # the cut can land inside a multi-byte character, so decode leniently
+    return "".join([
+        decode_output(head, "replace"),
+        f"\n[... {dropped} bytes truncated ...]\n",
+        decode_output(tail, "replace"),
+    ])
+
+
+def set_rlimits(cpu_limit=None, memory_limit=None):
+    """Apply CPU seconds / address space MB limits to the current process (POSIX only)."""
+    if cpu_limit is None and memory_limit is None:
+        return
+    import resource
+
+    if cpu_limit is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_limit), int(cpu_limit)))
+    if memory_limit is not None:
+        limit = int(memory_limit) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_capped_subprocess(command, cwd, max_output_bytes, timeout=None, cpu_limit=None, memory_limit=None):
+    """Run command streaming stdout/stderr into CappedBuffers; kill it after `timeout` seconds."""
+    posix = os.name == "posix"
+    preexec_fn = None
+    if cpu_limit is not None or memory_limit is not None:
+        preexec_fn = lambda: set_rlimits(cpu_limit, memory_limit)
+
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        preexec_fn=preexec_fn,
+        # own process group so a timeout also kills anything the script started
+        start_new_session=posix,
+    )
+
+    buffers = [CappedBuffer(max_output_bytes), CappedBuffer(max_output_bytes)]
+    readers = [
+        threading.Thread(target=_drain, args=(process.stdout, buffers[0]), daemon=True),
+        threading.Thread(target=_drain, args=(process.stderr, buffers[1]), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+
+    # a background child the script started can keep the pipes open after the script exits,
+    # so the readers get the same deadline as the script
+    for reader in readers:
+        reader.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+    if any(reader.is_alive() for reader in readers):
+        timed_out = True
+    if timed_out:
+        _kill(process, posix)
+        process.wait()
+        for reader in readers:
+            # the pipes close once the group is dead; give up on anything that escaped it
+            reader.join(KILL_GRACE_SECONDS)
+
+    # a reader that is still alive belongs to a process that escaped the kill; text() takes a
+    # consistent snapshot of what it has written so far
+    return CapturedRun(buffers[0].text(), buffers[1].text(), process.returncode, timed_out)
+
+
+def _drain(pipe, buffer):
+    with pipe:
+        while True:
+            chunk = pipe.read1(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            buffer.write(chunk)
+
+
+def _kill(process, posix):
+    if posix:
+        import signal
+
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+    process.kill()
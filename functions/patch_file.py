@@ -0,0 +1,212 @@
+def patch_file(working_directory, file_path, diff=None, edits=None):
+    import os
+
+    from functions.write_file import after_write, atomic_write_bytes, changed_bytes, encode_text
+
+    full_working_directory = os.path.abspath(working_directory)
+    full_file_path = os.path.abspath(os.path.join(working_directory, file_path))
+
+    if not full_file_path.startswith(full_working_directory):
+        return f'Error: Cannot patch "{file_path}" as it is outside the permitted working directory'
+
+    if not os.path.isfile(full_file_path):
+        return f'Error: File not found or is not a regular file: "{file_path}"'
+
+    if (diff is None) == (edits is None):
+        return 'Error: Provide either diff or edits'
+
+    try:
+        # newline='' keeps the file's own line endings
+        with open(full_file_path, 'r', newline='') as file:
+            original = file.read()
+
+        if diff is not None:
+            patched, applied = apply_unified_diff(original, diff)
+            sent = len(diff)
+        else:
+            edits = validate_edits(edits)
+            patched, applied = apply_edits(original, edits)
+            sent = sum(len(edit["search"]) + len(edit["replace"]) for edit in edits)
+
+        old_data = encode_text(original, newline='')
+        new_data = encode_text(patched, newline='')
+        if new_data != old_data:
+            atomic_write_bytes(full_file_path, new_data)
+            after_write(full_working_directory, full_file_path)
+        changed = changed_bytes(old_data, new_data)
+        return (
+            f'Successfully patched "{file_path}" ({applied} edits applied, {changed} bytes changed, '
+            f'{sent} characters of edits sent for a {len(new_data)} byte file)'
+        )
+
+    except PatchError as e:
+        return f'Error: Could not patch "{file_path}": {e}'
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+class PatchError(Exception):
+    pass
+
+
+def validate_edits(edits):
+    """The edits as {"search": str, "replace": str} dicts; a missing or null replace is ""."""
+    if not isinstance(edits, list):
+        raise PatchError("edits must be a list of {search, replace} objects")
+    checked = []
+    for number, edit in enumerate(edits, start=1):
+        if not isinstance(edit, dict):
+            raise PatchError(f"edit {number} is not a {{search, replace}} object")
+        search = edit.get("search")
+        replace = edit.get("replace") or ""
+        if not isinstance(search, str) or not search:
+            raise PatchError(f"edit {number} has an empty search text")
+        if not isinstance(replace, str):
+            raise PatchError(f"the replace text of edit {number} is not a string")
+        checked.append({"search": search, "replace": replace})
+    return checked
+
+
+def apply_edits(text, edits):
+    """Apply [{"search": ..., "replace": ...}] in order; each search text must occur exactly once."""
+    for number, edit in enumerate(edits, start=1):
+        search = edit.get("search")
+        replace = edit.get("replace") or ""
+        if not search:
+            raise PatchError(f"edit {number} has an empty search text")
+        count = text.count(search)
+        if count == 0:
+            raise PatchError(f"search text of edit {number} was not found")
+        if count > 1:
+            raise PatchError(f"search text of edit {number} occurs {count} times, add more context to make it unique")
+        text = text.replace(search, replace, 1)
+    return text, len(edits)
+
+
+def _split_lines(text):
+    r"""Lines of text with their endings. Only \n ends a line, unlike str.splitlines(), which
+    also splits on form feeds, \x1c-\x1e, \x85 and \u2028 and would misnumber the hunks."""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _parse_hunks(diff):
+    import re
+
+    header = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+    hunks = []
+    current = None
+    lines = [line.rstrip("\r\n") for line in _split_lines(diff)]
+    for number, line in enumerate(lines):
+        match = header.match(line)
+        if match:
+            current = {"start": int(match.group(1)), "empty": match.group(2) == "0", "old": [], "new": []}
+            hunks.append(current)
+            continue
+        if current is None or line.startswith("\\"):
+            # file headers (---/+++) before the first hunk, "\ No newline at end of file"
+            continue
+        if line.startswith("diff ") or (
+            line.startswith("--- ") and number + 1 < len(lines) and lines[number + 1].startswith("+++ ")
+        ):
+            # the diff goes on with another file
+            break
+        if line.startswith("-"):
+            current["old"].append(line[1:])
+        elif line.startswith("+"):
+            current["new"].append(line[1:])
+        else:
+            # context line; some tools strip the leading space of empty lines
+            current["old"].append(line[1:])
+            current["new"].append(line[1:])
+    if not hunks:
+        raise PatchError("the diff has no @@ hunks")
+    return hunks
+
+
+def apply_unified_diff(text, diff):
+    """Apply a unified diff. Hunks are matched on content, so stale line numbers are tolerated."""
+    lines = _split_lines(text)
+    stripped = [line.rstrip("\r\n") for line in lines]
+    # line ending used for added lines
+    ending = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+
+    offset = 0
+    for number, hunk in enumerate(_parse_hunks(diff), start=1):
+        old, new = hunk["old"], hunk["new"]
+        # an empty old range (@@ -N,0 ...) inserts after line N, otherwise the hunk starts at line N
+        expected = max(hunk["start"] - (0 if hunk["empty"] else 1) + offset, 0)
+        position = _find_block(stripped, old, expected)
+        if position is None:
+            raise PatchError(f"hunk {number} does not match the file")
+
+        replaced = [line + ending for line in new]
+        end = position + len(old)
+        # keep a missing final newline missing
+        if replaced and end == len(lines) and lines and not lines[-1].endswith(("\n", "\r")):
+            replaced[-1] = replaced[-1].rstrip("\r\n")
+            if position == len(lines):
+                # appended after the old last line, which now needs an ending of its own
+                lines[-1] += ending
+        lines[position:end] = replaced
+        stripped[position:end] = new
+        offset += len(new) - len(old)
+    return "".join(lines), number
+
+
+def _find_block(lines, block, expected):
+    """Index where block occurs in lines, preferring the occurrence closest to expected."""
+    if not block:
+        return min(expected, len(lines))
+    size = len(block)
+    best = None
+    for start in range(len(lines) - size + 1):
+        if lines[start] == block[0] and lines[start:start + size] == block:
+            if best is None or abs(start - expected) < abs(best - expected):
+                best = start
+            if start > expected:
+                break
+    return best
+
+from google.genai import types
+schema_patch_file = types.FunctionDeclaration(
+    name="patch_file",
+    description="Changes part of an existing file without resending all of it, constrained to the working directory. Pass either a unified diff or a list of search-and-replace edits.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "file_path": types.Schema(
+                type=types.Type.STRING,
+                description="The path to the file to patch, relative to the working directory.",
+            ),
+            "diff": types.Schema(
+                type=types.Type.STRING,
+                description="A unified diff for this file (lines starting with ' ', '-', '+' under @@ hunk headers).",
+                nullable=True,
+            ),
+            "edits": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "search": types.Schema(
+                            type=types.Type.STRING,
+                            description="Exact text to find; it must occur exactly once in the file.",
+                        ),
+                        "replace": types.Schema(
+                            type=types.Type.STRING,
+                            description="Text to put in its place.",
+                        ),
+                    },
+                    required=["search", "replace"],
+                ),
+                description="Search-and-replace edits applied in order.",
+                nullable=True,
+            ),
+        },
+        required=["file_path"],
+    )
+)
@@ -0,0 +1,168 @@
+"""Optional pool of warm Python interpreters for run_python_file.
+
+Each worker (functions/python_worker.py) imports the working directory's packages once and
+then forks a child per run, so a call skips interpreter startup and the package imports but
+still runs the script in a clean process. Results go through the same capping and decoding
+as functions.output_capture so the output is the same as the plain subprocess path.
+"""
+import atexit
+import base64
+import json
+import os
+import queue
+import subprocess
+import threading
+
+from functions.output_capture import CapturedRun, format_captured
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+
+class _Worker:
+    def __init__(self, working_directory):
+        self.runs = 0
+        self.process = subprocess.Popen(
+            ["python", WORKER_SCRIPT, working_directory],
+            cwd=working_directory,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        hello = self.process.stdout.readline()
+        if not hello:
+            self.close()
+            raise RuntimeError("worker interpreter failed to start")
+        self.preloaded = json.loads(hello).get("preloaded", [])
+
+    def run(self, request):
+        self.runs += 1
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("worker interpreter exited unexpectedly")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class PythonWorkerPool:
+    """A fixed number of warm workers for one working directory.
+
+    A worker is replaced after `max_runs` runs, after it crashes, and after a run that had
+    to re-import modules the agent changed (so the next run is warm again).
+    """
+
+    def __init__(self, working_directory, size=2, max_runs=100):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("the worker pool needs os.fork")
+        self.working_directory = os.path.abspath(working_directory)
+        self.max_runs = max_runs
+        self._idle = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._workers = []
+        for _ in range(max(1, size)):
+            self._idle.put(self._spawn())
+
+    def run(self, full_file_path, args, max_output_bytes, timeout=None, cpu_limit=None, memory_limit=None):
+        """Run a script and return a CapturedRun, like output_capture.run_capped_subprocess.
+
+        A script is never left to run unbounded: timeout=None means RUN_TIMEOUT_SECONDS.
+        """
+        from functions.config import RUN_TIMEOUT_SECONDS
+
+        if timeout is None:
+            timeout = RUN_TIMEOUT_SECONDS
+        request = {
+            "file_path": full_file_path,
+            "args": list(args),
+            "max_output_bytes": max_output_bytes,
+            "timeout": timeout,
+            "cpu_limit": cpu_limit,
+            "memory_limit": memory_limit,
+        }
+        worker = self._idle.get()
+        try:
+            response = worker.run(request)
+        except Exception:
+            # crashed worker: replace it and report the failure for this call
+            self._replace(worker)
+            raise
+
+        if response["stale"] or worker.runs >= self.max_runs:
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        return CapturedRun(
+            _captured_text(response["stdout"]),
+            _captured_text(response["stderr"]),
+            response["returncode"],
+            response["timed_out"],
+        )
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def _spawn(self):
+        worker = _Worker(self.working_directory)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            closed = self._closed
+        worker.close()
+        if not closed:
+            self._idle.put(self._spawn())
+
+
+def _captured_text(captured):
+    return format_captured(
+        base64.b64decode(captured["head"]), base64.b64decode(captured["tail"]), captured["dropped"]
+    )
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def enable_worker_pool(working_directory, size=2, max_runs=100):
+    """Start (or return the existing) worker pool used by run_python_file for this directory."""
+    key = os.path.abspath(working_directory)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = PythonWorkerPool(key, size=size, max_runs=max_runs)
+        return _pools[key]
+
+
+def get_worker_pool(working_directory):
+    return _pools.get(os.path.abspath(working_directory))
+
+
+def shutdown_worker_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(shutdown_worker_pools)
@@ -0,0 +1,248 @@
+"""Warm interpreter used by functions.python_pool.
+
+Started as `python python_worker.py <working_directory>` with cwd set to the working
+directory. It imports the working directory's packages once, then reads one JSON request
+per line from stdin and answers with one JSON line. Every script runs in a forked child
+(so runs cannot leak state into each other) with stdout/stderr going to pipes,
+sys.argv/sys.path set up the way `python <script> <args>` would, and the script executed
+through runpy. The worker reads the pipes as the script writes into the same CappedBuffers
+run_capped_subprocess uses, so only the head and tail of the output are ever held or sent
+back, and a child that runs past its timeout is killed.
+"""
+import atexit
+import base64
+import json
+import os
+import runpy
+import sys
+import select
+import signal
+import time
+import traceback
+
+# this file's directory is sys.path[0]; run_child drops the module again so it cannot shadow
+# an output_capture module of the script's own
+from output_capture import KILL_GRACE_SECONDS, READ_CHUNK_BYTES, CappedBuffer
+
+
+def preload_packages(working_directory):
+    """Import every module inside the working directory's packages, return {module_name: (file, mtime_ns)}."""
+    import importlib
+
+    loaded = {}
+    for root, dirs, files in os.walk(working_directory):
+        dirs[:] = sorted(d for d in dirs if d.isidentifier() and not d.startswith("."))
+        if root == working_directory:
+            # top level scripts (main.py, tests.py) run code when imported, only packages are preloaded
+            continue
+        package = os.path.relpath(root, working_directory).replace(os.sep, ".")
+        for name in sorted(files):
+            module_name, ext = os.path.splitext(name)
+            if ext != ".py" or not module_name.isidentifier():
+                continue
+            if module_name == "__init__":
+                module_name = package
+            else:
+                module_name = f"{package}.{module_name}"
+            try:
+                module = importlib.import_module(module_name)
+                module_file = os.path.abspath(module.__file__)
+                loaded[module_name] = (module_file, os.stat(module_file).st_mtime_ns)
+            except Exception:
+                # anything that does not import cleanly is simply left to the script
+                sys.modules.pop(module_name, None)
+    return loaded
+
+
+def stale_modules(loaded):
+    stale = []
+    for module_name, (module_file, mtime_ns) in loaded.items():
+        try:
+            if os.stat(module_file).st_mtime_ns != mtime_ns:
+                stale.append(module_name)
+        except OSError:
+            stale.append(module_name)
+    return stale
+
+
+def run_child(request, base_sys_path, stale, stdout_fd, stderr_fd):
+    """Runs in the forked child: never returns."""
+    file_path = request["file_path"]
+    args = request.get("args", [])
+
+    # own process group so a timeout also kills anything the script started
+    os.setsid()
+    if request.get("cpu_limit") is not None or request.get("memory_limit") is not None:
+        import resource
+
+        if request.get("cpu_limit") is not None:
+            cpu_limit = int(request["cpu_limit"])
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+        if request.get("memory_limit") is not None:
+            memory_limit = int(request["memory_limit"]) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+
+    # modules the agent rewrote since the worker started must be imported fresh
+    for module_name in stale + ["output_capture"]:
+        sys.modules.pop(module_name, None)
+
+    sys.argv = [file_path] + list(args)
+    sys.path[:] = [os.path.dirname(os.path.realpath(file_path))] + base_sys_path
+
+    exit_code = 0
+    try:
+        runpy.run_path(file_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # report the traceback the way the interpreter would: starting at the script's frame
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != file_path:
+            tb = tb.tb_next
+        if tb is not None:
+            e.__traceback__ = tb
+        sys.excepthook(type(e), e, e.__traceback__)
+        exit_code = 1
+
+    try:
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code & 0xFF)
+
+
+def capture_child(pid, pipes, max_output_bytes, timeout):
+    """Read the child's output pipes into CappedBuffers until the child has exited and the
+    pipes are closed, killing its process group after `timeout` seconds.
+
+    Returns (status, buffers, timed_out). A background process the script started can keep the
+    pipes open after the script exits, so it gets the same deadline as the script.
+    """
+    buffers = {fd: CappedBuffer(max_output_bytes) for fd in pipes}
+    open_fds = list(pipes)
+    deadline = time.monotonic() + timeout
+    pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+    status = None
+    try:
+        while status is None or open_fds:
+            if status is None:
+                waited, waited_status = os.waitpid(pid, os.WNOHANG)
+                if waited:
+                    status = waited_status
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (status is not None and not open_fds):
+                break
+            watch = list(open_fds)
+            if status is None and pidfd is not None:
+                watch.append(pidfd)
+            elif status is None:
+                # no pidfd to wake up on: poll for the exit
+                remaining = min(remaining, 0.05)
+            _read_ready(watch, remaining, buffers, open_fds)
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+    timed_out = status is None or bool(open_fds)
+    if timed_out:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        if status is None:
+            status = os.waitpid(pid, 0)[1]
+        # the pipes close once the group is dead; give up on anything that escaped it
+        grace_deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while open_fds and time.monotonic() < grace_deadline:
+            _read_ready(list(open_fds), grace_deadline - time.monotonic(), buffers, open_fds)
+    for fd in pipes:
+        os.close(fd)
+    return status, [buffers[fd] for fd in pipes], timed_out
+
+
+def _read_ready(watch, timeout, buffers, open_fds):
+    ready, _, _ = select.select(watch, [], [], max(0.0, timeout))
+    for fd in ready:
+        if fd not in buffers:
+            # the pidfd: the caller's waitpid picks the exit up
+            continue
+        chunk = os.read(fd, READ_CHUNK_BYTES)
+        if chunk:
+            buffers[fd].write(chunk)
+        else:
+            open_fds.remove(fd)
+
+
+def encode_captured(buffer):
+    return {
+        "head": base64.b64encode(bytes(buffer.head)).decode("ascii"),
+        "tail": base64.b64encode(bytes(buffer.tail)).decode("ascii"),
+        "dropped": buffer.dropped,
+    }
+
+
+def serve(working_directory):
+    # keep a private copy of the protocol pipe and send stray prints to stderr
+    protocol_out = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    base_sys_path = sys.path[1:]
+    sys.path.insert(0, working_directory)
+    loaded = preload_packages(working_directory)
+    sys.path.pop(0)
+
+    protocol_out.write(json.dumps({"ready": True, "preloaded": sorted(loaded)}) + "\n")
+    protocol_out.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        stale = stale_modules(loaded)
+
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(stdout_read)
+                os.close(stderr_read)
+                run_child(request, base_sys_path, stale, stdout_write, stderr_write)
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+        os.close(stdout_write)
+        os.close(stderr_write)
+
+        status, (stdout, stderr), timed_out = capture_child(
+            pid, [stdout_read, stderr_read], request["max_output_bytes"], request["timeout"]
+        )
+        response = {
+            "stdout": encode_captured(stdout),
+            "stderr": encode_captured(stderr),
+            "returncode": os.waitstatus_to_exitcode(status),
+            "timed_out": timed_out,
+            "stale": bool(stale),
+        }
+
+        protocol_out.write(json.dumps(response) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    serve(os.path.abspath(sys.argv[1]))
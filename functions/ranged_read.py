@@ -0,0 +1,108 @@
+"""Byte-range and line-range reads for get_file_content.
+
+Files are memory-mapped so a range is sliced straight out of the page cache. Line ranges use
+a LineIndex of line start offsets that is only built as far as the highest line requested so
+far, and is cached per file version, so paging through a large file finds each page without
+scanning or decoding everything before it again.
+"""
+import locale
+import mmap
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+MAX_CACHED_INDEXES = 32
+
+
+class LineIndex:
+    def __init__(self, size):
+        self.size = size
+        self.offsets = array("Q", [0])  # offsets[i] = byte offset where line i+1 starts
+        self.complete = size == 0
+        self.lock = threading.Lock()
+
+    def extend_to(self, mm, line, limit=None):
+        """Index line starts until `line` (1-based) has an end offset, the file ends or the
+        indexed lines pass byte offset `limit`."""
+        with self.lock:
+            offsets = self.offsets
+            position = offsets[-1]
+            while len(offsets) <= line and not self.complete and (limit is None or position <= limit):
+                newline = mm.find(b"\n", position)
+                if newline == -1 or newline + 1 >= self.size:
+                    self.complete = True
+                    break
+                position = newline + 1
+                offsets.append(position)
+
+    def line_count(self):
+        """Total number of lines, or None while the end of the file has not been indexed."""
+        if not self.complete:
+            return None
+        return len(self.offsets) if self.size else 0
+
+    def span(self, start_line, end_line):
+        """Byte span of lines start_line..end_line (1-based, inclusive) after extend_to(end_line)."""
+        start = self.offsets[start_line - 1]
+        end = self.offsets[end_line] if end_line < len(self.offsets) else self.size
+        return start, end
+
+
+_indexes = OrderedDict()  # (path, version) -> LineIndex
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(resolved_path, version):
+    key = (resolved_path, version)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = LineIndex(version[1])
+            _indexes[key] = index
+            while len(_indexes) > MAX_CACHED_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(key)
+        return index
+
+
+def _decode(data):
+    encoding = locale.getpreferredencoding(False)
+    return data.decode(encoding, "replace").replace("\r\n", "\n")
+
+
+def read_byte_range(resolved_path, offset, length):
+    """Return (text, size) for `length` bytes starting at `offset`."""
+    with open(resolved_path, "rb") as file:
+        size = file.seek(0, 2)
+        if size == 0 or offset >= size:
+            return "", size
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _decode(mm[offset:offset + length]), size
+
+
+def read_line_range(resolved_path, version, start_line, end_line, max_bytes=None):
+    """Return (text, last_line_read, total_lines_or_None, truncated) for lines start_line..end_line.
+
+    With `max_bytes` at most that many bytes are read (and the lines are only indexed that
+    far), so a wide range costs no more than one page; `truncated` tells whether the text
+    stops there, possibly inside last_line_read.
+    """
+    index = get_line_index(resolved_path, version)
+    if index.size == 0:
+        return "", 0, 0, False
+    with open(resolved_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        index.extend_to(mm, start_line)
+        if start_line > len(index.offsets):
+            return "", 0, index.line_count(), False
+        limit = None if max_bytes is None else index.offsets[start_line - 1] + max_bytes
+        index.extend_to(mm, end_line, limit)
+        end_line = min(end_line, len(index.offsets))
+        start, end = index.span(start_line, end_line)
+        truncated = limit is not None and end > limit
+        if truncated:
+            end = limit
+            # the line the last byte read belongs to
+            end_line = bisect_right(index.offsets, end - 1)
+        return _decode(mm[start:end]), end_line, index.line_count(), truncated
@@ -0,0 +1,104 @@
+"""Registry of the tools call_function can dispatch to.
+
+Every tool is described by a ToolSpec: the module it lives in, the names of its handler and
+schema in that module, whether it only reads the working directory (read-only tools may run
+concurrently) and its sandbox root (None = the calling agent's working_directory). Modules are
+only imported the first time a tool's handler or schema is needed.
+
+New tools are added with register_tool(), either from code or from a plugin module listed in
+the AGENT_TOOL_PLUGINS environment variable (comma separated module names, imported by
+load_plugins()). A tool handler is called as handler(sandbox_root, **agent_args, **model_args).
+"""
+import importlib
+import os
+import threading
+
+
+class ToolSpec:
+    def __init__(self, name, module, handler=None, schema=None, read_only=False, sandbox=None, agent_args=()):
+        self.name = name
+        self.module = module
+        self.handler_name = handler or name
+        self.schema_name = schema or f"schema_{name}"
+        self.read_only = read_only
+        self.sandbox = sandbox
+        # agent attributes passed to the handler as keyword arguments, e.g. seen_files
+        self.agent_args = tuple(agent_args)
+        self._handler = None
+        self._schema = None
+
+    def _load(self):
+        with _lock:
+            if self._handler is None:
+                module = importlib.import_module(self.module)
+                self._schema = getattr(module, self.schema_name)
+                self._handler = getattr(module, self.handler_name)
+
+    @property
+    def handler(self):
+        if self._handler is None:
+            self._load()
+        return self._handler
+
+    @property
+    def schema(self):
+        if self._handler is None:
+            self._load()
+        return self._schema
+
+    def call(self, agent, args):
+        root = self.sandbox if self.sandbox is not None else agent.working_directory
+        extra = {name: getattr(agent, name, None) for name in self.agent_args}
+        return self.handler(root, **extra, **(args or {}))
+
+
+_tools = {}
+_lock = threading.RLock()
+
+
+def register_tool(name, module, handler=None, schema=None, read_only=False, sandbox=None, agent_args=()):
+    """Add (or replace) a tool; see ToolSpec for the arguments."""
+    spec = ToolSpec(name, module, handler, schema, read_only, sandbox, agent_args)
+    _tools[name] = spec
+    return spec
+
+
+def get_tool(name):
+    return _tools.get(name)
+
+
+def is_read_only(name):
+    spec = _tools.get(name)
+    return spec is not None and spec.read_only
+
+
+def tool_names():
+    return list(_tools)
+
+
+def tool_declarations(names):
+    """FunctionDeclarations for the named tools, importing their modules as needed."""
+    return [_tools[name].schema for name in names]
+
+
+_plugins_loaded = False
+
+
+def load_plugins():
+    """Import the modules named in AGENT_TOOL_PLUGINS so they can register their tools."""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for module in os.environ.get("AGENT_TOOL_PLUGINS", "").split(","):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+register_tool("get_files_info", "functions.get_files_info", read_only=True)
+register_tool("get_file_content", "functions.get_file_content", read_only=True, agent_args=("seen_files",))
+register_tool("get_workspace_summary", "functions.get_workspace_summary", read_only=True)
+register_tool("search_files", "functions.search_files", read_only=True)
+register_tool("write_file", "functions.write_file")
+register_tool("patch_file", "functions.patch_file")
+register_tool("run_python_file", "functions.run_python")
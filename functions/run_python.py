@@ -1,6 +1,8 @@
-def run_python_file(working_directory, file_path, args=[]):
+def run_python_file(working_directory, file_path, args=[], timeout=None, cpu_limit=None, memory_limit=None):
     import os
-    import subprocess
+    import time
+
+    from functions.config import MAX_OUTPUT_BYTES, RUN_TIMEOUT_SECONDS, RUN_CPU_LIMIT_SECONDS, RUN_MEMORY_LIMIT_MB
 
     full_working_directory = os.path.abspath(working_directory)
     full_file_path = os.path.abspath(os.path.join(working_directory, file_path))
@@ -14,27 +16,54 @@ def run_python_file(working_directory, file_path, args=[]):
 
     if not file_path.endswith('.py'):
         return f'Error: "{file_path}" is not a Python file'
+
+    timeout = RUN_TIMEOUT_SECONDS if timeout is None else timeout
+    cpu_limit = RUN_CPU_LIMIT_SECONDS if cpu_limit is None else cpu_limit
+    memory_limit = RUN_MEMORY_LIMIT_MB if memory_limit is None else memory_limit
     
     try:
-        result = subprocess.run(
-            ['python', full_file_path] + args,
-            cwd=full_working_directory,
-            capture_output=True,
-            text=True
-        )
+        from functions.output_capture import run_capped_subprocess
+        from functions.python_pool import get_worker_pool
+        from functions.workspace_index import mark_workspace_dirty
+
+        from instrumentation import tracer
+
+        start = time.perf_counter()
+        pool = get_worker_pool(full_working_directory)
+        with tracer.span("worker_pool" if pool is not None else "subprocess", "subprocess", file=file_path) as span:
+            if pool is not None:
+                # warm interpreter, same output as the subprocess below
+                run = pool.run(full_file_path, args, MAX_OUTPUT_BYTES, timeout, cpu_limit, memory_limit)
+            else:
+                run = run_capped_subprocess(
+                    ['python', full_file_path] + args,
+                    cwd=full_working_directory,
+                    max_output_bytes=MAX_OUTPUT_BYTES,
+                    timeout=timeout,
+                    cpu_limit=cpu_limit,
+                    memory_limit=memory_limit,
+                )
+            span["returncode"] = run.returncode
+            span["timed_out"] = run.timed_out
+        elapsed = time.perf_counter() - start
+        # the script may have created or changed files
+        mark_workspace_dirty(full_working_directory)
+
+        output = []
 
-        output = ""
+        if run.stdout:
+            output.append(f"STDOUT: {run.stdout}\n")
+        if run.stderr:
+            output.append(f"STDERR: {run.stderr}\n")
+        if run.timed_out:
+            output.append(f"Process timed out after {timeout} seconds and was killed\n")
+        elif run.returncode != 0:
+            output.append(f"Process exited with code {run.returncode}\n")
+        if not output:
+            return f"No output produced (ran for {elapsed:.3f} seconds)"
 
-        if result.stdout:
-            output += f"STDOUT: {result.stdout}\n"
-        if result.stderr:
-            output += f"STDERR: {result.stderr}\n"
-        if result.returncode != 0:
-            output += f"Process exited with code {result.returncode}\n"
-        if output == "":
-            return "No output produced"
-        
-        return output
+        output.append(f"Ran for {elapsed:.3f} seconds\n")
+        return "".join(output)
             
     except Exception as e:
         return f"Error executing Python file: {e}"
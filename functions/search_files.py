@@ -0,0 +1,128 @@
+def search_files(working_directory, pattern, literal=False, ignore_case=False, context=0, file_pattern=None, directory="."):
+    import fnmatch
+    import os
+    import re
+
+    from functions.config import MAX_SEARCH_MATCHES
+    from functions.search_index import get_search_index, read_searchable_text, required_literals
+
+    directory = directory or "."
+    full_working_directory = os.path.abspath(working_directory)
+    full_directory = os.path.abspath(os.path.join(working_directory, directory))
+
+    if not full_directory.startswith(full_working_directory):
+        return f'Error: Cannot search "{directory}" as it is outside the permitted working directory'
+
+    if not os.path.isdir(full_directory):
+        return f'Error: "{directory}" is not a directory'
+
+    if not pattern:
+        return 'Error: pattern must not be empty'
+
+    flags = re.IGNORECASE if ignore_case else 0
+    try:
+        regex = re.compile(re.escape(pattern) if literal else pattern, flags)
+    except re.error as e:
+        return f'Error: Invalid regular expression "{pattern}": {e}'
+
+    try:
+        index = get_search_index(full_working_directory)
+        index.sync()
+
+        literals = [pattern] if literal else required_literals(pattern, flags)
+        candidates = index.candidates([l for l in literals if len(l) >= 3])
+        if candidates is None:
+            candidates = index.all_files()
+
+        prefix = os.path.relpath(full_directory, full_working_directory).replace(os.sep, "/")
+        context = max(0, min(int(context or 0), 10))
+
+        output = []
+        matches = 0
+        files_with_matches = 0
+        for rel_path in candidates:
+            if prefix != "." and not rel_path.startswith(prefix + "/"):
+                continue
+            if file_pattern and not (fnmatch.fnmatchcase(rel_path.rsplit("/", 1)[-1], file_pattern) or fnmatch.fnmatchcase(rel_path, file_pattern)):
+                continue
+            try:
+                text, _ = read_searchable_text(os.path.join(full_working_directory, rel_path))
+            except OSError:
+                # removed since the last index refresh
+                continue
+            if text is None or not regex.search(text):
+                continue
+
+            files_with_matches += 1
+            lines = text.splitlines()
+            last_printed = -1
+            for number, line in enumerate(lines):
+                if not regex.search(line):
+                    continue
+                matches += 1
+                if matches > MAX_SEARCH_MATCHES:
+                    break
+                first = max(number - context, last_printed + 1)
+                if context and last_printed >= 0 and first > last_printed + 1:
+                    # like grep, only context groups are separated
+                    output.append("--\n")
+                for before in range(first, number):
+                    output.append(f"{rel_path}-{before + 1}-{lines[before]}\n")
+                output.append(f"{rel_path}:{number + 1}:{line}\n")
+                last_printed = number
+                for after in range(number + 1, min(number + context + 1, len(lines))):
+                    if regex.search(lines[after]):
+                        break
+                    output.append(f"{rel_path}-{after + 1}-{lines[after]}\n")
+                    last_printed = after
+            if matches > MAX_SEARCH_MATCHES:
+                output.append(f"[...more than {MAX_SEARCH_MATCHES} matches, narrow the pattern or directory]\n")
+                break
+
+        if matches == 0:
+            return f'No matches for "{pattern}"'
+        output.append(f"{min(matches, MAX_SEARCH_MATCHES)} matches in {files_with_matches} files\n")
+        return "".join(output)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+from google.genai import types
+schema_search_files = types.FunctionDeclaration(
+    name="search_files",
+    description="Searches the files in the working directory for a regular expression (or literal text) and returns matching lines as path:line:text, with optional context lines. Use it to find where something is defined or used instead of reading files one by one.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Python regular expression to search for (or literal text when literal is true).",
+            ),
+            "literal": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Optional. Treat pattern as plain text instead of a regular expression.",
+                nullable=True,
+            ),
+            "ignore_case": types.Schema(
+                type=types.Type.BOOLEAN,
+                description="Optional. Case-insensitive search.",
+                nullable=True,
+            ),
+            "context": types.Schema(
+                type=types.Type.INTEGER,
+                description="Optional number of lines to show before and after each match (0..10).",
+                nullable=True,
+            ),
+            "file_pattern": types.Schema(
+                type=types.Type.STRING,
+                description="Optional glob to restrict which files are searched, e.g. '*.py'.",
+                nullable=True,
+            ),
+            "directory": types.Schema(
+                type=types.Type.STRING,
+                description="Optional subdirectory to search, relative to the working directory.",
+                nullable=True,
+            ),
+        },
+        required=["pattern"],
+    ),
+)
@@ -0,0 +1,167 @@
+"""Trigram index over the working directory for search_files.
+
+Every indexed file contributes the set of lower-cased 3-character substrings it contains, and
+the inverted index maps each trigram to the files containing it. A query only has to open the
+files that contain every trigram of the literal text the pattern requires; patterns without
+such text fall back to scanning all files. The file list and content hashes come from the
+workspace index, so only files whose hash changed are re-indexed, and write_file updates the
+file it wrote straight away.
+"""
+import hashlib
+import os
+import re
+import threading
+
+from functions.workspace_index import get_workspace_index
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # older Pythons
+    import sre_parse
+    import sre_constants
+
+MAX_INDEXED_FILE_BYTES = 2 * 1024 * 1024
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def required_literals(pattern, flags=0):
+    """Literal strings every match of the regex must contain (best effort, may be empty)."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return []
+    literals = []
+    run = []
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+            continue
+        if op is sre_constants.MAX_REPEAT or op is sre_constants.MIN_REPEAT:
+            low, _, item = value
+            # x+ still requires one x, but the run cannot continue past the repeat
+            if low >= 1 and len(item) == 1 and item[0][0] is sre_constants.LITERAL:
+                run.append(chr(item[0][1]))
+        if op is sre_constants.AT:
+            continue
+        if run:
+            literals.append("".join(run))
+            run = []
+    if run:
+        literals.append("".join(run))
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def read_searchable_text(path):
+    """File content as text, or None for binary files and files too large to index."""
+    with open(path, "rb") as file:
+        data = file.read(MAX_INDEXED_FILE_BYTES + 1)
+    if len(data) > MAX_INDEXED_FILE_BYTES or b"\0" in data[:8192]:
+        return None, data
+    return data.decode("utf-8", "replace"), data
+
+
+class SearchIndex:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.workspace = get_workspace_index(self.root)
+        self.file_trigrams = {}  # rel path -> frozenset of trigrams
+        self.file_hashes = {}  # rel path -> sha1 the trigrams were built from (binary files included)
+        self.postings = {}  # trigram -> set of rel paths
+        self.stats = {"indexed_files": 0, "full_scans": 0, "indexed_queries": 0}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Re-index files the workspace index saw change."""
+        self.workspace.refresh()
+        with self._lock:
+            entries = self.workspace.entries
+            for rel_path in list(self.file_hashes):
+                entry = entries.get(rel_path)
+                if entry is None or entry["dir"]:
+                    self._remove(rel_path)
+            for rel_path, entry in entries.items():
+                if not entry["dir"] and self.file_hashes.get(rel_path) != entry["sha1"]:
+                    self._add(rel_path, entry["sha1"])
+
+    def update_file(self, rel_path):
+        """Re-index one file right after it was written."""
+        rel_path = rel_path.replace(os.sep, "/")
+        with self._lock:
+            self._remove(rel_path)
+            self._add(rel_path, None)
+        self.workspace.mark_dirty()
+
+    def candidates(self, literals):
+        """Files that may match, or None when every file has to be scanned."""
+        with self._lock:
+            if not literals:
+                self.stats["full_scans"] += 1
+                return None
+            self.stats["indexed_queries"] += 1
+            result = None
+            for literal in literals:
+                for trigram in trigrams(literal):
+                    files = self.postings.get(trigram, set())
+                    result = set(files) if result is None else result & files
+                    if not result:
+                        return []
+            return sorted(result)
+
+    def all_files(self):
+        with self._lock:
+            return sorted(self.file_trigrams)
+
+    def _add(self, rel_path, sha1):
+        try:
+            text, data = read_searchable_text(os.path.join(self.root, rel_path))
+        except OSError:
+            return
+        # remembered even when not searchable so the file is not re-read on every sync
+        self.file_hashes[rel_path] = sha1 or hashlib.sha1(data).hexdigest()
+        if text is None:
+            return
+        grams = frozenset(trigrams(text))
+        self.file_trigrams[rel_path] = grams
+        for trigram in grams:
+            self.postings.setdefault(trigram, set()).add(rel_path)
+        self.stats["indexed_files"] += 1
+
+    def _remove(self, rel_path):
+        grams = self.file_trigrams.pop(rel_path, ())
+        self.file_hashes.pop(rel_path, None)
+        for trigram in grams:
+            files = self.postings.get(trigram)
+            if files is not None:
+                files.discard(rel_path)
+                if not files:
+                    del self.postings[trigram]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(working_directory, create=True):
+    key = os.path.abspath(working_directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None and create:
+            index = _indexes[key] = SearchIndex(key)
+        return index
+
+
+def forget_search_index(working_directory):
+    with _indexes_lock:
+        _indexes.pop(os.path.abspath(working_directory), None)
+
+
+def update_search_index(working_directory, full_file_path):
+    """Called by write_file so the next search sees the new content without a rescan."""
+    index = get_search_index(working_directory, create=False)
+    if index is not None:
+        index.update_file(os.path.relpath(full_file_path, os.path.abspath(working_directory)))
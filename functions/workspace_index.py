@@ -0,0 +1,236 @@
+"""Incremental index of the files in the agent's working directory.
+
+For every file (skipping .gitignore'd entries) the index keeps size, mtime, a content hash and
+the line count. A refresh stats the whole tree and only re-reads files whose size or mtime
+changed, and the index is saved under .agent_cache/ so the next run starts from the previous
+scan.
+write_file and run_python_file mark the index dirty; otherwise a refresh within
+INDEX_REFRESH_SECONDS of the last one is skipped.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from functions.gitignore import GitIgnore
+
+INDEX_FORMAT_VERSION = 1
+INDEX_REFRESH_SECONDS = 2.0
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".agent_cache")
+
+
+def _hash_file(path):
+    digest = hashlib.sha1()
+    lines = 0
+    last = b""
+    with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+            lines += chunk.count(b"\n")
+            last = chunk
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    return digest.hexdigest(), lines
+
+
+def _cache_path(root):
+    key = hashlib.sha1(root.encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"index-{key}.json")
+
+
+class WorkspaceIndex:
+    def __init__(self, root, cache_path=None):
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path or _cache_path(self.root)
+        self.entries = {}  # rel path -> {"dir": bool, "size", "mtime_ns", "sha1", "lines"}
+        self.changes = []  # [(status, rel path)] found by the last refresh, status is A/M/D
+        self.stats = {"refreshes": 0, "rehashed": 0, "loaded_from_disk": False}
+        self._dirty = True
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def mark_dirty(self):
+        self._dirty = True
+
+    def refresh(self, force=False):
+        """Bring the index up to date; returns the list of changes it found.
+
+        This is not incremental below the file level: every refresh that is not skipped lists
+        every directory and stats every file, so it costs O(tree) system calls. Directory
+        mtimes cannot be used to skip subtrees, because rewriting a file in place does not
+        change the mtime of the directory it is in.
+        """
+        with self._lock:
+            if not force and not self._dirty and time.monotonic() - self._last_refresh < INDEX_REFRESH_SECONDS:
+                # nothing is known to have changed since the last scan; keeping its changes
+                # would repeat them in every summary until the next rescan, depending on timing
+                self.changes = []
+                return []
+            self._dirty = False
+            rehashed = self.stats["rehashed"]
+            changes = []
+            entries = {}
+            self._scan(self.root, "", GitIgnore().for_directory(self.root, ""), entries, changes)
+            for rel_path in self.entries.keys() - entries.keys():
+                if not self.entries[rel_path]["dir"]:
+                    changes.append(("D", rel_path))
+            changes.sort(key=lambda change: change[1])
+
+            self.entries = entries
+            self.stats["refreshes"] += 1
+            self._last_refresh = time.monotonic()
+            self.changes = changes
+            if changes or self.stats["rehashed"] != rehashed:
+                self._save()
+            return changes
+
+    def get(self, rel_path):
+        return self.entries.get(rel_path.replace(os.sep, "/"))
+
+    def lookup(self, rel_path, size, mtime_ns):
+        """Indexed entry for a file, only if it still matches the given stat values."""
+        entry = self.entries.get(rel_path.replace(os.sep, "/"))
+        if entry is None or entry["dir"] or entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+            return None
+        return entry
+
+    def summary(self, directory="", max_depth=None, max_entries=None, max_chars=None):
+        """Compact indented tree of the indexed files below `directory`.
+
+        At most `max_entries` tree lines and about `max_chars` characters are returned; a note
+        at the end says how many entries were left out.
+        """
+        prefix = directory.strip("/").replace(os.sep, "/")
+        if prefix == ".":
+            prefix = ""
+        base_depth = prefix.count("/") + 1 if prefix else 0
+
+        files = dirs = total_size = total_lines = 0
+        lines = []
+        size = omitted = 0
+        for rel_path in sorted(self.entries):
+            if prefix and not rel_path.startswith(prefix + "/"):
+                continue
+            entry = self.entries[rel_path]
+            depth = rel_path.count("/") - base_depth
+            if entry["dir"]:
+                dirs += 1
+            else:
+                files += 1
+                total_size += entry["size"]
+                total_lines += entry["lines"]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            if omitted or (max_entries is not None and len(lines) >= max_entries):
+                # keep counting: the totals in the header cover the whole subtree
+                omitted += 1
+                continue
+            name = rel_path.rsplit("/", 1)[-1]
+            if entry["dir"]:
+                line = f"{'  ' * depth}{name}/\n"
+            else:
+                line = f"{'  ' * depth}{name} ({entry['size']} B, {entry['lines']} lines)\n"
+            if max_chars is not None and size + len(line) > max_chars:
+                omitted += 1
+                continue
+            lines.append(line)
+            size += len(line)
+
+        header = f"{prefix or '.'}: {files} files, {dirs} dirs, {total_size} bytes, {total_lines} lines\n"
+        changed = [f"{status} {path}" for status, path in self.changes if not prefix or path.startswith(prefix + "/")]
+        if changed:
+            shown = changed if max_entries is None else changed[:max_entries]
+            more = f" and {len(changed) - len(shown)} more" if len(shown) < len(changed) else ""
+            header += f"Changed since the previous scan: {', '.join(shown)}{more}\n"
+        if omitted:
+            lines.append(f"[...{omitted} more entries, pass directory= or max_depth=]\n")
+        return header + "".join(lines)
+
+    def _scan(self, directory, rel_dir, rules, entries, changes):
+        with os.scandir(directory) as it:
+            for entry in it:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                is_dir = entry.is_dir()
+                if rules.ignored(rel_path, is_dir):
+                    continue
+                if is_dir:
+                    entries[rel_path] = {"dir": True}
+                    if not entry.is_symlink():
+                        self._scan(entry.path, rel_path, rules.for_directory(entry.path, rel_path), entries, changes)
+                    continue
+                stat = entry.stat()
+                old = self.entries.get(rel_path)
+                if old is not None and not old["dir"] and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                    entries[rel_path] = old
+                    continue
+                sha1, line_count = _hash_file(entry.path)
+                self.stats["rehashed"] += 1
+                entries[rel_path] = {
+                    "dir": False,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha1": sha1,
+                    "lines": line_count,
+                }
+                if old is None or old["dir"]:
+                    changes.append(("A", rel_path))
+                elif old["sha1"] != sha1:
+                    changes.append(("M", rel_path))
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_FORMAT_VERSION or data.get("root") != self.root:
+            return
+        self.entries = data.get("entries", {})
+        self.stats["loaded_from_disk"] = True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        data = {"version": INDEX_FORMAT_VERSION, "root": self.root, "entries": self.entries}
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(temp_path, self.cache_path)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_workspace_index(working_directory, create=True):
+    """The process-wide index for a working directory; None if create=False and it was never built."""
+    key = os.path.abspath(working_directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None and create:
+            index = _indexes[key] = WorkspaceIndex(key)
+        return index
+
+
+def mark_workspace_dirty(working_directory):
+    index = get_workspace_index(working_directory, create=False)
+    if index is not None:
+        index.mark_dirty()
+
+
+def forget_workspace(working_directory):
+    """Drop what is cached about a working directory that is going away, such as a batch
+    sandbox: its workspace and search indexes, its saved index and its file_cache entries."""
+    from functions.file_cache import file_cache
+    from functions.search_index import forget_search_index
+
+    key = os.path.abspath(working_directory)
+    with _indexes_lock:
+        index = _indexes.pop(key, None)
+    try:
+        os.remove(index.cache_path if index is not None else _cache_path(key))
+    except FileNotFoundError:
+        pass
+    forget_search_index(key)
+    file_cache.invalidate_tree(os.path.realpath(key))
@@ -8,17 +8,119 @@ def write_file(working_directory, file_path, content):
         return f'Error: Cannot write to "{file_path}" as it is outside the permitted working directory'
     
     try:
-        with open(full_file_path, 'w') as file:
-            file.write(content)
-        return f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
+        old_data = read_existing_bytes(full_file_path)
+        new_data = encode_text(content)
+        atomic_write_bytes(full_file_path, new_data)
+        after_write(full_working_directory, full_file_path)
+        changed = changed_bytes(old_data, new_data)
+        return f'Successfully wrote to "{file_path}" ({len(content)} characters written, {changed} bytes changed)'
     
     except Exception as e:
         return f"Error: {str(e)}"
-    
+
+
+def encode_text(content, newline=None):
+    """Encode like open(path, 'w', newline=newline) would write it."""
+    import locale
+    import os
+
+    if newline is None and os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    return content.encode(locale.getpreferredencoding(False))
+
+
+def read_existing_bytes(full_file_path):
+    try:
+        with open(full_file_path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return b""
+
+
+_umask = None
+
+
+def atomic_write_bytes(full_file_path, data):
+    """Write to a temp file next to the target, fsync it and rename it over the target.
+
+    Readers (and a crash half way through) see either the old or the new file, never a
+    partial one.
+    """
+    import os
+    import stat
+    import tempfile
+
+    global _umask
+    if _umask is None:
+        _umask = os.umask(0)
+        os.umask(_umask)
+
+    # write through symlinks like open(path, 'w') does instead of replacing the link
+    full_file_path = os.path.realpath(full_file_path)
+    directory = os.path.dirname(full_file_path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(full_file_path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(full_file_path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_umask
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, full_file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def after_write(full_working_directory, full_file_path):
+    """Drop everything cached about a file the agent just wrote."""
+    import os
+
+    from functions.file_cache import file_cache
+    from functions.search_index import update_search_index
+    from functions.workspace_index import mark_workspace_dirty
+
+    file_cache.invalidate(os.path.realpath(full_file_path))
+    mark_workspace_dirty(full_working_directory)
+    update_search_index(full_working_directory, full_file_path)
+
+
+def changed_bytes(old, new):
+    """Size of the region that differs between old and new (after the common prefix and suffix)."""
+    limit = min(len(old), len(new))
+    prefix = 0
+    # compare in blocks first, then byte by byte inside the first differing block
+    block = 4096
+    while prefix + block <= limit and old[prefix:prefix + block] == new[prefix:prefix + block]:
+        prefix += block
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix + block <= limit and old[len(old) - suffix - block:len(old) - suffix] == new[len(new) - suffix - block:len(new) - suffix]:
+        suffix += block
+    while suffix < limit and old[len(old) - suffix - 1] == new[len(new) - suffix - 1]:
+        suffix += 1
+    return max(len(old), len(new)) - prefix - suffix
+
 from google.genai import types
 schema_write_file = types.FunctionDeclaration(
     name="write_file",
-    description="Writes content to a file, constrained to the working directory.",
+    description="Writes content to a file, constrained to the working directory. Replaces the whole file; to change part of an existing file use patch_file instead.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
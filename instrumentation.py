@@ -0,0 +1,208 @@
+"""Timing and token instrumentation for agent sessions.
+
+The process-wide `tracer` is off by default and then costs one attribute check per span.
+When enabled (--trace=PATH or --verbose) it records:
+
+  - a "session" span around every run_session,
+  - a "generate_content" span (category "model") around every streamed model call,
+  - a span per call_function dispatch, named after the tool (category "tool"),
+  - a span per run_python_file subprocess or worker-pool run (category "subprocess"),
+  - "compact_history" and "wait_for_tools" spans for the loop itself (category "loop"),
+  - one "turn" counter per model turn with token usage and message-list size,
+  - "retry", "hedge" and circuit breaker counters from resilience.py (category "resilience")
+    and a "retry_backoff" span for every wait before a retry.
+
+Events can be written as JSONL (one event per line) or as a Chrome trace-event file, which
+chrome://tracing and https://ui.perfetto.dev open directly; every session is shown as its own
+process there. summary() breaks the session time down by category and name.
+"""
+import contextlib
+import contextvars
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, List
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("trace_session", default=0)
+
+
+class _Span:
+    """Context manager returned by Tracer.span(); `args` can be extended before it exits."""
+
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._add({
+            "type": "span",
+            "name": self.name,
+            "cat": self.category,
+            "start_us": (self.start - self.tracer.origin_ns) / 1000,
+            "dur_us": (end - self.start) / 1000,
+            "session": _current_session.get(),
+            "thread": threading.get_ident(),
+            "args": self.args,
+        })
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        # a fresh dict so callers can always write results into it
+        return {}
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events: List[Dict[str, Any]] = []
+        self.origin_ns = time.perf_counter_ns()
+        self._session_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.events = []
+
+    # Recording
+    def span(self, name: str, category: str, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def record(self, name: str, category: str, **values) -> None:
+        """A point-in-time measurement, e.g. the token counts of one turn."""
+        if not self.enabled:
+            return
+        self._add({
+            "type": "counter",
+            "name": name,
+            "cat": category,
+            "start_us": (time.perf_counter_ns() - self.origin_ns) / 1000,
+            "session": _current_session.get(),
+            "thread": threading.get_ident(),
+            "args": values,
+        })
+
+    @contextlib.contextmanager
+    def session(self, **args):
+        """Span around one session; events recorded inside it (and in threads started with
+        asyncio.to_thread, which copy the context) are tagged with its id."""
+        if not self.enabled:
+            yield {}
+            return
+        token = _current_session.set(next(self._session_ids))
+        try:
+            with self.span("session", "session", **args) as span_args:
+                yield span_args
+        finally:
+            _current_session.reset(token)
+
+    def _add(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    # Export
+    def write(self, path: str) -> None:
+        """Chrome trace-event JSON for *.json paths, JSONL otherwise."""
+        if path.endswith(".json"):
+            self.write_chrome_trace(path)
+        else:
+            self.write_jsonl(path)
+
+    def write_jsonl(self, path: str) -> None:
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as file:
+            for event in events:
+                file.write(json.dumps(event, default=str) + "\n")
+
+    def write_chrome_trace(self, path: str) -> None:
+        with self._lock:
+            events = list(self.events)
+        trace = []
+        for session in sorted({event["session"] for event in events}):
+            name = f"session {session}" if session else "outside sessions"
+            trace.append({"ph": "M", "name": "process_name", "pid": session, "args": {"name": name}})
+        for event in events:
+            entry = {
+                "name": event["name"],
+                "cat": event["cat"],
+                "ts": event["start_us"],
+                "pid": event["session"],
+                "tid": event["thread"],
+            }
+            if event["type"] == "span":
+                entry.update(ph="X", dur=event["dur_us"], args=event["args"])
+            else:
+                # counter tracks only plot numbers
+                entry.update(ph="C", args={k: v for k, v in event["args"].items() if isinstance(v, (int, float)) and v is not None})
+            trace.append(entry)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file, default=str)
+
+    # Summary
+    def summary(self) -> str:
+        with self._lock:
+            events = list(self.events)
+        spans = [event for event in events if event["type"] == "span"]
+        sessions = [event for event in spans if event["cat"] == "session"]
+        session_us = sum(event["dur_us"] for event in sessions)
+
+        totals: Dict[tuple, List[float]] = {}
+        for event in spans:
+            if event["cat"] != "session":
+                totals.setdefault((event["cat"], event["name"]), []).append(event["dur_us"])
+
+        lines = [f"Trace summary: {len(sessions)} session(s), {session_us / 1e6:.3f} s in sessions"]
+        lines.append(f"  {'category':<12}{'name':<24}{'count':>7}{'total s':>10}{'mean ms':>10}{'max ms':>10}{'% time':>8}")
+        for (category, name), durations in sorted(totals.items(), key=lambda item: -sum(item[1])):
+            total = sum(durations)
+            share = f"{100 * total / session_us:.1f}" if session_us else "-"
+            lines.append(
+                f"  {category:<12}{name:<24}{len(durations):>7}{total / 1e6:>10.3f}"
+                f"{total / len(durations) / 1000:>10.2f}{max(durations) / 1000:>10.2f}{share:>8}"
+            )
+        lines.append("  (read-only tools run concurrently and overlap streaming, so tool time can add up to more than 100%)")
+
+        turns = [event["args"] for event in events if event["type"] == "counter" and event["name"] == "turn"]
+        if turns:
+            prompt = sum(turn.get("prompt_tokens") or 0 for turn in turns)
+            candidates = sum(turn.get("candidates_tokens") or 0 for turn in turns)
+            largest = max(turn.get("messages") or 0 for turn in turns)
+            lines.append(f"  turns: {len(turns)}, prompt tokens: {prompt}, response tokens: {candidates}, largest message list: {largest}")
+        resilience: Dict[str, int] = {}
+        for event in events:
+            if event["type"] == "counter" and event["cat"] == "resilience":
+                resilience[event["name"]] = resilience.get(event["name"], 0) + 1
+        if resilience:
+            lines.append("  resilience: " + ", ".join(f"{name} x{count}" for name, count in sorted(resilience.items())))
+        return "\n".join(lines)
+
+
+tracer = Tracer()
@@ -1,144 +1,492 @@
+import asyncio
 import os
 import sys
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 
-from functions.get_files_info import *
-from functions.get_file_content import *
-from functions.write_file import *
-from functions.run_python import *
-from code_debug import code_debug
-from tictactoe import tictactoe
+# Only light modules are imported up front. The SDK (google.genai, dotenv), the agent classes
+# and the tool modules are imported where they are first used, so argument errors and runs
+# that never need some of them do not pay for loading them.
+from functions.registry import get_tool, is_read_only
+from instrumentation import tracer
 
 def main():
     print("Hello from ai-agent!")
 
-    # Load environment variables from .env file
-    if False == load_dotenv("ai_key.env"):
-        raise FileNotFoundError(".env file not found. Please create a .env file with your API key.")
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable is not set.")
-
-    client = genai.Client(api_key=api_key)
-    
-    
-    if len(sys.argv) > 1:
+    # --resume continues the last checkpoint, so the prompt may be left out
+    resume = "--resume" in sys.argv[1:]
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("--"):
         prompt = sys.argv[1]
+    elif resume:
+        prompt = None
     else:
         print("No prompt provided.")
         exit (1)
 
     verbose = False
+    # Number of worker threads used for read-only function calls (1 = run every call in order)
+    max_workers = 1
+    # Number of warm interpreters for run_python_file (0 = start a fresh process per call)
+    warm_pool = 0
+    # Scan the working directory into the workspace index before the first turn
+    build_index = False
+    # Answer repeated reads of unchanged files with a short note instead of the content
+    dedupe_reads = False
+    # Estimated prompt tokens to keep each request under (None = no summarizing)
+    token_budget = None
+    # Where model responses come from: record:PATH, replay:PATH or stub:SCRIPT (None = Gemini)
+    transport_spec = None
+    # Write a timing trace here at the end (*.json = Chrome trace format, otherwise JSONL)
+    trace_path = None
+    # Reuse model responses for identical conversation prefixes (see response_cache.py)
+    cache_responses = False
+    cache_ttl = None
+    # Where each completed turn is checkpointed for --resume (None = no checkpoints). Off by
+    # default: concurrent runs sharing one default file would overwrite each other's sessions
+    checkpoint_path = None
+    # Retries of a failed model call (429/5xx/connection errors) before the session gives up
+    max_retries = 4
+    # Hedged model calls: None = off, "p95" = after the p95 first-chunk latency, or seconds
+    hedge = None
     # Determine which agent to use (defaults to code_debug)
-    agent_name = "code_debug"
+    agent_name = None
     difficulty = "medium"
-    for arg in sys.argv[2:]:
+    for arg in sys.argv[1 if prompt is None else 2:]:
         if arg.startswith("--agent="):
             agent_name = arg.split("=", 1)[1].strip() or "code_debug"
         elif arg.startswith("--difficulty="):
             difficulty = arg.split("=", 1)[1].strip() or "medium"
+        elif arg.startswith("--parallel="):
+            try:
+                max_workers = max(1, int(arg.split("=", 1)[1]))
+            except ValueError:
+                print(f"Invalid value for --parallel: '{arg}', running function calls in order")
+        elif arg.startswith("--warm-pool="):
+            try:
+                warm_pool = max(0, int(arg.split("=", 1)[1]))
+            except ValueError:
+                print(f"Invalid value for --warm-pool: '{arg}', starting a fresh process per run")
+        elif arg.startswith("--token-budget="):
+            try:
+                token_budget = max(1, int(arg.split("=", 1)[1]))
+            except ValueError:
+                print(f"Invalid value for --token-budget: '{arg}', history will not be summarized")
+        elif arg.startswith("--transport="):
+            transport_spec = arg.split("=", 1)[1].strip() or None
+        elif arg.startswith("--trace="):
+            trace_path = arg.split("=", 1)[1].strip() or None
+        elif arg == "--cache-responses":
+            cache_responses = True
+        elif arg.startswith("--cache-ttl="):
+            try:
+                cache_ttl = float(arg.split("=", 1)[1])
+            except ValueError:
+                print(f"Invalid value for --cache-ttl: '{arg}', using the default")
+        elif arg == "--checkpoint" or arg.startswith("--checkpoint="):
+            from checkpoint import DEFAULT_CHECKPOINT_PATH
+            checkpoint_path = arg.partition("=")[2].strip() or DEFAULT_CHECKPOINT_PATH
+        elif arg == "--resume":
+            pass
+        elif arg.startswith("--retries="):
+            try:
+                max_retries = max(0, int(arg.split("=", 1)[1]))
+            except ValueError:
+                print(f"Invalid value for --retries: '{arg}', using {max_retries}")
+        elif arg == "--hedge":
+            hedge = "p95"
+        elif arg.startswith("--hedge="):
+            try:
+                hedge = max(0.0, float(arg.split("=", 1)[1]))
+            except ValueError:
+                print(f"Invalid value for --hedge: '{arg}', hedging after the p95 latency")
+                hedge = "p95"
+        elif arg == "--index":
+            build_index = True
+        elif arg == "--dedupe-reads":
+            dedupe_reads = True
         elif arg == "--verbose":
             print("Verbose mode enabled.")
             verbose = True
 
 
+    checkpoint = None
+    if resume:
+        from checkpoint import DEFAULT_CHECKPOINT_PATH, load_checkpoint
+
+        # a resumed session keeps checkpointing to the file it came from
+        checkpoint_path = checkpoint_path or DEFAULT_CHECKPOINT_PATH
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint is None:
+            print(f"No checkpoint found at {checkpoint_path}")
+            exit(1)
+        if checkpoint["finished"]:
+            print("The checkpointed session already finished.")
+            print(f"Assistant response: {checkpoint['final_text']}")
+            return
+        if prompt is not None and prompt != checkpoint["prompt"]:
+            print("Ignoring the prompt given with --resume, continuing the checkpointed session")
+        prompt = checkpoint["prompt"]
+        agent_name = agent_name or checkpoint["agent"]
+        print(f"Resuming after turn {checkpoint['loop']} ({len(checkpoint['messages'])} messages)")
+
     # Initialize agent provider
+    agent = create_agent(agent_name or "code_debug", difficulty)
+    if dedupe_reads:
+        agent.seen_files = {}
+
+    if warm_pool:
+        from functions.python_pool import enable_worker_pool
+        enable_worker_pool(agent.working_directory, size=warm_pool)
+
+    if build_index:
+        from functions.workspace_index import get_workspace_index
+        changes = get_workspace_index(agent.working_directory).refresh()
+        if verbose:
+            print("Workspace index changes since last run:", changes)
+
+    if trace_path or verbose:
+        tracer.enable()
+
+    from transport import create_transport
+
+    from resilience import ResilientTransport
+
+    transport, stub_server = create_transport(transport_spec, create_client)
+    transport = resilient = ResilientTransport(
+        transport, max_retries=max_retries, hedge=hedge is not None,
+        hedge_after=hedge if isinstance(hedge, float) else None,
+    )
+    response_cache = None
+    if cache_responses:
+        from response_cache import RESPONSE_CACHE_TTL_SECONDS, CachingTransport, ResponseCache
+        response_cache = ResponseCache(ttl_seconds=cache_ttl if cache_ttl is not None else RESPONSE_CACHE_TTL_SECONDS)
+        transport = CachingTransport(transport, response_cache, agent.working_directory)
+    try:
+        final_text, messages = asyncio.run(
+            run_session(
+                transport, agent, prompt, verbose=verbose, max_workers=max_workers, token_budget=token_budget,
+                checkpoint_path=checkpoint_path, resume=checkpoint,
+            )
+        )
+    finally:
+        if stub_server is not None:
+            stub_server.stop()
+
+    if trace_path:
+        tracer.write(trace_path)
+        print(f"Trace written to {trace_path}")
+    if tracer.enabled:
+        print(tracer.summary())
+    if response_cache is not None and verbose:
+        print(response_cache.summary())
+    if verbose or resilient.stats["retries"] or resilient.stats["hedges"]:
+        print(resilient.summary())
+
+    if verbose:
+        from functions.file_cache import file_cache
+        print("File cache:", file_cache.stats())
+        print("END: Total messages:", len(messages))
+        for message in messages:
+            if message.parts and len(message.parts) > 0:
+                if hasattr(message.parts[0], "text") and message.parts[0].text is not None:
+                    print(f"{message.role}: {message.parts[0].text}")
+                elif hasattr(message.parts[0], "function_response"):
+                    print(f"{message.role}: {message.parts[0].function_response}")
+                else:
+                    print(f"{message.role}: [Unknown part type]")
+            else:
+                print(f"{message.role}: [No parts]")
+
+
+def create_agent(agent_name, difficulty="medium"):
     if agent_name == "tictactoe":
-        agent = tictactoe(difficulty=difficulty)
-    else:
-        if agent_name != "code_debug":
-            print(f"Unknown agent '{agent_name}', defaulting to code_debug")
-        agent = code_debug()
+        from tictactoe import tictactoe
+        return tictactoe(difficulty=difficulty)
+    if agent_name != "code_debug":
+        print(f"Unknown agent '{agent_name}', defaulting to code_debug")
+    from code_debug import code_debug
+    return code_debug()
 
-    # Build config from agent
-    system_prompt = agent.system_prompt
-    available_functions = agent.available_functions
 
+def create_client():
+    from dotenv import load_dotenv
+    from google import genai
+
+    # Load environment variables from .env file
+    if False == load_dotenv("ai_key.env"):
+        raise FileNotFoundError(".env file not found. Please create a .env file with your API key.")
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable is not set.")
+
+    return genai.Client(api_key=api_key)
+
+
+MODEL_NAME = "gemini-2.0-flash-001"
+MAX_LOOPS = 20
+
+
+class SessionError(Exception):
+    """A session ended by an error, raised by run_session(raise_errors=True).
+
+    `messages` is the conversation up to the failed turn.
+    """
+
+    def __init__(self, message, messages):
+        super().__init__(message)
+        self.messages = messages
+
+
+async def run_session(client, agent, prompt, verbose=False, max_workers=1, out=sys.stdout, token_budget=None,
+                      checkpoint_path=None, resume=None, raise_errors=False):
+    """Run one conversation with the model until it answers with text or MAX_LOOPS is hit.
+
+    Sessions keep all their state locally, so one process can run many of them at once
+    (e.g. with asyncio.gather) on a shared client. Text is written to `out` as it streams in;
+    pass out=None to keep a session quiet. Stale file reads are stubbed out of the history and,
+    with a token_budget, older turns are summarized to keep each request under it.
+    `client` is a genai.Client or a transport (see transport.py) used for every model call.
+    Model calls, tool calls and per-turn token counts go to instrumentation.tracer when it
+    is enabled. With a checkpoint_path every completed turn is saved there (see checkpoint.py);
+    `resume` is a loaded checkpoint to continue from, restoring its messages, agent state and
+    loop counter. MAX_LOOPS applies per run, so a resumed session gets a fresh allowance.
+    Returns (final_text, messages). An error ends the session: it is printed and final_text
+    is None, or with raise_errors it is raised as a SessionError.
+    """
+    with tracer.session(agent=type(agent).__name__) as session:
+        final_text, messages = await _run_session(
+            client, agent, prompt, verbose, max_workers, out, token_budget, checkpoint_path, resume,
+            raise_errors,
+        )
+        session["messages"] = len(messages)
+        session["finished"] = final_text is not None
+    return final_text, messages
+
+
+async def _run_session(client, agent, prompt, verbose, max_workers, out, token_budget, checkpoint_path, resume,
+                       raise_errors):
+    from google.genai import types
+
+    from context_manager import CHARS_PER_TOKEN, ContextManager
+    from transport import GeminiTransport
+
+    transport = client if hasattr(client, "stream") else GeminiTransport(client)
+
+    # Build config from agent
     config = types.GenerateContentConfig(
-        tools=[available_functions], system_instruction=system_prompt
+        tools=[agent.available_functions], system_instruction=agent.system_prompt
+    )
+
+    def forget_file(path):
+        # the model no longer has this file's content, so the next read must return it in full
+        if getattr(agent, "seen_files", None) is not None:
+            agent.seen_files.pop(path, None)
+
+    context = ContextManager(
+        token_budget=token_budget,
+        fixed_tokens=(len(agent.system_prompt) + len(agent.available_functions.model_dump_json(exclude_none=True))) // CHARS_PER_TOKEN,
+        working_directory=agent.working_directory,
+        on_forget=forget_file,
     )
 
-    MAX_LOOPS = 20
     current_loop = 0
+    final_text = None
 
     messages = [
         types.Content(role="user", parts=[types.Part(text=prompt)]),
     ]
+    if resume is not None:
+        messages = list(resume["messages"])
+        current_loop = resume["loop"]
+        agent.set_state(resume["agent_state"])
+
+    def checkpoint_turn():
+        if checkpoint_path is not None:
+            from checkpoint import save_checkpoint
+            save_checkpoint(checkpoint_path, prompt, agent, current_loop, messages, final_text)
 
-    while current_loop < MAX_LOOPS:
+    last_loop = current_loop + MAX_LOOPS
+    while current_loop < last_loop:
+        scheduler = FunctionCallScheduler(agent, verbose=verbose, max_workers=max_workers)
         try:
             current_loop += 1
+            with tracer.span("compact_history", "loop"):
+                context.compact(messages)
 
-            # call to the gemini model
-            response = client.models.generate_content(
-                model="gemini-2.0-flash-001", 
-                contents=messages, 
-                config=config)
-
-            # read response candidates from the model (append model turn so function call context is preserved)
-            if response.candidates:
-                for candidate in response.candidates:
-                    if candidate.content is not None:
-                        messages.append(candidate.content)
-
-            # loop through function calls if any
-            function_response_parts = []
-            if response.function_calls:
-                for function_call_part in response.function_calls:
-                    function_call_result_content = call_function(agent, function_call_part, verbose=verbose)
-                    # Each call_function returns a Content with one Part (function_response)
-                    if function_call_result_content and function_call_result_content.parts:
-                        fr_part = function_call_result_content.parts[0]
-                        function_response_parts.append(fr_part)
-                # Append a SINGLE user message containing all function response parts (must 1:1 with function calls of previous model turn)
-                if function_response_parts:
-                    messages.append(
-                        types.Content(
-                            role="user",
-                            parts=function_response_parts
-                        )
+            # stream the model turn; function calls start running as soon as their parts arrive
+            with tracer.span("generate_content", "model", turn=current_loop, messages=len(messages)):
+                model_content, text, usage_metadata = await _stream_model_turn(
+                    transport, messages, config, scheduler, out
+                )
+
+            if usage_metadata is not None:
+                context.observe(messages, usage_metadata.prompt_token_count)
+            if tracer.enabled:
+                tracer.record(
+                    "turn", "turn",
+                    turn=current_loop,
+                    messages=len(messages),
+                    estimated_tokens=context.estimate_total(messages),
+                    prompt_tokens=getattr(usage_metadata, "prompt_token_count", None),
+                    candidates_tokens=getattr(usage_metadata, "candidates_token_count", None),
+                    total_tokens=getattr(usage_metadata, "total_token_count", None),
+                )
+
+            # append model turn so function call context is preserved
+            if model_content.parts:
+                messages.append(model_content)
+
+            # time spent waiting for tools that were still running when the stream ended
+            with tracer.span("wait_for_tools", "loop", calls=len(scheduler)):
+                function_response_parts = await scheduler.gather()
+            # Append a SINGLE user message containing all function response parts (must 1:1 with function calls of previous model turn)
+            if function_response_parts:
+                messages.append(
+                    types.Content(
+                        role="user",
+                        parts=function_response_parts
                     )
-                    continue
+                )
+                checkpoint_turn()
+                continue
 
-            # check if the model response contains a response text (only when no function call round)
-            if response.text:
-                print("Assistant response: ", response.text)
+            # the model answered with text only, we are done
+            if text:
+                final_text = text
+                checkpoint_turn()
                 break
 
             # print prompt tokens and response tokens
             if verbose:
                 print("User prompt:", prompt)
-                if response.usage_metadata is not None:
-                    print("Prompt tokens:", getattr(response.usage_metadata, "prompt_token_count", "N/A"))
-                    print("Response tokens:", getattr(response.usage_metadata, "candidates_token_count", "N/A"))
+                if usage_metadata is not None:
+                    print("Prompt tokens:", getattr(usage_metadata, "prompt_token_count", "N/A"))
+                    print("Response tokens:", getattr(usage_metadata, "candidates_token_count", "N/A"))
                 else:
                     print("Prompt tokens: N/A")
                     print("Response tokens: N/A")
         except Exception as e:
+            scheduler.cancel()
+            if raise_errors:
+                raise SessionError(f"{type(e).__name__}: {e}", messages) from e
             print(f"Error during processing: {e}")
             print( e.with_traceback(sys.exc_info()[2]))
             break
-    
+
     #end loop
 
     if verbose:
-        print("END: Total messages:", len(messages))
-        for message in messages:
-            if message.parts and len(message.parts) > 0:
-                if hasattr(message.parts[0], "text") and message.parts[0].text is not None:
-                    print(f"{message.role}: {message.parts[0].text}")
-                elif hasattr(message.parts[0], "function_response"):
-                    print(f"{message.role}: {message.parts[0].function_response}")
-                else:
-                    print(f"{message.role}: [Unknown part type]")
-            else:
-                print(f"{message.role}: [No parts]")
+        print("Context:", context.stats, "estimated tokens:", context.estimate_total(messages))
+
+    return final_text, messages
+
+
+async def _stream_model_turn(transport, messages, config, scheduler, out):
+    """Stream one model response, printing text and scheduling function calls as they arrive.
+
+    Returns the assembled model Content (adjacent text chunks merged), the turn's text and
+    the last usage metadata seen in the stream.
+    """
+    from google.genai import types
+
+    parts = []
+    text_chunks = []
+    turn_text = []
+    usage_metadata = None
+
+    stream = await transport.stream(MODEL_NAME, messages, config)
+
+    async for chunk in stream:
+        if chunk.usage_metadata is not None:
+            usage_metadata = chunk.usage_metadata
+        if not chunk.candidates or chunk.candidates[0].content is None:
+            continue
+        for part in chunk.candidates[0].content.parts or []:
+            if part.text is not None and part.function_call is None:
+                if out is not None:
+                    if not turn_text:
+                        out.write("Assistant response: ")
+                    out.write(part.text)
+                    out.flush()
+                text_chunks.append(part.text)
+                turn_text.append(part.text)
+                continue
+            if text_chunks:
+                parts.append(types.Part(text="".join(text_chunks)))
+                text_chunks = []
+            if part.function_call is not None:
+                scheduler.submit(part.function_call)
+            parts.append(part)
+
+    if text_chunks:
+        parts.append(types.Part(text="".join(text_chunks)))
+    if turn_text and out is not None:
+        out.write("\n")
+        out.flush()
+
+    return types.Content(role="model", parts=parts), "".join(turn_text), usage_metadata
 
 
+class FunctionCallScheduler:
+    """Runs the function calls of one model turn as they are submitted.
+
+    Read-only calls run concurrently on worker threads (up to `max_workers` at a time).
+    Any other call (write_file, run_python_file, agent handlers) waits for every call
+    submitted before it, and calls submitted after it wait for it, so side effects keep
+    the order the model asked for. gather() returns the response parts in call order.
+    """
+
+    def __init__(self, agent, verbose=False, max_workers=1):
+        self.agent = agent
+        self.verbose = verbose
+        self._semaphore = asyncio.Semaphore(max(1, max_workers))
+        self._tasks = []
+        self._barrier = None
+
+    def submit(self, function_call_part):
+        # tools that only read the working directory are safe to run concurrently
+        if is_read_only(function_call_part.name):
+            task = asyncio.create_task(self._run_read_only(function_call_part, self._barrier))
+        else:
+            task = asyncio.create_task(self._run_in_order(function_call_part, list(self._tasks)))
+            self._barrier = task
+        self._tasks.append(task)
+
+    def __len__(self):
+        """Number of calls submitted so far."""
+        return len(self._tasks)
+
+    async def gather(self):
+        results = await asyncio.gather(*self._tasks)
+        # Each call_function returns a Content with one Part (function_response)
+        function_response_parts = []
+        for function_call_result_content in results:
+            if function_call_result_content and function_call_result_content.parts:
+                function_response_parts.append(function_call_result_content.parts[0])
+        return function_response_parts
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _run_read_only(self, function_call_part, barrier):
+        if barrier is not None:
+            await asyncio.wait([barrier])
+        async with self._semaphore:
+            return await asyncio.to_thread(call_function, self.agent, function_call_part, self.verbose)
+
+    async def _run_in_order(self, function_call_part, earlier_tasks):
+        if earlier_tasks:
+            await asyncio.wait(earlier_tasks)
+        return await asyncio.to_thread(call_function, self.agent, function_call_part, self.verbose)
+
 
 def call_function(agent, function_call_part, verbose=False):
+    with tracer.span(function_call_part.name, "tool"):
+        return _call_function(agent, function_call_part, verbose)
+
+
+def _call_function(agent, function_call_part, verbose=False):
+    from google.genai import types
+
     function_name = function_call_part.name
     args = function_call_part.args
 
@@ -146,14 +494,9 @@ def call_function(agent, function_call_part, verbose=False):
 
     function_result = None
 
-    if function_name == "get_files_info":
-        function_result = get_files_info("./calculator", **args)
-    elif function_name == "get_file_content":
-        function_result = get_file_content("./calculator", **args)
-    elif function_name == "write_file":
-        function_result = write_file("./calculator", **args)
-    elif function_name == "run_python_file":
-        function_result = run_python_file("./calculator", **args)
+    tool = get_tool(function_name)
+    if tool is not None:
+        function_result = tool.call(agent, args)
     else:
         # Route to agent-specific handler if available
         if hasattr(agent, "handle_function"):
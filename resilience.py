@@ -0,0 +1,288 @@
+"""Retries, a circuit breaker and hedged requests around a model transport.
+
+ResilientTransport wraps any transport (see transport.py) and makes each model call survive
+transient failures instead of ending the session:
+
+  - 429 and 5xx responses, connection errors and timeouts are retried with exponential backoff
+    and full jitter (a random delay between 0 and base * 2**attempt, capped). A Retry-After
+    header, or the retryDelay Google puts in RESOURCE_EXHAUSTED errors, is honoured instead.
+    Other errors (400, 403, 404, ...) are raised straight away.
+  - A CircuitBreaker counts consecutive failed attempts across all calls sharing the transport.
+    After `failure_threshold` of them it opens and calls fail fast with CircuitOpenError for
+    `reset_seconds`; then one trial call is let through and its result closes or reopens it.
+    Calls made while the trial is in flight wait for that result instead of failing.
+  - With hedging on, a duplicate request is sent when the first has not produced its first
+    chunk within the p95 of recent first-chunk latencies (or a fixed delay), and whichever
+    answers first is used; the other is cancelled. A hedge costs an extra request and its
+    tokens, so it is off by default.
+
+A streamed call can only be retried before any of it reached the caller, so an attempt counts
+as successful once its first chunk arrives; an error later in the stream is raised to the
+caller as before. Every retry, hedge and circuit state change is recorded to the tracer
+(category "resilience").
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Optional, Tuple
+
+import httpx
+from google.genai import errors
+
+from instrumentation import tracer
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the model while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"  # closed | open | half_open
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._trial_done: Optional[asyncio.Event] = None
+
+    def before_call(self) -> None:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise CircuitOpenError(
+                    f"Model calls suspended after {self.failures} consecutive failures; "
+                    f"retrying in {self.reset_seconds - (time.monotonic() - self.opened_at):.0f} s"
+                )
+            self.state = "half_open"
+            tracer.record("circuit_half_open", "resilience")
+        elif self.state == "half_open":
+            # only the trial call may run until it has an answer
+            raise CircuitOpenError("Model calls suspended while a trial call is in flight")
+
+    async def wait_for_trial(self) -> None:
+        """Wait until the trial call in flight has closed or reopened the circuit."""
+        while self.state == "half_open":
+            if self._trial_done is None:
+                self._trial_done = asyncio.Event()
+            await self._trial_done.wait()
+
+    def release(self) -> None:
+        """Give up a trial call without a result, letting the next call try instead."""
+        if self.state == "half_open":
+            self.state = "open"
+            self.opened_at = time.monotonic() - self.reset_seconds
+        self._end_trial()
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            tracer.record("circuit_closed", "resilience")
+        self.state = "closed"
+        self.failures = 0
+        self._end_trial()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+                tracer.record("circuit_open", "resilience", failures=self.failures, reset_s=self.reset_seconds)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._end_trial()
+
+    def _end_trial(self) -> None:
+        if self._trial_done is not None:
+            self._trial_done.set()
+            self._trial_done = None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After or a RetryInfo detail."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in (details.get("error") or {}).get("details") or []:
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return max(0.0, float(delay[:-1]))
+                except ValueError:
+                    pass
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TransportError, ConnectionError, asyncio.TimeoutError))
+
+
+class ResilientTransport:
+    """Retries, circuit breaking and optional hedging for another transport.
+
+    `hedge` turns hedged requests on; they are sent after `hedge_after` seconds when given,
+    otherwise after the `hedge_quantile` of the last `latency_window` first-chunk latencies
+    (no hedging until `hedge_min_samples` calls have completed).
+    """
+
+    def __init__(self, inner, max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 max_retry_after: float = 120.0, breaker: Optional[CircuitBreaker] = None, hedge: bool = False,
+                 hedge_after: Optional[float] = None, hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 latency_window: int = 200) -> None:
+        self.inner = inner
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+        self.stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "hedges": 0, "hedge_wins": 0,
+                      "backoff_seconds": 0.0}
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # a little jitter so that sessions told the same Retry-After do not all come back at once
+            return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if len(self.latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    async def stream(self, model, contents, config):
+        self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                if self.breaker.state == "half_open":
+                    # another call is the trial; its result decides whether this one may go
+                    await self.breaker.wait_for_trial()
+                    continue
+                self.stats["rejected"] += 1
+                raise
+            start = time.perf_counter()
+            try:
+                first, iterator = await self._attempt(model, contents, config)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as error:
+                if not is_retryable(error):
+                    # the service answered, it just did not like the request
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries or self.breaker.state == "open":
+                    self.stats["failures"] += 1
+                    raise
+                delay = self.backoff(attempt, error)
+                attempt += 1
+                self.stats["retries"] += 1
+                self.stats["backoff_seconds"] += delay
+                tracer.record("retry", "resilience", attempt=attempt, delay_s=round(delay, 3),
+                              error=type(error).__name__, status=getattr(error, "code", None))
+                with tracer.span("retry_backoff", "resilience", attempt=attempt):
+                    await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.latencies.append(time.perf_counter() - start)
+            return self._replay_first(first, iterator)
+
+    async def _attempt(self, model, contents, config) -> Tuple[Any, Any]:
+        """(first chunk or None for an empty stream, iterator over the rest) of one attempt."""
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._first_chunk(model, contents, config))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        tracer.record("hedge", "resilience", after_s=round(delay, 3))
+        hedged = asyncio.ensure_future(self._first_chunk(model, contents, config))
+        pending = {primary, hedged}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedged:
+                        self.stats["hedge_wins"] += 1
+                    tracer.record("hedge_result", "resilience", winner="hedge" if task is hedged else "primary")
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await _discard(pending)
+
+    async def _first_chunk(self, model, contents, config) -> Tuple[Any, Any]:
+        # errors such as 429/503 surface on the first read of the stream, not when it is opened
+        stream = await self.inner.stream(model, contents, config)
+        iterator = stream.__aiter__()
+        try:
+            return await iterator.__anext__(), iterator
+        except StopAsyncIteration:
+            return None, iterator
+
+    @staticmethod
+    async def _replay_first(first, iterator):
+        if first is None:
+            return
+        yield first
+        async for chunk in iterator:
+            yield chunk
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (f"Model calls: {stats['calls']}, {stats['retries']} retried ({stats['backoff_seconds']:.1f} s of backoff), "
+                f"{stats['failures']} failed after retrying, {stats['rejected']} rejected by the open circuit "
+                f"({self.breaker.opens} opens), {stats['hedges']} hedged ({stats['hedge_wins']} won by the hedge)")
+
+
+async def _discard(tasks) -> None:
+    """Wait for cancelled first-chunk tasks and close any stream they managed to open."""
+    for task in tasks:
+        try:
+            _, iterator = await task
+        except (asyncio.CancelledError, Exception):
+            continue
+        close = getattr(iterator, "aclose", None)
+        if close is not None:
+            try:
+                await close()
+            except Exception:
+                pass
@@ -0,0 +1,197 @@
+"""Opt-in on-disk cache of model responses, keyed on the conversation so far.
+
+The key is transport.request_key, the same one replays use: a SHA-256 of the model name,
+system instruction, tool declarations and the serialized messages sent with the request. Tool
+results are part of the messages, so a cached continuation is only found when the tools
+returned the same thing; volatile text such as run_python_file's "Ran for 0.123 seconds" is
+normalized first so timing noise does not defeat the cache. Conversations can also depend on
+file content that is no longer in the messages (stale reads stubbed out by the context
+manager, "unchanged since last read" notes, summarized turns), so every entry also stores the
+hashes of the files the conversation read with get_file_content, and an entry is only used
+while those files are unchanged.
+
+Entries are one JSON file each under .agent_cache/responses/. The total size is bounded with
+LRU eviction (a hit touches the file's mtime, eviction removes the oldest first) and entries
+older than the TTL are dropped when they are looked up.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from google.genai import types
+
+from functions.write_file import atomic_write_bytes
+from transport import request_key
+
+RESPONSE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".agent_cache", "responses")
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def read_files(contents: List[types.Content]) -> List[str]:
+    """Paths the conversation read with get_file_content, in first-read order."""
+    paths = []
+    for content in contents:
+        for part in content.parts or []:
+            call = part.function_call
+            if call is not None and call.name == "get_file_content":
+                path = str((call.args or {}).get("file_path", ""))
+                if path and path not in paths:
+                    paths.append(path)
+    return paths
+
+
+def file_hashes(working_directory: str, paths: List[str]) -> Dict[str, Optional[str]]:
+    hashes = {}
+    root = os.path.abspath(working_directory)
+    for path in paths:
+        full_path = os.path.abspath(os.path.join(root, path))
+        try:
+            with open(full_path, "rb") as file:
+                hashes[path] = hashlib.sha1(file.read()).hexdigest()
+        except OSError:
+            hashes[path] = None
+    return hashes
+
+
+class ResponseCache:
+    def __init__(self, directory: str = RESPONSE_CACHE_DIR, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 ttl_seconds: Optional[float] = RESPONSE_CACHE_TTL_SECONDS) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "stores": 0, "evictions": 0,
+                      "latency_saved_seconds": 0.0}
+        self._sizes: Dict[str, int] = {}
+        self._used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    stat = entry.stat()
+                    self._sizes[entry.name[:-5]] = stat.st_size
+                    self._used[entry.name[:-5]] = stat.st_mtime
+        # the limit may have been lowered since the entries were written
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str, working_directory: str) -> Optional[Dict[str, Any]]:
+        """The cached entry, or None when missing, expired or the files it read changed."""
+        with self._lock:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as file:
+                    entry = json.load(file)
+            except (OSError, ValueError):
+                self.stats["misses"] += 1
+                return None
+            if self.ttl_seconds is not None and time.time() - entry["created"] > self.ttl_seconds:
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                self._remove(key)
+                return None
+            if file_hashes(working_directory, list(entry["files"])) != entry["files"]:
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            now = time.time()
+            try:
+                os.utime(self._path(key), (now, now))
+            except OSError:
+                pass
+            self._used[key] = now
+            return entry
+
+    def put(self, key: str, chunks: List[Dict[str, Any]], files: Dict[str, Optional[str]], latency_seconds: float) -> None:
+        entry = {"created": time.time(), "latency_seconds": latency_seconds, "files": files, "chunks": chunks}
+        data = json.dumps(entry).encode()
+        with self._lock:
+            atomic_write_bytes(self._path(key), data)
+            self._sizes[key] = len(data)
+            self._used[key] = time.time()
+            self.stats["stores"] += 1
+            self._evict()
+
+    def record_saved(self, seconds: float) -> None:
+        """Count model latency a cache hit saved."""
+        with self._lock:
+            self.stats["latency_saved_seconds"] += max(0.0, seconds)
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({100 * self.hit_rate():.0f}% hit rate), "
+                f"{stats['invalidated']} invalidated by file changes, {stats['expired']} expired, "
+                f"{stats['evictions']} evicted, {stats['latency_saved_seconds']:.2f} s of model latency saved")
+
+    def _evict(self) -> None:
+        total = sum(self._sizes.values())
+        for key in sorted(self._used, key=self._used.get):
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.get(key, 0)
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        self._sizes.pop(key, None)
+        self._used.pop(key, None)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+
+class CachingTransport:
+    """Answers from a ResponseCache when it can and stores complete responses otherwise.
+
+    `working_directory` is the directory the session's tools work in; it is used to check
+    that the files a cached conversation read are unchanged.
+    """
+
+    def __init__(self, inner, cache: ResponseCache, working_directory: str) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.working_directory = working_directory
+
+    async def stream(self, model, contents, config):
+        start = time.perf_counter()
+        key = request_key(model, contents, config)
+        # file reads, hashing and fsync run off the event loop so other sessions keep streaming
+        entry = await asyncio.to_thread(self.cache.get, key, self.working_directory)
+        if entry is not None:
+            chunks = [types.GenerateContentResponse.model_validate(chunk) for chunk in entry["chunks"]]
+            self.cache.record_saved(entry["latency_seconds"] - (time.perf_counter() - start))
+
+            async def cached():
+                for chunk in chunks:
+                    yield chunk
+
+            return cached()
+
+        # hash the files now: the model answered this version of them
+        files = await asyncio.to_thread(file_hashes, self.working_directory, read_files(contents))
+        upstream = await self.inner.stream(model, contents, config)
+
+        async def storing():
+            chunks = []
+            async for chunk in upstream:
+                chunks.append(chunk.model_dump(mode="json", exclude_none=True))
+                yield chunk
+            # only complete, non-empty responses are stored
+            if chunks:
+                await asyncio.to_thread(self.cache.put, key, chunks, files, time.perf_counter() - start)
+
+        return storing()
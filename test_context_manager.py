@@ -0,0 +1,126 @@
+# test_context_manager.py
+
+import os
+import unittest
+
+from google.genai import types
+
+from context_manager import SUMMARY_MARKER, ContextManager
+
+
+def user(text):
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def call(name, **args):
+    return types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))])
+
+
+def response(name, result):
+    return types.Content(role="user", parts=[types.Part.from_function_response(name=name, response={"result": result})])
+
+
+def result(message):
+    return message.parts[0].function_response.response["result"]
+
+
+class TestStubStaleReads(unittest.TestCase):
+    def setUp(self):
+        self.manager = ContextManager()
+
+    def test_read_write_read(self):
+        messages = [
+            user("fix it"),
+            call("get_file_content", file_path="pkg/a.py"), response("get_file_content", "old content"),
+            call("write_file", file_path="pkg/a.py", content="new"), response("write_file", "Successfully wrote"),
+            call("get_file_content", file_path="pkg/a.py"), response("get_file_content", "new content"),
+        ]
+        self.manager.compact(messages)
+        self.assertTrue(result(messages[2]).startswith("[stale: content of pkg/a.py omitted because the file was changed later"))
+        self.assertEqual(result(messages[4]), "Successfully wrote")
+        self.assertEqual(result(messages[6]), "new content")
+        self.assertEqual(self.manager.stats["stubbed"], 1)
+
+    def test_repeated_reads_of_the_same_range(self):
+        messages = [
+            user("look"),
+            call("get_file_content", file_path="a.py", start_line=1, end_line=10), response("get_file_content", "first"),
+            call("get_file_content", file_path="a.py", start_line=11, end_line=20), response("get_file_content", "other range"),
+            call("get_file_content", file_path="a.py", start_line=1, end_line=10), response("get_file_content", "again"),
+        ]
+        self.manager.compact(messages)
+        self.assertIn("it was read again later", result(messages[2]))
+        self.assertEqual(result(messages[4]), "other range")
+        self.assertEqual(result(messages[6]), "again")
+
+    def test_stubbing_is_idempotent(self):
+        messages = [
+            user("look"),
+            call("get_file_content", file_path="a.py"), response("get_file_content", "first"),
+            call("get_file_content", file_path="a.py"), response("get_file_content", "second"),
+        ]
+        self.manager.compact(messages)
+        self.manager.compact(messages)
+        self.assertEqual(self.manager.stats["stubbed"], 1)
+
+
+class TestSummarize(unittest.TestCase):
+    def conversation(self, turns):
+        messages = [user("the prompt")]
+        for turn in range(turns):
+            messages.append(call("get_file_content", file_path=f"file{turn}.py"))
+            messages.append(response("get_file_content", f"content of file {turn} " + "x" * 400))
+        return messages
+
+    def test_cut_only_before_a_model_message(self):
+        messages = self.conversation(6)
+        manager = ContextManager(token_budget=50, keep_recent=3)
+        manager.compact(messages)
+        self.assertLess(len(messages), 13)
+        self.assertEqual(messages[0].role, "user")
+        # what is left still alternates and every call is followed by its response
+        self.assertEqual(messages[1].role, "model")
+        for model, answer in zip(messages[1::2], messages[2::2]):
+            self.assertEqual(model.role, "model")
+            self.assertEqual(answer.role, "user")
+            self.assertEqual(model.parts[0].function_call.name, answer.parts[0].function_response.name)
+        self.assertGreaterEqual(len(messages) - 1, 3)
+
+    def test_summary_is_merged_into_the_first_message(self):
+        messages = self.conversation(6)
+        manager = ContextManager(token_budget=50, keep_recent=2)
+        manager.compact(messages)
+        parts = messages[0].parts
+        self.assertEqual(parts[0].text, "the prompt")
+        self.assertTrue(parts[-1].text.startswith(SUMMARY_MARKER))
+        self.assertIn("get_file_content(file_path=file0.py)", parts[-1].text)
+
+        # a second summary goes into the same part
+        messages.extend(self.conversation(4)[1:])
+        manager.compact(messages)
+        parts = messages[0].parts
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[-1].text.count(SUMMARY_MARKER), 1)
+        self.assertIn("get_file_content(file_path=file0.py)", parts[-1].text)
+
+    def test_on_forget_is_called_for_summarized_reads(self):
+        forgotten = []
+        messages = self.conversation(6)
+        manager = ContextManager(token_budget=50, keep_recent=2, working_directory="/work", on_forget=forgotten.append)
+        manager.compact(messages)
+        kept = {message.parts[0].function_call.args["file_path"] for message in messages[1::2]}
+        self.assertTrue(forgotten)
+        for path in forgotten:
+            self.assertNotIn(os.path.basename(path), kept)
+        self.assertEqual(forgotten[0], os.path.realpath("/work/file0.py"))
+
+    def test_under_budget_nothing_is_summarized(self):
+        messages = self.conversation(3)
+        manager = ContextManager(token_budget=100_000)
+        manager.compact(messages)
+        self.assertEqual(len(messages), 7)
+        self.assertEqual(manager.stats["summarized_messages"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# test_patch_file.py
+
+import unittest
+
+from functions.patch_file import PatchError, _parse_hunks, apply_unified_diff, validate_edits
+
+
+class TestParseHunks(unittest.TestCase):
+    def test_hunks_and_file_headers(self):
+        diff = "--- a/x.py\n+++ b/x.py\n@@ -1,2 +1,2 @@\n a\n-b\n+B\n@@ -5 +5 @@\n-e\n+E\n"
+        hunks = _parse_hunks(diff)
+        self.assertEqual([hunk["start"] for hunk in hunks], [1, 5])
+        self.assertEqual(hunks[0]["old"], ["a", "b"])
+        self.assertEqual(hunks[0]["new"], ["a", "B"])
+
+    def test_stops_at_the_next_file(self):
+        diff = "--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n+A\n--- a/y\n+++ b/y\n@@ -1 +1 @@\n-q\n+Q\n"
+        hunks = _parse_hunks(diff)
+        self.assertEqual(len(hunks), 1)
+        self.assertEqual(hunks[0]["old"], ["a"])
+
+    def test_removed_line_starting_with_dashes(self):
+        hunks = _parse_hunks("@@ -1,2 +1 @@\n--- a comment\n keep\n")
+        self.assertEqual(hunks[0]["old"], ["-- a comment", "keep"])
+
+    def test_no_hunks(self):
+        with self.assertRaises(PatchError):
+            _parse_hunks("--- a/x\n+++ b/x\n")
+
+
+class TestApplyUnifiedDiff(unittest.TestCase):
+    def test_stale_line_numbers(self):
+        text = "".join(f"line {i}\n" for i in range(1, 21))
+        # the hunk says line 3, the context is at line 10
+        patched, applied = apply_unified_diff(text, "@@ -3,3 +3,3 @@\n line 9\n-line 10\n+LINE 10\n line 11\n")
+        self.assertEqual(applied, 1)
+        self.assertEqual(patched, text.replace("line 10\n", "LINE 10\n"))
+
+    def test_nearest_occurrence_wins(self):
+        text = "x\ny\nx\ny\nx\n"
+        patched, _ = apply_unified_diff(text, "@@ -3 +3 @@\n-x\n+z\n")
+        self.assertEqual(patched, "x\ny\nz\ny\nx\n")
+
+    def test_insertion_after_line(self):
+        patched, _ = apply_unified_diff("a\nb\nc\n", "@@ -1,0 +2 @@\n+X\n")
+        self.assertEqual(patched, "a\nX\nb\nc\n")
+
+    def test_insertion_at_start_and_end(self):
+        self.assertEqual(apply_unified_diff("a\nb\n", "@@ -0,0 +1 @@\n+X\n")[0], "X\na\nb\n")
+        self.assertEqual(apply_unified_diff("a\nb\n", "@@ -2,0 +3 @@\n+X\n")[0], "a\nb\nX\n")
+
+    def test_crlf_file(self):
+        patched, _ = apply_unified_diff("a\r\nb\r\nc\r\n", "@@ -2 +2,2 @@\n-b\n+B\n+B2\n")
+        self.assertEqual(patched, "a\r\nB\r\nB2\r\nc\r\n")
+
+    def test_missing_final_newline_is_kept(self):
+        patched, _ = apply_unified_diff("a\nb", "@@ -2 +2 @@\n-b\n+B\n\\ No newline at end of file\n")
+        self.assertEqual(patched, "a\nB")
+
+    def test_append_after_last_line_without_newline(self):
+        patched, _ = apply_unified_diff("a\nb", "@@ -2,0 +3 @@\n+c\n")
+        self.assertEqual(patched, "a\nb\nc")
+
+    def test_lines_with_form_feeds_and_unicode_separators(self):
+        text = "a\n\x0c b\x1c\n\u2028c\x85\nd\n"
+        patched, _ = apply_unified_diff(text, "@@ -3,2 +3,2 @@\n \u2028c\x85\n-d\n+D\n")
+        self.assertEqual(patched, text.replace("d\n", "D\n"))
+
+    def test_hunk_not_found(self):
+        with self.assertRaises(PatchError):
+            apply_unified_diff("a\nb\n", "@@ -1 +1 @@\n-z\n+Z\n")
+
+
+class TestValidateEdits(unittest.TestCase):
+    def test_null_replace_deletes(self):
+        self.assertEqual(validate_edits([{"search": "x", "replace": None}]), [{"search": "x", "replace": ""}])
+
+    def test_bad_fields(self):
+        for edits in ([{"search": "x", "replace": 3}], [{"search": None}], ["x"], {"search": "x"}):
+            with self.assertRaises(PatchError):
+                validate_edits(edits)
+
+
+if __name__ == "__main__":
+    unittest.main()
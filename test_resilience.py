@@ -0,0 +1,186 @@
+# test_resilience.py
+
+import asyncio
+import time
+import unittest
+from email.utils import formatdate
+from unittest import mock
+
+import httpx
+from google.genai import errors
+
+from resilience import CircuitBreaker, CircuitOpenError, ResilientTransport, _retry_after
+
+
+def rate_limited(headers=None, details=None):
+    response = httpx.Response(429, headers=headers or {})
+    return errors.ClientError(429, {"error": {"code": 429, "details": details or []}}, response)
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(_retry_after(rate_limited({"retry-after": "3"})), 3.0)
+
+    def test_http_date(self):
+        delay = _retry_after(rate_limited({"retry-after": formatdate(time.time() + 60, usegmt=True)}))
+        self.assertTrue(55 <= delay <= 60, delay)
+
+    def test_date_in_the_past(self):
+        self.assertEqual(_retry_after(rate_limited({"retry-after": formatdate(time.time() - 60, usegmt=True)})), 0.0)
+
+    def test_retry_info_delay(self):
+        details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}]
+        self.assertEqual(_retry_after(rate_limited(details=details)), 17.0)
+
+    def test_nothing_to_go_by(self):
+        self.assertIsNone(_retry_after(rate_limited()))
+        self.assertIsNone(_retry_after(rate_limited({"retry-after": "soon"})))
+        self.assertIsNone(_retry_after(ConnectionError()))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("resilience.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+
+    def open_circuit(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_trial_closes(self):
+        self.open_circuit()
+        self.now += 10
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, "half_open")
+        # only the trial call runs
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_call()
+
+    def test_half_open_trial_reopens(self):
+        self.open_circuit()
+        self.now += 10
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.opens, 2)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_released_trial_lets_the_next_call_try(self):
+        self.open_circuit()
+        self.now += 10
+        self.breaker.before_call()
+        self.breaker.release()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, "half_open")
+
+
+class TestHalfOpenWaiters(unittest.TestCase):
+    """Calls made while a half-open trial is in flight wait for its result."""
+
+    def run_pair(self, script):
+        inner = FakeTransport(script)
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+        breaker.record_failure()
+        # asyncio runs on the same clock, so age the breaker instead of patching time
+        breaker.opened_at -= 10
+        transport = ResilientTransport(inner, max_retries=0, breaker=breaker)
+
+        async def both():
+            return await asyncio.gather(collect(transport), collect(transport), return_exceptions=True)
+
+        return asyncio.run(both()), transport
+
+    def test_waiter_goes_once_the_trial_succeeds(self):
+        results, transport = self.run_pair([(0.05, ["trial"]), (0.0, ["waiter"])])
+        self.assertEqual(results, [["trial"], ["waiter"]])
+        self.assertEqual(transport.stats["rejected"], 0)
+        self.assertEqual(transport.breaker.state, "closed")
+
+    def test_waiter_fails_fast_once_the_trial_fails(self):
+        results, transport = self.run_pair([(0.05, errors.ServerError(503, {"error": {"code": 503}}))])
+        self.assertIsInstance(results[0], errors.ServerError)
+        self.assertIsInstance(results[1], CircuitOpenError)
+        self.assertEqual(transport.stats["rejected"], 1)
+        self.assertEqual(transport.breaker.state, "open")
+
+
+class FakeTransport:
+    """Answers each call with the next (delay, chunks or exception) of `script`."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def stream(self, model, contents, config):
+        delay, outcome = self.script[self.calls]
+        self.calls += 1
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            if isinstance(outcome, Exception):
+                raise outcome
+            for chunk in outcome:
+                yield chunk
+
+        return chunks()
+
+
+async def collect(transport):
+    return [chunk async for chunk in await transport.stream("model", [], None)]
+
+
+class TestHedging(unittest.TestCase):
+    def test_primary_fails_after_the_hedge_started(self):
+        inner = FakeTransport([
+            (0.05, errors.ServerError(503, {"error": {"code": 503}})),
+            (0.1, ["hedged", "answer"]),
+        ])
+        transport = ResilientTransport(inner, hedge=True, hedge_after=0.01)
+        self.assertEqual(asyncio.run(collect(transport)), ["hedged", "answer"])
+        self.assertEqual(inner.calls, 2)
+        self.assertEqual(transport.stats["hedges"], 1)
+        self.assertEqual(transport.stats["hedge_wins"], 1)
+        self.assertEqual(transport.stats["retries"], 0)
+        self.assertEqual(transport.breaker.state, "closed")
+
+    def test_both_fail_then_retry(self):
+        inner = FakeTransport([
+            (0.05, errors.ServerError(503, {"error": {"code": 503}})),
+            (0.02, errors.ServerError(503, {"error": {"code": 503}})),
+            (0.0, ["retried"]),
+        ])
+        transport = ResilientTransport(inner, base_delay=0.0, hedge=True, hedge_after=0.01)
+        self.assertEqual(asyncio.run(collect(transport)), ["retried"])
+        self.assertEqual(transport.stats["retries"], 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        inner = FakeTransport([(0.0, ["primary"])])
+        transport = ResilientTransport(inner, hedge=True, hedge_after=0.5)
+        self.assertEqual(asyncio.run(collect(transport)), ["primary"])
+        self.assertEqual(transport.stats["hedges"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
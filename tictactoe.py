@@ -7,12 +7,25 @@ from google.genai import types
 
 from agent import agent
 
+# Each player's pieces are a bitboard: bit 3 * row + col of an int is set for every square
+# they hold, so a line is complete when pieces & mask == mask.
+FULL_BOARD = 0b111_111_111
+WIN_MASKS: Tuple[int, ...] = (
+    0b000_000_111, 0b000_111_000, 0b111_000_000,  # rows
+    0b001_001_001, 0b010_010_010, 0b100_100_100,  # cols
+    0b100_010_001, 0b001_010_100,  # diagonals
+)
+# _IS_WIN[pieces]: whether `pieces` complete a line, for all 512 bitboards
+_IS_WIN: Tuple[bool, ...] = tuple(
+    any(pieces & mask == mask for mask in WIN_MASKS) for pieces in range(FULL_BOARD + 1)
+)
+
 
 class tictactoe(agent):
     def __init__(self, difficulty: str = "medium") -> None:
         super().__init__()
         self.difficulty = difficulty if difficulty in {"easy", "medium", "hard"} else "medium"
-        self.board: List[List[str]] = [[" ", " ", " "] for _ in range(3)]
+        self.pieces: Dict[str, int] = {"X": 0, "O": 0}
         self.current_player: str = "X"  # X = human, O = agent by convention
         self.status: str = "playing"  # playing | win_X | win_O | draw
         self.winner: Optional[str] = None
@@ -91,6 +104,29 @@ Return concise JSON-like results describing updates (board, last_move, status, w
             return result
         raise ValueError(f"Unknown tictactoe function: {name}")
 
+    # Checkpoint support
+    def get_state(self) -> Dict[str, Any]:
+        state = super().get_state()
+        state.update(
+            difficulty=self.difficulty,
+            board=self.board,
+            current_player=self.current_player,
+            status=self.status,
+            winner=self.winner,
+        )
+        return state
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        super().set_state(state)
+        self.difficulty = state.get("difficulty", self.difficulty)
+        self.pieces = {
+            player: sum(1 << (3 * r + c) for r, row in enumerate(state["board"]) for c, cell in enumerate(row) if cell == player)
+            for player in ("X", "O")
+        }
+        self.current_player = state["current_player"]
+        self.status = state["status"]
+        self.winner = state["winner"]
+
     # Game logic
     def _make_move(self, player: str, row: Optional[int], col: Optional[int]) -> Dict[str, Any]:
         if self.status != "playing":
@@ -105,7 +141,7 @@ Return concise JSON-like results describing updates (board, last_move, status, w
         if not self._is_valid_move(row, col):
             return {"error": "Invalid move. Use 0..2 for row/col and pick an empty cell.", "legal_moves": self._legal_moves(), "board": self._board_str()}
 
-        self.board[row][col] = player
+        self.pieces[player] |= 1 << (3 * row + col)
         self.current_player = "O" if player == "X" else "X"
         self._update_status()
         return {
@@ -121,30 +157,32 @@ Return concise JSON-like results describing updates (board, last_move, status, w
             return False
         if not (0 <= row <= 2 and 0 <= col <= 2):
             return False
-        return self.board[row][col] == " "
+        return not (self.pieces["X"] | self.pieces["O"]) >> (3 * row + col) & 1
 
     def _legal_moves(self) -> List[Tuple[int, int]]:
-        return [(r, c) for r in range(3) for c in range(3) if self.board[r][c] == " "]
+        occupied = self.pieces["X"] | self.pieces["O"]
+        return [divmod(square, 3) for square in range(9) if not occupied >> square & 1]
+
+    @property
+    def board(self) -> List[List[str]]:
+        """The board as rows of 'X', 'O' and ' ' (a copy built from the bitboards)."""
+        x, o = self.pieces["X"], self.pieces["O"]
+        return [
+            ["X" if x >> square & 1 else "O" if o >> square & 1 else " " for square in range(3 * r, 3 * r + 3)]
+            for r in range(3)
+        ]
 
     def _board_str(self) -> str:
-        rows = [" | ".join(self.board[r]) for r in range(3)]
+        rows = [" | ".join(row) for row in self.board]
         return f"\n{rows[0]}\n- + - + -\n{rows[1]}\n- + - + -\n{rows[2]}\n"
 
     def _update_status(self) -> None:
-        lines = []
-        b = self.board
-        # rows, cols
-        lines.extend(b)
-        lines.extend([[b[0][i], b[1][i], b[2][i]] for i in range(3)])
-        # diagonals
-        lines.append([b[0][0], b[1][1], b[2][2]])
-        lines.append([b[0][2], b[1][1], b[2][0]])
-        for line in lines:
-            if line[0] != " " and line[0] == line[1] == line[2]:
-                self.status = f"win_{line[0]}"
-                self.winner = line[0]
+        for player in ("X", "O"):
+            if _IS_WIN[self.pieces[player]]:
+                self.status = f"win_{player}"
+                self.winner = player
                 return
-        if all(b[r][c] != " " for r in range(3) for c in range(3)):
+        if self.pieces["X"] | self.pieces["O"] == FULL_BOARD:
             self.status = "draw"
             self.winner = None
         else:
@@ -166,40 +204,43 @@ Return concise JSON-like results describing updates (board, last_move, status, w
         return move if move else random.choice(legal)
 
     def _winning_move(self, player: str) -> Optional[Tuple[int, int]]:
+        pieces = self.pieces[player]
         for r, c in self._legal_moves():
-            self.board[r][c] = player
-            self._update_status()
-            won = self.status == f"win_{player}"
-            self.board[r][c] = " "  # revert
-            self._update_status()
-            if won:
+            if _IS_WIN[pieces | 1 << (3 * r + c)]:
                 return (r, c)
         return None
 
     def _minimax_best_move(self, player: str) -> Tuple[int, Optional[Tuple[int, int]]]:
-        opponent = "X" if player == "O" else "O"
         if self.status.startswith("win_"):
             return (1 if self.winner == "O" else -1, None)
         if self.status == "draw" or not self._legal_moves():
             return (0, None)
-
-        best_score = -10 if player == "O" else 10
-        best_move: Optional[Tuple[int, int]] = None
-
-        for r, c in self._legal_moves():
-            self.board[r][c] = player
-            prev_status, prev_winner = self.status, self.winner
-            self._update_status()
-            score, _ = self._minimax_best_move(opponent)
-            # undo
-            self.board[r][c] = " "
-            self.status, self.winner = prev_status, prev_winner
-
-            if player == "O":
-                if score > best_score:
-                    best_score, best_move = score, (r, c)
-            else:
-                if score < best_score:
-                    best_score, best_move = score, (r, c)
-
-        return best_score, best_move
+        score, square = _minimax(self.pieces["X"], self.pieces["O"], player == "O")
+        return score, divmod(square, 3)
+
+
+def _minimax(x: int, o: int, o_to_move: bool) -> Tuple[int, int]:
+    """(score, square) of the best move: the score is 1 when O can force a win, -1 when X
+    can and 0 for a draw; the square is -1 when the game is over."""
+    if _IS_WIN[o]:
+        return 1, -1
+    if _IS_WIN[x]:
+        return -1, -1
+    empty = ~(x | o) & FULL_BOARD
+    if not empty:
+        return 0, -1
+
+    best_score, best_square = (-10, -1) if o_to_move else (10, -1)
+    for square in range(9):
+        bit = 1 << square
+        if not empty & bit:
+            continue
+        if o_to_move:
+            score = _minimax(x, o | bit, False)[0]
+            if score > best_score:
+                best_score, best_square = score, square
+        else:
+            score = _minimax(x | bit, o, True)[0]
+            if score < best_score:
+                best_score, best_square = score, square
+    return best_score, best_square
@@ -0,0 +1,382 @@
+"""Pluggable model transports for the agent loop.
+
+run_session asks a transport for the streamed chunks of one model turn. Besides the live
+Gemini transport there are three offline-friendly modes, picked with --transport=MODE:PATH:
+
+  record:calls.jsonl   call Gemini and append every request with its response chunks
+  replay:calls.jsonl   serve recorded responses back without any network access; a request
+                       is matched on model, system instruction, tools and conversation
+                       contents (see request_key), so replays are deterministic
+  stub:script.json     start a local HTTP server that speaks the Gemini REST API and answers
+                       from a script, and point a real genai.Client at it
+  stub:http://HOST:PORT  use a stub server that is already running
+
+A stub script is a JSON list of turns (or {"turns": [...], "latency_ms": 0, "chunk_chars": 0}).
+Each turn is a list of parts such as {"text": "..."} or
+{"function_call": {"name": "get_files_info", "args": {}}}. The server picks the turn from the
+number of model messages already in the conversation, so it needs no per-session state and
+many sessions can share it. Run `python transport.py stub script.json [port]` to start a
+standalone server.
+
+A script can also inject faults, to exercise the retry layer in resilience.py:
+
+  "faults": [...]        applied to the first requests the server receives, one entry per
+                         request in arrival order: null (answer normally),
+                         {"status": 503, "retry_after": 2} (an error response, Retry-After
+                         optional), {"delay_ms": 1500} (answer late) or {"disconnect": true}
+                         (close the connection without answering)
+  "fault_rate": 0.2      after that list, fail this fraction of requests at random with
+  "fault_status": 503    this status (default 503); "seed" makes the sequence repeatable
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from google.genai import types
+
+
+def _dump(model: Any) -> Any:
+    return model.model_dump(mode="json", exclude_none=True)
+
+
+# (pattern, replacement) applied to tool results before hashing: timings change on every run
+_VOLATILE = [
+    (re.compile(r"Ran for \d+\.\d+ seconds"), "Ran for ? seconds"),
+    (re.compile(r"\(ran for \d+\.\d+ seconds\)"), "(ran for ? seconds)"),
+    (re.compile(r"Ran (\d+) tests? in \d+\.\d+s"), r"Ran \1 tests in ?s"),
+]
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        for pattern, replacement in _VOLATILE:
+            value = pattern.sub(replacement, value)
+        return value
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def request_key(model: str, contents: List[types.Content], config: Optional[types.GenerateContentConfig] = None) -> str:
+    """Stable hash of a request, used to look recorded (and cached) responses up again.
+
+    Covers the model, system instruction, tool declarations and messages. Tool results are
+    normalized first, so run_python_file's "Ran for 0.123 seconds" does not make a rerun of
+    the same session a different request.
+    """
+    messages = []
+    for content in contents:
+        message = _dump(content)
+        for part in message.get("parts", []):
+            if "function_response" in part:
+                part["function_response"] = _normalize(part["function_response"])
+        messages.append(message)
+    payload = {
+        "model": model,
+        "system_instruction": config.system_instruction if config is not None else None,
+        "tools": [_dump(tool) for tool in (config.tools or [])] if config is not None else [],
+        "contents": messages,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class GeminiTransport:
+    """Streams from the real API through a genai.Client."""
+
+    def __init__(self, client) -> None:
+        self.client = client
+
+    async def stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> AsyncIterator[types.GenerateContentResponse]:
+        return await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+
+
+class RecordingTransport:
+    """Passes requests through to another transport and appends each exchange to a JSONL file."""
+
+    def __init__(self, inner, path: str) -> None:
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    async def stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> AsyncIterator[types.GenerateContentResponse]:
+        key = request_key(model, contents, config)
+        request = {"model": model, "contents": [_dump(c) for c in contents]}
+        upstream = await self.inner.stream(model, contents, config)
+
+        async def recorder():
+            chunks = []
+            async for chunk in upstream:
+                chunks.append(_dump(chunk))
+                yield chunk
+            # only complete exchanges are written
+            line = json.dumps({"key": key, "request": request, "chunks": chunks})
+            with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+        return recorder()
+
+
+class ReplayTransport:
+    """Serves recorded exchanges; identical requests are answered in recording order."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._recorded: Dict[str, deque] = defaultdict(deque)
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    self._recorded[record["key"]].append(record["chunks"])
+        self._lock = threading.Lock()
+
+    async def stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> AsyncIterator[types.GenerateContentResponse]:
+        key = request_key(model, contents, config)
+        with self._lock:
+            queue = self._recorded.get(key)
+            if not queue:
+                raise KeyError(f"No recorded response for this request in {self.path} (key {key[:12]})")
+            # keep the last recording so a replay can be run more than once in one process
+            chunks = queue.popleft() if len(queue) > 1 else queue[0]
+
+        async def replay():
+            for chunk in chunks:
+                yield types.GenerateContentResponse.model_validate(chunk)
+
+        return replay()
+
+
+class RateLimitedTransport:
+    """Spaces model calls at least 60 / requests_per_minute seconds apart.
+
+    One instance shared by every session of a process (e.g. a batch) makes the limit apply to
+    all of them together. Calls wait their turn in arrival order.
+    """
+
+    def __init__(self, inner, requests_per_minute: float) -> None:
+        self.inner = inner
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self.waited_seconds = 0.0
+
+    async def stream(self, model: str, contents: List[types.Content], config: types.GenerateContentConfig) -> AsyncIterator[types.GenerateContentResponse]:
+        # no await between reading and reserving the slot, so this is safe within one event loop
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            self.waited_seconds += slot - now
+            await asyncio.sleep(slot - now)
+        return await self.inner.stream(model, contents, config)
+
+
+# Stub model server
+
+def load_script(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as file:
+        script = json.load(file)
+    if isinstance(script, list):
+        script = {"turns": script}
+    script.setdefault("latency_ms", 0)
+    script.setdefault("chunk_chars", 0)
+    return script
+
+
+def _rest_part(part: Dict[str, Any]) -> Dict[str, Any]:
+    if "function_call" in part:
+        call = part["function_call"]
+        return {"functionCall": {"name": call["name"], "args": call.get("args", {})}}
+    return {"text": part.get("text", "")}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without this the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # keep load tests quiet
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = json.loads(body or b"{}")
+        script = self.server.script
+        turn = sum(1 for content in request.get("contents", []) if content.get("role") == "model")
+        fault = self.server.next_fault()
+        if self.server.first_request_at is None:
+            self.server.first_request_at = time.time()
+
+        if fault.get("disconnect"):
+            self.close_connection = True
+            return
+        if fault.get("status"):
+            self._send_error(fault["status"], fault.get("retry_after"))
+            return
+        if fault.get("delay_ms"):
+            threading.Event().wait(fault["delay_ms"] / 1000)
+
+        turns = script["turns"]
+        if turn < len(turns):
+            parts = [_rest_part(part) for part in turns[turn]]
+        else:
+            parts = [{"text": "[stub script has no more turns]"}]
+
+        if script.get("latency_ms"):
+            threading.Event().wait(script["latency_ms"] / 1000)
+
+        # split text parts into several chunks to look like a real stream
+        chunks = []
+        size = script.get("chunk_chars", 0)
+        for part in parts:
+            if size and "text" in part and len(part["text"]) > size:
+                text = part["text"]
+                chunks.extend([{"text": text[i:i + size]}] for i in range(0, len(text), size))
+            else:
+                chunks.append([part])
+
+        usage = {"promptTokenCount": len(body) // 4, "candidatesTokenCount": len(json.dumps(parts)) // 4}
+        responses = []
+        for i, chunk_parts in enumerate(chunks):
+            response = {"candidates": [{"content": {"role": "model", "parts": chunk_parts}, "index": 0}]}
+            if i == len(chunks) - 1:
+                response["candidates"][0]["finishReason"] = "STOP"
+                response["usageMetadata"] = usage
+            responses.append(response)
+
+        if ":streamGenerateContent" in self.path:
+            payload = b"".join(f"data: {json.dumps(r)}\r\n\r\n".encode() for r in responses)
+            content_type = "text/event-stream"
+        else:
+            merged = [part for chunk_parts in chunks for part in chunk_parts]
+            payload = json.dumps({
+                "candidates": [{"content": {"role": "model", "parts": merged}, "index": 0, "finishReason": "STOP"}],
+                "usageMetadata": usage,
+            }).encode()
+            content_type = "application/json"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, retry_after: Optional[float]) -> None:
+        names = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+        payload = json.dumps({"error": {"code": status, "message": "injected fault",
+                                        "status": names.get(status, "UNKNOWN")}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients hang up on purpose, e.g. when a hedged request loses the race
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def next_fault(self) -> Dict[str, Any]:
+        """Count the request and pick the fault (if any) to inject into it."""
+        with self.lock:
+            index = self.requests
+            self.requests += 1
+            faults = self.script.get("faults") or []
+            if index < len(faults):
+                return faults[index] or {}
+            if self.random.random() < self.script.get("fault_rate", 0):
+                return {"status": self.script.get("fault_status", 503)}
+            return {}
+
+
+class StubModelServer:
+    """Local stand-in for the Gemini REST API, answering from a script."""
+
+    def __init__(self, script: Dict[str, Any], host: str = "127.0.0.1", port: int = 0) -> None:
+        self.httpd = _StubHTTPServer((host, port), _StubHandler)
+        self.httpd.script = script
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.httpd.random = random.Random(script.get("seed"))
+        # wall-clock time of the first request, for startup measurements
+        self.httpd.first_request_at = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    @property
+    def first_request_at(self) -> Optional[float]:
+        return self.httpd.first_request_at
+
+    def start(self) -> "StubModelServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def stub_client(base_url: str):
+    """A real genai.Client that talks to a StubModelServer instead of Google."""
+    from google import genai
+
+    return genai.Client(api_key="stub", http_options=types.HttpOptions(base_url=base_url))
+
+
+def create_transport(spec: Optional[str], client_factory):
+    """Build the transport for a --transport=MODE:PATH value (None = live Gemini).
+
+    `client_factory` creates the real genai.Client and is only called for live and record
+    modes, so replay and stub runs need no API key. Returns (transport, stub_server_or_None).
+    """
+    if not spec:
+        return GeminiTransport(client_factory()), None
+    mode, _, path = spec.partition(":")
+    if mode == "record":
+        return RecordingTransport(GeminiTransport(client_factory()), path or "model_calls.jsonl"), None
+    if mode == "replay":
+        return ReplayTransport(path or "model_calls.jsonl"), None
+    if mode == "stub" and path.startswith(("http://", "https://")):
+        # a stub server that is already running, e.g. `python transport.py stub script.json`
+        return GeminiTransport(stub_client(path)), None
+    if mode == "stub":
+        server = StubModelServer(load_script(path)).start()
+        return GeminiTransport(stub_client(server.base_url)), server
+    raise ValueError(f"Unknown transport '{spec}', expected record:PATH, replay:PATH or stub:PATH")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "stub":
+        print("Usage: python transport.py stub <script.json> [port]")
+        sys.exit(1)
+    server = StubModelServer(load_script(sys.argv[2]), port=int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    print(f"Stub model server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()